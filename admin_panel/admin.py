@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from django.contrib import admin
-from django.db.models import Count, Sum
+from django.db.models import Count, Q, Sum
 from django.forms import ModelForm
 from django.http import HttpRequest
 from django.template.response import TemplateResponse
@@ -11,7 +11,7 @@ from codes.models import Giftcard, StockbleCode, UcCode
 from items.models import Item
 from orders.models import Order
 
-from .models import Attachment, DailyReport, Mailing, ManagerChat
+from .models import Attachment, DailyReport, Mailing, MailingDelivery, ManagerChat
 
 
 @admin.register(ManagerChat)
@@ -36,6 +36,44 @@ class AttachmentInlineAdmin(admin.TabularInline):
 @admin.register(Mailing)
 class MailingAdmin(admin.ModelAdmin):
     inlines = (AttachmentInlineAdmin,)
+    list_display = (
+        "__str__",
+        "date_time",
+        "is_sent",
+        "delivered",
+        "failed",
+        "throughput",
+    )
+    readonly_fields = (
+        "last_user_id",
+        "delivered",
+        "failed",
+        "started_at",
+        "finished_at",
+        "throughput",
+    )
+
+    def get_queryset(self, request):
+        status = MailingDelivery.Status
+        return super().get_queryset(request).annotate(
+            delivered_count=Count("deliveries", filter=Q(deliveries__status=status.DELIVERED)),
+            failed_count=Count("deliveries", filter=Q(deliveries__status=status.FAILED)),
+        )
+
+    @admin.display(description="Delivered", ordering="delivered_count")
+    def delivered(self, obj):
+        return obj.delivered_count
+
+    @admin.display(description="Failed", ordering="failed_count")
+    def failed(self, obj):
+        return obj.failed_count
+
+    @admin.display(description="Messages/s")
+    def throughput(self, obj):
+        if not obj.started_at:
+            return None
+        elapsed = ((obj.finished_at or now()) - obj.started_at).total_seconds()
+        return round((obj.delivered_count + obj.failed_count) / elapsed, 1) if elapsed else None
 
     def save_form(self, request: HttpRequest, form: ModelForm, change: bool):
         return super().save_form(request, form, change)
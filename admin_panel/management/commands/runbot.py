@@ -1,51 +1,80 @@
 import asyncio
 import logging
+import multiprocessing
+import signal
+import time
 
 from aiogram import Bot, Dispatcher
 from aiogram.exceptions import TelegramNetworkError
 from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 from apscheduler.jobstores.redis import RedisJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler_di import ContextSchedulerDecorator
 from django.conf import settings
 from django.core.management import BaseCommand
+from django.db import connections
 
 from bot.commands import set_commands
 from bot.handlers import (admin_router, profile_router, shop_router,
                           start_router)
+from bot.middlewares import (ConcurrencyMiddleware, ThrottlingMiddleware,
+                             TgUserMiddleware, UpdateDeduplicationMiddleware)
 from bot.misc.logging import configure_logger
+from items.catalog import start_catalog_listener
 from orders.utils import delete_old_topups
+from payments.http import close_session
 from payments.payment import check_wallets
 from bot.misc.mailing import start_mailing
-from backend.tasks import start_background_tasks
+from backend.config_cache import arefresh_config
+from backend.db_executor import start_db_executor_monitor
+from backend.tasks import start_background_tasks, start_code_pools_tasks
+from users.cache import start_user_listener
 
 
 ENV = settings.ENV
 REDIS_HOST = ENV.str('REDIS_HOST')
 REDIS_PORT = ENV.str('REDIS_PORT')
 
+WEBHOOK_URL = ENV.str('WEBHOOK_URL', '')
+WEBHOOK_PATH = ENV.str('WEBHOOK_PATH', '/tg/webhook')
+WEBHOOK_SECRET = ENV.str('WEBHOOK_SECRET', '')
+WEBHOOK_PORT = ENV.int('WEBHOOK_PORT', 8080)
+WEBHOOK_WORKERS = ENV.int('WEBHOOK_WORKERS', 2)
 
-async def on_startup(bot: Bot):
-    await set_commands(bot)
-    configure_logger(True)
 
+async def on_startup(bot: Bot, is_primary: bool = True):
+    if is_primary:
+        await set_commands(bot)
+    configure_logger(True)
+    await arefresh_config()
+    start_catalog_listener()
+    start_user_listener()
+    start_db_executor_monitor()
 
-async def main():
-    logger = logging.getLogger('Tg')
-    logger.info("Starting bot")
-
-    bot = Bot(ENV.str('TG_TOKEN_BOT'))
 
+def create_dispatcher(deduplicate: bool = False) -> Dispatcher:
     storage = RedisStorage.from_url(f'redis://{REDIS_HOST}:{REDIS_PORT}/0')
 
     dp = Dispatcher(storage=storage)
+    # Повтор апдейта проверяется уже под блокировкой чата: пока оригинал
+    # обрабатывается в этом процессе, повтор ждёт за ним, а не рядом.
+    dp.update.outer_middleware(ConcurrencyMiddleware())
+    if deduplicate:
+        dp.update.outer_middleware(UpdateDeduplicationMiddleware())
+    dp.update.outer_middleware(ThrottlingMiddleware())
+    dp.update.outer_middleware(TgUserMiddleware())
     dp.include_routers(
         start_router,
         admin_router,
         profile_router,
         shop_router,
     )
+    return dp
+
 
+def start_scheduler(bot: Bot):
     jobstores = {
         'default': RedisJobStore(
             host=ENV('REDIS_HOST'),
@@ -104,8 +133,29 @@ async def main():
         id='start_background_tasks'
     )
 
+    scheduler.add_job(
+        start_code_pools_tasks,
+        'interval',
+        name='code_pools',
+        misfire_grace_time=10,
+        max_instances=1,
+        minutes=ENV.int('CODE_POOLS_PERIOD', 1),
+        replace_existing=True,
+        id='start_code_pools_tasks'
+    )
+
     scheduler.start()
     scheduler.print_jobs()
+    return scheduler
+
+
+async def main():
+    logger = logging.getLogger('Tg')
+    logger.info("Starting bot")
+
+    bot = Bot(ENV.str('TG_TOKEN_BOT'))
+    dp = create_dispatcher()
+    start_scheduler(bot)
 
     try:
         await on_startup(bot)
@@ -113,12 +163,99 @@ async def main():
         await dp.start_polling(bot)
     except TelegramNetworkError:
         logging.critical('Нет интернета')
+    finally:
+        await close_session()
+
+
+async def set_webhook():
+    bot = Bot(ENV.str('TG_TOKEN_BOT'))
+    async with bot.context():
+        await bot.set_webhook(
+            url=f'{WEBHOOK_URL.rstrip("/")}{WEBHOOK_PATH}',
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=create_dispatcher().resolve_used_update_types(),
+        )
+
+
+async def serve_webhook(worker: int):
+    """Один процесс приёма вебхуков; планировщик работает только в нулевом.
+
+    Ядро раздаёт соединения Telegram процессам без учёта чата, поэтому
+    апдейты одного чата в разных процессах обрабатываются без общей очереди:
+    порядок между процессами не гарантирован.
+    """
+    logger = logging.getLogger('Tg')
+    is_primary = worker == 0
+
+    bot = Bot(ENV.str('TG_TOKEN_BOT'))
+    dp = create_dispatcher(deduplicate=True)
+    if is_primary:
+        start_scheduler(bot)
+    await on_startup(bot, is_primary)
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET or None
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    # reuse_port: все воркеры слушают один порт, ядро делит соединения.
+    site = web.TCPSite(runner, host='0.0.0.0', port=WEBHOOK_PORT, reuse_port=True)
+    await site.start()
+    logger.info(f"Webhook worker {worker} is listening on {WEBHOOK_PORT}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await close_session()
+
+
+def run_webhook_worker(worker: int):
+    try:
+        asyncio.run(serve_webhook(worker))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_webhook(workers: int):
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    asyncio.run(set_webhook())
+    connections.close_all()
+
+    processes = [
+        multiprocessing.Process(target=run_webhook_worker, args=(worker,), daemon=True)
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        while all(process.is_alive() for process in processes):
+            time.sleep(1)
+        logging.critical('Webhook worker exited, stopping the rest')
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
 
 
 class Command(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--webhook',
+            action='store_true',
+            help='Serve updates from WEBHOOK_URL instead of polling',
+        )
+        parser.add_argument('--workers', type=int, default=WEBHOOK_WORKERS)
+
     def handle(self, *args, **options):
         try:
-            asyncio.run(main())
+            if options['webhook']:
+                run_webhook(options['workers'])
+            else:
+                asyncio.run(main())
         except KeyboardInterrupt:
             pass
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0005_dailyreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailing',
+            name='failed_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Failed'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Finished at'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='last_user_id',
+            field=models.BigIntegerField(default=0, help_text='Recipients up to this TgUser id are done, sending resumes after it', verbose_name='Progress cursor'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='sent_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Sent'),
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Started at'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_panel', '0006_mailing_progress'),
+        ('users', '0004_tguser_is_reachable'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='mailing',
+            name='failed_count',
+        ),
+        migrations.RemoveField(
+            model_name='mailing',
+            name='sent_count',
+        ),
+        migrations.CreateModel(
+            name='MailingDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('delivered', 'Delivered'), ('failed', 'Failed')], max_length=10, verbose_name='Status')),
+                ('error', models.CharField(blank=True, default='', max_length=255, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creation date')),
+                ('mailing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='admin_panel.mailing', verbose_name='mailing')),
+                ('tg_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mailing_deliveries', to='users.tguser', verbose_name='Telegram user')),
+            ],
+            options={
+                'verbose_name': 'Mailing delivery',
+                'verbose_name_plural': 'Mailing deliveries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mailingdelivery',
+            constraint=models.UniqueConstraint(fields=('mailing', 'tg_user'), name='mailing_delivery_unique'),
+        ),
+    ]
@@ -20,6 +20,13 @@ class Mailing(models.Model):
     is_sent = models.BooleanField(
         help_text="sending status", verbose_name="sending status", default=False
     )
+    last_user_id = models.BigIntegerField(
+        default=0,
+        help_text="Recipients up to this TgUser id are done, sending resumes after it",
+        verbose_name="Progress cursor",
+    )
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name="Started at")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="Finished at")
 
     class Meta:
         verbose_name = "Mailing"
@@ -88,6 +95,39 @@ class Attachment(models.Model):
         verbose_name_plural = "Attachments"
 
 
+class MailingDelivery(models.Model):
+    """Результат рассылки одному пользователю."""
+
+    class Status(models.TextChoices):
+        DELIVERED = "delivered", "Delivered"
+        FAILED = "failed", "Failed"
+
+    mailing = models.ForeignKey(
+        Mailing,
+        on_delete=models.CASCADE,
+        related_name="deliveries",
+        verbose_name="mailing",
+    )
+    tg_user = models.ForeignKey(
+        "users.TgUser",
+        on_delete=models.CASCADE,
+        related_name="mailing_deliveries",
+        verbose_name="Telegram user",
+    )
+    status = models.CharField(max_length=10, choices=Status, verbose_name="Status")
+    error = models.CharField(max_length=255, blank=True, default="", verbose_name="Error")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creation date")
+
+    class Meta:
+        verbose_name = "Mailing delivery"
+        verbose_name_plural = "Mailing deliveries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mailing", "tg_user"], name="mailing_delivery_unique"
+            ),
+        ]
+
+
 class ManagerChat(models.Model):
     title = models.CharField(max_length=100, verbose_name="Title")
     tg_id = models.BigIntegerField(unique=True, verbose_name="Telegram ID")
@@ -1,9 +1,10 @@
 from decimal import Decimal
 
+from django.db import models
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
-from items.models import Item, PUBGUCItem
+from items.models import Item, PUBGUCItem, resolve_stock
 from orders.models import Order, TopUp
 from users.models import TgUser
 
@@ -14,15 +15,27 @@ class ProfileSerializer(serializers.ModelSerializer):
         fields = ("tg_id", "username", "first_name", "balance")
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        """Считает остатки всей страницы одним запросом к счётчикам."""
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.context["stock"] = resolve_stock(items)
+        return super().to_representation(items)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     stock = serializers.SerializerMethodField()
 
     class Meta:
         model = PUBGUCItem
         fields = ("id", "title", "price", "amount", "stock")
+        list_serializer_class = ProductListSerializer
 
     @extend_schema_field(serializers.IntegerField(allow_null=True))
     def get_stock(self, obj: Item):
+        stock = self.context.get("stock", {})
+        if obj.id in stock:
+            return stock[obj.id]
         return obj.get_stock_amount()
 
 
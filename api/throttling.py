@@ -0,0 +1,53 @@
+import hashlib
+
+from rest_framework.throttling import BaseThrottle
+
+from backend.throttling import get_rule, take
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF-троттлинг на общем token bucket из backend.throttling.
+
+    Клиент определяется по заголовку X-API-Key (в Redis попадает его хэш),
+    без ключа - по IP. Маршрут - basename и action вьюсета или
+    throttle_scope вью: "api:orders:create", "api:me".
+    """
+
+    def allow_request(self, request, view):
+        rule = get_rule("api", *self.get_route(view))
+        if rule is None:
+            return True
+        allowed, self.wait_seconds = take(*rule, self.get_client(request))
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+    def get_route(self, view) -> tuple[str | None, ...]:
+        if hasattr(view, "basename"):
+            return view.basename, view.action
+        return (getattr(view, "throttle_scope", None) or type(view).__name__,)
+
+    def get_client(self, request) -> str:
+        api_key = request.headers.get("X-API-Key")
+        if api_key:
+            return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:32]
+        return "ip:" + self.get_ident(request)
+
+
+class ThrottleFirstMixin:
+    """Проверяет лимиты до аутентификации и прав.
+
+    DRF троттлит после них, а APIKeyAuthentication и HasPositiveBalance
+    читают Postgres - ответ 429 должен обходиться без запросов к БД.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        self.check_throttles(request)
+        request._throttles_checked = True
+        super().initial(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        if getattr(request, "_throttles_checked", False):
+            return
+        super().check_throttles(request)
@@ -26,6 +26,7 @@ from .serializers import (
     ProductSerializer,
     ProfileSerializer,
 )
+from .throttling import ThrottleFirstMixin
 
 
 @extend_schema(
@@ -33,16 +34,19 @@ from .serializers import (
     description="Retrieves the profile information for the authenticated user.",
     responses={200: ProfileSerializer},
 )
-class ProfileView(APIView):
+class ProfileView(ThrottleFirstMixin, APIView):
     permission_classes = [HasPositiveBalance]
+    throttle_scope = "me"
 
     def get(self, request):
         serializer = ProfileSerializer(request.user)
         return Response({"success": True, **serializer.data})
 
 
-class ProductViewSet(ReadOnlyModelViewSet):
-    queryset = PUBGUCItem.objects.filter(is_active=True, category=Item.Category.PUBG_UC)
+class ProductViewSet(ThrottleFirstMixin, ReadOnlyModelViewSet):
+    queryset = PUBGUCItem.objects.filter(
+        is_active=True, category=Item.Category.PUBG_UC
+    )
     serializer_class = ProductSerializer
     permission_classes = []
 
@@ -52,6 +56,7 @@ class ProductViewSet(ReadOnlyModelViewSet):
     description="List your orders, retrieve a specific order, or create a new one.",
 )
 class OrderViewSet(
+    ThrottleFirstMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
@@ -113,6 +118,7 @@ class OrderViewSet(
     description="List your payment requests, retrieve a specific one, or create a new payment request.",
 )
 class PaymentViewSet(
+    ThrottleFirstMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
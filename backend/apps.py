@@ -6,6 +6,8 @@ class BackendConfig(AppConfig):
     name = "backend"
 
     def ready(self):
+        import backend.signals  # NOQA
+
         from . import mocks
 
         mocks.patch_all()
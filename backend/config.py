@@ -135,3 +135,9 @@ class FEATURES_CONFIG(BaseConfig):
         "Enable (True) or disable (False) the user points system."
     )
     POINTS_SYSTEM_ENABLED_TAGS = [ConfigTags.basic]
+
+    CODE_POOLS_ENABLED: bool = False
+    CODE_POOLS_ENABLED_DESCRIPTION = (
+        "Reserve codes from pre-filled Redis pools (True) or only from the database (False)."
+    )
+    CODE_POOLS_ENABLED_TAGS = [ConfigTags.basic]
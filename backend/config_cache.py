@@ -0,0 +1,131 @@
+"""Локальный кеш значений liveconfigs.
+
+Все строки ConfigRow грузятся одним запросом и хранятся в словаре процесса,
+так что чтение конфига - доступ к словарю без похода в БД и без
+sync_to_async. Сохранение конфига в админке публикует сообщение в Redis, и
+каждый процесс сбрасывает свой кеш. Пока подписка работает, кеш живёт
+LC_LOCAL_CACHE_TTL секунд, без неё - LC_CACHE_TTL.
+
+    get_config(TEXT_CONFIG, "MENU_MSG")          # Celery, views, модели
+    await aget_config(TEXT_CONFIG, "MENU_MSG")   # бот
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from liveconfigs.models import ConfigRow, ConfigRowDescriptor
+from redis.exceptions import RedisError
+
+from backend.db_executor import db_sync_to_async
+from backend.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CONFIG_CHANNEL = "config:updates"
+
+
+class ConfigCache:
+    def __init__(self):
+        self._values = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listener_pid = None
+
+    def is_stale(self) -> bool:
+        return time.monotonic() >= self._expires_at
+
+    def is_loaded(self) -> bool:
+        return self._values is not None
+
+    def invalidate(self):
+        self._generation += 1
+        self._expires_at = 0.0
+
+    def refresh(self):
+        with self._lock:
+            if not self.is_stale():
+                return
+            is_listening = self._ensure_listener()
+            generation = self._generation
+            self._values = dict(ConfigRow.objects.values_list("name", "value"))
+            if generation != self._generation:
+                # Конфиг сменился во время чтения, следующий доступ перечитает.
+                return
+            ttl = settings.LC_LOCAL_CACHE_TTL if is_listening else settings.LC_CACHE_TTL
+            self._expires_at = time.monotonic() + ttl
+
+    def get(self, config, name: str):
+        descriptor = vars(config).get(name)
+        if not isinstance(descriptor, ConfigRowDescriptor):
+            raise AttributeError(f"{config.__name__} has no config {name}")
+        # Строки, которых ещё нет в БД, берут значение по умолчанию из класса.
+        return (self._values or {}).get(descriptor.config_name, descriptor.default_value)
+
+    def _ensure_listener(self) -> bool:
+        """Подписывается на обновления конфигов; после fork - заново."""
+        if self._listener_pid == os.getpid() and self._listener.is_alive():
+            return True
+        try:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{CONFIG_CHANNEL: lambda message: self.invalidate()})
+            self._listener = pubsub.run_in_thread(
+                sleep_time=1, daemon=True, exception_handler=self._on_listener_error
+            )
+        except RedisError:
+            logger.exception("Config updates are unavailable, falling back to TTL")
+            return False
+        self._listener_pid = os.getpid()
+        return True
+
+    def _on_listener_error(self, exc, pubsub, thread):
+        logger.error(f"Config updates listener stopped: {exc}")
+        thread.stop()
+        pubsub.close()
+        self.invalidate()
+
+
+config_cache = ConfigCache()
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def get_config(config, name: str):
+    """Значение конфига для синхронного кода.
+
+    Внутри event loop кеш не перечитывается (запрос к БД там запрещён):
+    устаревший отдаётся как есть, а до первой загрузки - значения по
+    умолчанию. Асинхронные процессы грузят кеш при старте: arefresh_config.
+    """
+    if config_cache.is_stale() and not _in_event_loop():
+        config_cache.refresh()
+    return config_cache.get(config, name)
+
+
+async def arefresh_config():
+    if config_cache.is_stale():
+        await db_sync_to_async(config_cache.refresh)()
+
+
+async def aget_config(config, name: str):
+    await arefresh_config()
+    return config_cache.get(config, name)
+
+
+async def aget_configs(config, *names: str) -> tuple:
+    await arefresh_config()
+    return tuple(config_cache.get(config, name) for name in names)
+
+
+def publish_config_update():
+    get_redis().publish(CONFIG_CHANNEL, 1)
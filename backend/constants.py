@@ -45,54 +45,3 @@ UC_AMOUNTS_FOR_IMPORT = {
     32_400: "32400",
     40_500: "40500",
 }
-
-CODES_MAP = {
-    60: [60],
-    120: [60, 60],
-    180: [60, 60, 60],
-    325: [325],
-    385: [60, 325],
-    660: [660],
-    720: [60, 660],
-    985: [325, 660],
-    1_320: [660, 660],
-    1_800: [1800],
-    1_920: [60, 60, 1800],
-    3_850: [3850],
-    5_650: [1800, 3850],
-    8_100: [8100],
-    9_900: [1800, 8100],
-    11_950: [3850, 8100],
-    16_200: [16200],
-    24_300: [24300],
-    32_400: [32400],
-    40_500: [40500],
-}
-
-UC_RECIPES = {
-    16200: [
-        [16200],
-        [8100, 8100],
-    ],
-    24300: [
-        [24300],
-        [16200, 8100],
-        [8100, 8100, 8100],
-    ],
-    32400: [
-        [32400],
-        [24300, 8100],
-        [16200, 16200],
-        [8100, 8100, 8100, 8100],
-    ],
-    40500: [
-        [40500],
-        [32400, 8100],
-        [24300, 16200],
-        [8100, 8100, 8100, 8100, 8100],
-    ],
-}
-
-
-for code, code_list in CODES_MAP.items():
-    assert code == sum(code_list), f"sum  {code_list} not equal to code {code}"
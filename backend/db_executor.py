@@ -0,0 +1,137 @@
+"""Пул потоков для запросов к БД из асинхронного кода бота.
+
+sync_to_async с thread_sensitive=True выполняет весь ORM бота в одном общем
+потоке, и медленный запрос одного чата задерживает остальные. Здесь запросы
+идут в ограниченный пул из DB_EXECUTOR_THREADS потоков. Соединения Django
+привязаны к потоку, поэтому у каждого потока своё соединение; до и после
+вызова close_old_connections закрывает сломанные и отжившие CONN_MAX_AGE.
+
+    await db_sync_to_async(order.grab_codes)()
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_monitor = None
+
+
+class DBExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor, считающий ожидание в очереди и занятость потоков."""
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix="db")
+        self.size = max_workers
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self._reset_window()
+
+    def _reset_window(self):
+        self.calls = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.peak_active = self.active
+        self.peak_queued = self.queued
+
+    def submit(self, fn, /, *args, **kwargs):
+        enqueued_at = time.monotonic()
+        with self._stats_lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        def run():
+            started_at = time.monotonic()
+            wait = started_at - enqueued_at
+            with self._stats_lock:
+                self.queued -= 1
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+            close_old_connections()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                close_old_connections()
+                with self._stats_lock:
+                    self.active -= 1
+                    self.calls += 1
+                    self.run_total += time.monotonic() - started_at
+
+        return super().submit(run)
+
+    def get_stats(self, reset: bool = False) -> dict:
+        """Статистика с прошлого сброса: ожидание в очереди и пик занятости."""
+        with self._stats_lock:
+            stats = {
+                "threads": self.size,
+                "active": self.active,
+                "queued": self.queued,
+                "peak_active": self.peak_active,
+                "peak_queued": self.peak_queued,
+                "calls": self.calls,
+                "wait_avg_ms": self.wait_total / self.calls * 1000 if self.calls else 0.0,
+                "wait_max_ms": self.wait_max * 1000,
+                "run_avg_ms": self.run_total / self.calls * 1000 if self.calls else 0.0,
+            }
+            if reset:
+                self._reset_window()
+        return stats
+
+
+def get_db_executor() -> DBExecutor:
+    """Пул текущего процесса; после fork создаётся заново."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = DBExecutor(settings.DB_EXECUTOR_THREADS)
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def db_sync_to_async(func):
+    """sync_to_async через пул БД. Пул выбирается при вызове, а не при
+    декорировании, чтобы функции, обёрнутые при импорте, работали и в
+    воркерах, созданных fork."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await sync_to_async(
+            func, thread_sensitive=False, executor=get_db_executor()
+        )(*args, **kwargs)
+
+    return wrapper
+
+
+async def monitor_db_executor():
+    """Раз в DB_EXECUTOR_STATS_PERIOD секунд пишет в лог статистику пула."""
+    while True:
+        await asyncio.sleep(settings.DB_EXECUTOR_STATS_PERIOD)
+        stats = get_db_executor().get_stats(reset=True)
+        text = ", ".join(
+            f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+            for key, value in stats.items()
+        )
+        if stats["peak_queued"]:
+            logger.warning(f"DB executor saturated: {text}")
+        else:
+            logger.info(f"DB executor: {text}")
+
+
+def start_db_executor_monitor():
+    global _monitor
+    if _monitor is None or _monitor.done():
+        _monitor = asyncio.create_task(monitor_db_executor())
+    return _monitor
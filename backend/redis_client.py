@@ -0,0 +1,17 @@
+from functools import cache
+
+import redis
+import redis.asyncio as aredis
+from django.conf import settings
+
+
+@cache
+def get_redis() -> redis.Redis:
+    """Общий клиент Redis процесса, соединения берутся из его пула."""
+    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+
+@cache
+def get_aredis() -> aredis.Redis:
+    """Асинхронный клиент Redis для бота."""
+    return aredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
@@ -76,6 +76,8 @@ DATABASES = {
         "PASSWORD": ENV.str("POSTGRES_PASSWORD"),
         "HOST": ENV.str("POSTGRES_HOST"),
         "PORT": ENV.str("POSTGRES_PORT"),
+        "CONN_MAX_AGE": ENV.int("CONN_MAX_AGE", 60),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
@@ -103,6 +105,9 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "api.throttling.TokenBucketThrottle",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
@@ -145,11 +150,102 @@ CACHES = {
     }
 }
 
+REDIS_URL = f"redis://{ENV.str('REDIS_HOST')}:6379/2"
+
+CODE_POOL_SIZE = ENV.int("CODE_POOL_SIZE", 200)
+CODE_POOL_PENDING_TIMEOUT = ENV.int("CODE_POOL_PENDING_TIMEOUT", 60)
+
+DB_EXECUTOR_THREADS = ENV.int("DB_EXECUTOR_THREADS", 8)
+DB_EXECUTOR_STATS_PERIOD = ENV.int("DB_EXECUTOR_STATS_PERIOD", 60)
+
+# Общий Telegram-клиент задач Celery и сигналов (bot.client)
+TG_CLIENT_CONNECTIONS = ENV.int("TG_CLIENT_CONNECTIONS", 20)
+TG_CLIENT_TIMEOUT = ENV.int("TG_CLIENT_TIMEOUT", 60)
+# Окно склейки уведомлений менеджерам в секундах, 0 - отправлять сразу
+NOTIFY_COALESCE_WINDOW = ENV.int("NOTIFY_COALESCE_WINDOW", 3)
+
+# Сервис активации кодов (codes.activation, manage.py runactivator)
+ACTIVATION_MAX_ORDERS = ENV.int("ACTIVATION_MAX_ORDERS", 50)
+ACTIVATION_SWEEP_PERIOD = ENV.int("ACTIVATION_SWEEP_PERIOD", 60)
+# Одновременных запросов к активатору; активатора нет в списке - без ограничения.
+ACTIVATOR_CONCURRENCY = {
+    "ucodeium": ENV.int("ACTIVATOR_CONCURRENCY_UCODEIUM", 10),
+    "kokos": ENV.int("ACTIVATOR_CONCURRENCY_KOKOS", 5),
+    "fars": ENV.int("ACTIVATOR_CONCURRENCY_FARS", 5),
+}
+# Здоровье активаторов и circuit breaker (codes.health)
+ACTIVATOR_HEALTH_WINDOW = ENV.int("ACTIVATOR_HEALTH_WINDOW", 900)
+ACTIVATOR_HEALTH_CACHE_TTL = ENV.int("ACTIVATOR_HEALTH_CACHE_TTL", 30)
+ACTIVATOR_HEALTH_MIN_ATTEMPTS = ENV.int("ACTIVATOR_HEALTH_MIN_ATTEMPTS", 5)
+ACTIVATOR_HEALTH_MIN_SCORE = ENV.float("ACTIVATOR_HEALTH_MIN_SCORE", 0.5)
+ACTIVATOR_BREAKER_FAILURES = ENV.int("ACTIVATOR_BREAKER_FAILURES", 5)
+ACTIVATOR_BREAKER_COOLDOWN = ENV.int("ACTIVATOR_BREAKER_COOLDOWN", 60)
+ACTIVATOR_ATTEMPTS_RETENTION_DAYS = ENV.int("ACTIVATOR_ATTEMPTS_RETENTION_DAYS", 30)
+
+# HTTP-клиент активаторов и платёжек (payments.http)
+HTTP_CONNECTIONS_PER_HOST = ENV.int("HTTP_CONNECTIONS_PER_HOST", 20)
+HTTP_KEEPALIVE_TIMEOUT = ENV.int("HTTP_KEEPALIVE_TIMEOUT", 15)
+HTTP_CONNECT_TIMEOUT = ENV.float("HTTP_CONNECT_TIMEOUT", 5)
+HTTP_READ_TIMEOUT = ENV.float("HTTP_READ_TIMEOUT", 60)
+HTTP_RETRIES = ENV.int("HTTP_RETRIES", 2)
+HTTP_RETRY_BACKOFF = ENV.float("HTTP_RETRY_BACKOFF", 0.5)
+
+BOT_MAX_CONCURRENT_UPDATES = ENV.int("BOT_MAX_CONCURRENT_UPDATES", 32)
+BOT_MAX_CHAT_QUEUE = ENV.int("BOT_MAX_CHAT_QUEUE", 5)
+BOT_MAX_PENDING_UPDATES = ENV.int("BOT_MAX_PENDING_UPDATES", 500)
+
+# Лимиты backend.throttling: "<scope>:<маршрут>[:<категория>]" -> "N/период".
+THROTTLE_RATES = {
+    "bot:default": ENV.str("THROTTLE_BOT_DEFAULT", "60/min"),
+    "bot:message": ENV.str("THROTTLE_BOT_MESSAGE", "30/min"),
+    "bot:itm:view": ENV.str("THROTTLE_BOT_ITEM_VIEW", "30/min"),
+    "bot:itm:proceed": ENV.str("THROTTLE_BOT_ITEM_PROCEED", "10/min"),
+    "api:default": ENV.str("THROTTLE_API_DEFAULT", "120/min"),
+    "api:orders:create": ENV.str("THROTTLE_API_ORDERS_CREATE", "30/min"),
+    "api:payments:create": ENV.str("THROTTLE_API_PAYMENTS_CREATE", "10/min"),
+    # Все отправки рассылок бота, лимит Telegram - около 30 сообщений в секунду.
+    "mailing:default": ENV.str("THROTTLE_MAILING", "25/s"),
+}
+
+MAILING_CONCURRENCY = ENV.int("MAILING_CONCURRENCY", 16)
+MAILING_CHUNK_SIZE = ENV.int("MAILING_CHUNK_SIZE", 1000)
+MAILING_PROGRESS_PERIOD = ENV.int("MAILING_PROGRESS_PERIOD", 5)
+
+TG_USER_CACHE_TTL = ENV.int("TG_USER_CACHE_TTL", 600)
+TG_USER_LOCAL_TTL = ENV.int("TG_USER_LOCAL_TTL", 10)
+TG_USER_LOCAL_SIZE = ENV.int("TG_USER_LOCAL_SIZE", 1000)
+
 LC_MAX_STR_LENGTH_DISPLAYED_AS_TEXTINPUT = 50
 LC_ENABLE_PRETTY_INPUT = True
 LIVECONFIGS_SYNCWRITE = True
 LC_CACHE_TTL = 10
+LC_LOCAL_CACHE_TTL = ENV.int("LC_LOCAL_CACHE_TTL", 300)
 
 CELERY_BROKER_URL = f"redis://{ENV.str('REDIS_HOST')}:6379/10"
 CELERY_RESULT_BACKEND = f"redis://{ENV.str('REDIS_HOST')}:6379/11"
 CELERY_TASK_TRACK_STARTED = True
+# Очереди по типу работы, у каждой свой воркер (docker-compose, README):
+# fulfilment - выполнение заказов; notifications - сообщения в Telegram; maintenance -
+# синхронизация каталога SmileOne и сверки. Задачи без маршрута - в default,
+# её слушает воркер maintenance.
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_ROUTES = {
+    "orders.tasks.process_order_task": {"queue": "fulfilment", "priority": 0},
+    "codes.tasks.refill_code_pool_task": {"queue": "fulfilment", "priority": 6},
+    "bot.tasks.send_notification_task": {"queue": "notifications", "priority": 3},
+    "bot.tasks.flush_notifications_task": {"queue": "notifications", "priority": 6},
+    "items.tasks.*": {"queue": "maintenance"},
+    "codes.tasks.recount_code_stock_task": {"queue": "maintenance"},
+    "codes.tasks.maintain_code_pools_task": {"queue": "maintenance"},
+    "codes.tasks.prune_activator_attempts_task": {"queue": "maintenance"},
+}
+# Приоритеты Redis-брокера: 0 - наивысший, сообщения без приоритета - 6.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "queue_order_strategy": "priority",
+    "priority_steps": [0, 3, 6, 9],
+    "sep": ":",
+}
+CELERY_TASK_DEFAULT_PRIORITY = 6
+# Воркер берёт следующую задачу только освободившись: очередь не копится
+# в предвыборке и срочные задачи не ждут за уже взятыми.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from liveconfigs.models import ConfigRow
+
+from .config_cache import publish_config_update
+
+
+@receiver(post_save, sender=ConfigRow)
+@receiver(post_delete, sender=ConfigRow)
+def config_row_changed(sender, **kwargs):
+    transaction.on_commit(publish_config_update, robust=True)
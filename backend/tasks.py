@@ -1,5 +1,13 @@
+from codes.tasks import (maintain_code_pools_task, prune_activator_attempts_task,
+                         recount_code_stock_task)
 from items.tasks import update_smileone_items_task
 
 
 async def start_background_tasks():
     update_smileone_items_task.delay()
+    recount_code_stock_task.delay()
+    prune_activator_attempts_task.delay()
+
+
+async def start_code_pools_tasks():
+    maintain_code_pools_task.delay()
@@ -0,0 +1,95 @@
+"""Ограничение частоты запросов: token bucket в Redis.
+
+Общий лимитер для бота (bot.middlewares.ThrottlingMiddleware) и API
+(api.throttling.TokenBucketThrottle). Лимиты задаются в
+settings.THROTTLE_RATES строками DRF вида "30/min" под ключами
+"<scope>:<маршрут>[:<категория>]"; берётся самый точный ключ, затем
+"<scope>:default". Пустой лимит - без ограничений. Корзина заполняется
+до N токенов со скоростью N за период, так что разрешён всплеск в N
+запросов. Проверка - один EVAL в Redis, без запросов к Postgres; если
+Redis недоступен, запросы пропускаются.
+"""
+import logging
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from backend.redis_client import get_aredis, get_redis
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = "throttle:{rule}:{ident}"
+PERIODS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+
+# KEYS: корзина. ARGV: ёмкость, период в секундах.
+# Возвращает {1, "0"} или {0, "<секунд до следующего токена>"}.
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local rate = capacity / period
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(period))
+return {allowed, tostring(wait)}
+"""
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """Разбирает лимит вида "30/min" в (30, 60)."""
+    amount, period = rate.split("/")
+    return int(amount), PERIODS[period[0]]
+
+
+def get_rule(scope: str, *parts: str | None) -> tuple[str, str] | None:
+    """Самый точный настроенный лимит для маршрута: (ключ, лимит) или None."""
+    parts = [str(part) for part in parts if part is not None]
+    rates = settings.THROTTLE_RATES
+    for end in range(len(parts), 0, -1):
+        rule = ":".join((scope, *parts[:end]))
+        if rule in rates:
+            return (rule, rates[rule]) if rates[rule] else None
+    rule = f"{scope}:default"
+    return (rule, rates[rule]) if rates.get(rule) else None
+
+
+def _parse_result(result) -> tuple[bool, float]:
+    allowed, wait = result
+    return bool(int(allowed)), float(wait)
+
+
+def take(rule: str, rate: str, ident: str) -> tuple[bool, float]:
+    """Забирает токен. Возвращает (разрешено, секунд до следующего токена)."""
+    try:
+        return _parse_result(
+            get_redis().eval(
+                TAKE_SCRIPT, 1, BUCKET_KEY.format(rule=rule, ident=ident), *parse_rate(rate)
+            )
+        )
+    except RedisError:
+        logger.exception(f"Throttling is unavailable for {rule}")
+        return True, 0.0
+
+
+async def atake(rule: str, rate: str, ident: str) -> tuple[bool, float]:
+    try:
+        return _parse_result(
+            await get_aredis().eval(
+                TAKE_SCRIPT, 1, BUCKET_KEY.format(rule=rule, ident=ident), *parse_rate(rate)
+            )
+        )
+    except RedisError:
+        logger.exception(f"Throttling is unavailable for {rule}")
+        return True, 0.0
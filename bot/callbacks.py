@@ -1,7 +1,10 @@
+from datetime import datetime, timedelta, timezone
 from enum import IntEnum, StrEnum
 
 from aiogram.filters.callback_data import CallbackData
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 class MenuCD(CallbackData, prefix="men"):
     class Category(StrEnum):
@@ -49,13 +52,31 @@ class OrderCD(CallbackData, prefix="ordr"):
 
 
 class HistoryCD(CallbackData, prefix="hstr"):
+    """Страница истории: ключ (created_at в мкс, id) заказа на границе."""
+
     class Category(IntEnum):
         DAY = 1
         WEEK = 7
         MONTH = 30
 
     category: Category
-    page: int = 1
+    ts: int | None = None
+    id: int | None = None
+    backward: bool = False
+
+    @property
+    def cursor(self) -> tuple[datetime, int] | None:
+        if self.id is None:
+            return None
+        return EPOCH + timedelta(microseconds=self.ts), self.id
+
+    def next_to(self, order, backward: bool = False) -> "HistoryCD":
+        return HistoryCD(
+            category=self.category,
+            ts=(order.created_at - EPOCH) // timedelta(microseconds=1),
+            id=order.id,
+            backward=backward,
+        )
 
 
 class FolderCD(CallbackData, prefix="fldr"):
@@ -0,0 +1,99 @@
+"""Telegram-клиент для синхронного кода: задач Celery, сигналов, админки.
+
+Один Bot на процесс с постоянной aiohttp-сессией (до TG_CLIENT_CONNECTIONS
+keep-alive соединений к api.telegram.org) и собственным event loop в
+фоновом потоке. Синхронный код отдаёт корутину в этот loop и ждёт результат,
+поэтому задача не создаёт ни loop, ни сессию, ни TLS-соединение.
+
+    get_telegram_client().call(asend_notification, chat_id, text)
+
+В воркере Celery клиент создаётся на worker_process_init и закрывается на
+worker_process_shutdown; в остальных процессах - при первом вызове.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from celery.signals import worker_process_init, worker_process_shutdown
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class TelegramClient:
+    """Bot и event loop, в котором живёт его сессия."""
+
+    def __init__(self, token: str):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self._run_loop, name="telegram-client", daemon=True
+        )
+        self.thread.start()
+        self.bot = self.run(self._create_bot(token))
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _create_bot(self, token: str) -> Bot:
+        # Сессия создаётся внутри loop: aiohttp привязывает её к нему.
+        return Bot(token, session=AiohttpSession(limit=settings.TG_CLIENT_CONNECTIONS))
+
+    def run(self, coro):
+        """Выполняет корутину в loop клиента и возвращает её результат."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout=settings.TG_CLIENT_TIMEOUT)
+
+    def call(self, func, *args, **kwargs):
+        """Вызывает корутинную функцию func(bot, *args, **kwargs)."""
+        return self.run(func(self.bot, *args, **kwargs))
+
+    def close(self):
+        if not self.loop.is_running():
+            return
+        try:
+            self.run(self.bot.session.close())
+        except Exception:
+            logger.exception("Can't close Telegram session")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+def get_telegram_client() -> TelegramClient:
+    """Клиент текущего процесса; после fork создаётся заново."""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = TelegramClient(settings.ENV.str("TG_TOKEN_BOT"))
+            _client_pid = os.getpid()
+        return _client
+
+
+def close_telegram_client():
+    global _client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+
+
+atexit.register(close_telegram_client)
+
+
+@worker_process_init.connect
+def init_worker_client(**kwargs):
+    get_telegram_client()
+    logger.info(f"Telegram client is ready in worker {os.getpid()}")
+
+
+@worker_process_shutdown.connect
+def close_worker_client(**kwargs):
+    close_telegram_client()
@@ -17,14 +17,16 @@ logger = logging.getLogger(__name__)
 
 
 @router.callback_query(OrderCD.filter(F.action == OrderCD.Action.complete))
-async def make_order_completed(query: CallbackQuery, callback_data: OrderCD, state: FSMContext):
-    is_admin = await TgUser.objects.filter(tg_id=query.from_user.id, is_admin=True).aexists()
+async def make_order_completed(
+    query: CallbackQuery, callback_data: OrderCD, state: FSMContext, tg_user: TgUser | None
+):
+    is_admin = tg_user is not None and tg_user.is_admin
     if not is_admin:
         text = f'Not admin can not complete the task {callback_data.id}'
         await query.answer(text)
         logger.info(text)
         return
-    order = await Order.objects.aget(id=callback_data.id)
+    order = await Order.objects.for_rendering().aget(id=callback_data.id)
     order.is_completed = True
     await order.asave(update_fields=('is_completed',))
     text = f'{query.message.text}\n✅'
@@ -32,14 +34,16 @@ async def make_order_completed(query: CallbackQuery, callback_data: OrderCD, sta
 
 
 @router.callback_query(OrderCD.filter(F.action == OrderCD.Action.cancel))
-async def make_order_cancelled(query: CallbackQuery, callback_data: OrderCD, state: FSMContext):
-    is_admin = await TgUser.objects.filter(tg_id=query.from_user.id, is_admin=True).aexists()
+async def make_order_cancelled(
+    query: CallbackQuery, callback_data: OrderCD, state: FSMContext, tg_user: TgUser | None
+):
+    is_admin = tg_user is not None and tg_user.is_admin
     if not is_admin:
         text = f'Not admin can not cancel the task {callback_data.id}'
         await query.answer(text)
         logger.info(text)
         return
-    order = await Order.objects.aget(id=callback_data.id)
+    order = await Order.objects.for_rendering().aget(id=callback_data.id)
     await order.acancel()
     text = f'{await order.aadmin_str()}'
     await query.message.edit_text(
@@ -48,8 +52,8 @@ async def make_order_cancelled(query: CallbackQuery, callback_data: OrderCD, sta
 
 
 @router.message(F.text == '/regchat')
-async def get_group_chat_id(message: Message, state: FSMContext):
+async def get_group_chat_id(message: Message, state: FSMContext, tg_user: TgUser | None):
     logger.info(f'ID чата для регистрации {message.chat.id}')
-    is_admin = await TgUser.objects.filter(tg_id=message.from_user.id, is_admin=True).aexists()
+    is_admin = tg_user is not None and tg_user.is_admin
     if is_admin:
         await message.answer(f'Your CHAT ID {message.chat.id}')
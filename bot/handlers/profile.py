@@ -4,13 +4,12 @@ from decimal import Decimal
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
-from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.core.paginator import Paginator
 from django.utils import timezone
 
 import bot.keyboards as kb
 from backend.config import FEATURES_CONFIG, PAYMENT_CONFIG
+from backend.config_cache import aget_config, aget_configs
 from bot.callbacks import ApiCD, HistoryCD, MenuCD, ProfileCD
 from bot.states import TopUpState
 from bot.utils import validated_payment_amount
@@ -19,6 +18,7 @@ from users.models import TgUser
 from payments.payment import create_codeepay_payment
 
 ENV = settings.ENV
+HISTORY_PAGE_SIZE = 25
 
 router = Router(name=__name__)
 
@@ -45,16 +45,18 @@ async def get_history(query: CallbackQuery, callback_data: MenuCD, state: FSMCon
 
 @router.callback_query(HistoryCD.filter(F.category))
 async def get_history_slice(
-    query: CallbackQuery, callback_data: HistoryCD, state: FSMContext
+    query: CallbackQuery, callback_data: HistoryCD, state: FSMContext, tg_user: TgUser
 ):
-    tg_user = await TgUser.objects.aget(tg_id=query.from_user.id)
     target_date = timezone.now() - timedelta(days=callback_data.category)
-    orders = await sync_to_async(
-        lambda: list(Order.objects.filter(tg_user=tg_user, created_at__gte=target_date))
-    )()
-    paginator = Paginator(orders, 25)
-    p = paginator.page(callback_data.page)
-    order_text = "\n".join([order.to_str() for order in p.object_list])
+    cursor = callback_data.cursor
+    orders, has_more = await Order.aget_history_page(
+        tg_user, target_date, HISTORY_PAGE_SIZE, cursor, callback_data.backward
+    )
+    if callback_data.backward:
+        has_previous, has_next = has_more, True
+    else:
+        has_previous, has_next = cursor is not None, has_more
+    order_text = "\n".join([order.to_str() for order in orders])
     text = (
         f"There your orders history for last {callback_data.category} days:\n\n"
         f"{order_text}"
@@ -62,9 +64,8 @@ async def get_history_slice(
     await query.message.edit_text(
         text,
         reply_markup=await kb.get_paginated_inline(
-            p.has_previous(),
-            p.has_next(),
-            callback_data,
+            callback_data.next_to(orders[0], backward=True) if has_previous and orders else None,
+            callback_data.next_to(orders[-1]) if has_next and orders else None,
             back_to=ProfileCD(category=ProfileCD.Category.HISOTORY),
         ),
     )
@@ -73,11 +74,12 @@ async def get_history_slice(
 @router.callback_query(
     ProfileCD.filter((F.category == ProfileCD.Category.POINTS) & (F.action == None))  # NOQA
 )  # NOQA
-async def get_points(query: CallbackQuery, callback_data: MenuCD, state: FSMContext):
-    if not await sync_to_async(lambda: FEATURES_CONFIG.POINTS_SYSTEM_ENABLED, thread_sensitive=True)():
+async def get_points(
+    query: CallbackQuery, callback_data: MenuCD, state: FSMContext, tg_user: TgUser
+):
+    if not await aget_config(FEATURES_CONFIG, "POINTS_SYSTEM_ENABLED"):
         await query.answer("The points system is currently disabled.", show_alert=True)
         return
-    tg_user = await TgUser.objects.aget(tg_id=query.from_user.id)
     show_redeem = tg_user.points > tg_user.POINTS_RATIO
     await query.message.edit_text(
         text=f"You have {tg_user.points} points",
@@ -88,8 +90,9 @@ async def get_points(query: CallbackQuery, callback_data: MenuCD, state: FSMCont
 @router.callback_query(
     ProfileCD.filter((F.category == ProfileCD.Category.BALANCE) & (F.action == None))  # NOQA
 )  # NOQA
-async def get_balance(query: CallbackQuery, callback_data: MenuCD, state: FSMContext):
-    tg_user = await TgUser.objects.aget(tg_id=query.from_user.id)
+async def get_balance(
+    query: CallbackQuery, callback_data: MenuCD, state: FSMContext, tg_user: TgUser
+):
     await query.message.edit_text(
         text=f"You have {tg_user.balance} USD",
         reply_markup=await kb.get_balance_inline(),
@@ -105,7 +108,7 @@ async def ask_topup_amount(
 
 
 @router.message(TopUpState.amount)
-async def gen_topup(message: Message, state: FSMContext):
+async def gen_topup(message: Message, state: FSMContext, tg_user: TgUser):
     try:
         text = message.text.replace(",", ".")
         amount = float(text)
@@ -116,15 +119,18 @@ async def gen_topup(message: Message, state: FSMContext):
         await message.answer("Can't understand amount. Please try again.")
         return
     topup, _ = await TopUp.objects.aget_or_create(
-        tg_user=await TgUser.objects.aget(tg_id=message.from_user.id),
+        tg_user=tg_user,
         amount=Decimal(str(amount)).quantize(Decimal("0.001")),
         is_paid=False,
         is_topped=False,
     )
+    payment_text, lifetime = await aget_configs(
+        PAYMENT_CONFIG, "PAYMENT_TEXT", "TOPUP_LIFETIME"
+    )
     text = (
         f"Please topup exactly that amount: {topup.to_pay}\n"
-        f"{await sync_to_async(lambda: PAYMENT_CONFIG.PAYMENT_TEXT)()}\n"
-        f"<b>Valid for {await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_LIFETIME)()} minutes</b>"
+        f"{payment_text}\n"
+        f"<b>Valid for {lifetime} minutes</b>"
     )
     await message.answer(text, parse_mode="HTML")
     await state.clear()
@@ -133,11 +139,12 @@ async def gen_topup(message: Message, state: FSMContext):
 @router.callback_query(
     ProfileCD.filter((F.category == ProfileCD.Category.POINTS) & (F.action))
 )
-async def redeem_points(query: CallbackQuery, callback_data: MenuCD, state: FSMContext):
-    if not await sync_to_async(lambda: FEATURES_CONFIG.POINTS_SYSTEM_ENABLED, thread_sensitive=True)():
+async def redeem_points(
+    query: CallbackQuery, callback_data: MenuCD, state: FSMContext, tg_user: TgUser
+):
+    if not await aget_config(FEATURES_CONFIG, "POINTS_SYSTEM_ENABLED"):
         await query.answer("The points system is currently disabled.", show_alert=True)
         return
-    tg_user = await TgUser.objects.aget(tg_id=query.from_user.id)
     res = await tg_user.aredeem_points()
     if res:
         await tg_user.arefresh_from_db()
@@ -173,8 +180,7 @@ API_INFO_TEXT = """
 
 
 @router.callback_query(MenuCD.filter(F.category == MenuCD.Category.api))
-async def show_api_key(query: CallbackQuery, state: FSMContext):
-    tg_user = await TgUser.objects.aget(tg_id=query.from_user.id)
+async def show_api_key(query: CallbackQuery, state: FSMContext, tg_user: TgUser):
     api_key = await tg_user.aget_or_generate_api_key()
     await query.message.edit_text(
         text=API_INFO_TEXT.format(docs_url=docs_url, api_key=api_key),
@@ -185,8 +191,7 @@ async def show_api_key(query: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(ApiCD.filter(F.action == "regenerate"))
-async def regenerate_api_key(query: CallbackQuery, state: FSMContext):
-    tg_user = await TgUser.objects.aget(tg_id=query.from_user.id)
+async def regenerate_api_key(query: CallbackQuery, state: FSMContext, tg_user: TgUser):
     new_api_key = await tg_user.aregenerate_api_key()
     await query.message.edit_text(
         text=API_INFO_TEXT.format(docs_url=docs_url, api_key=new_api_key),
@@ -202,24 +207,26 @@ async def ask_topup_ruble_amount(
     query: CallbackQuery, callback_data: MenuCD, state: FSMContext
 ):
     await state.set_state(TopUpState.ruble_amount)
+    comission, exchange_rate = await aget_configs(
+        PAYMENT_CONFIG, "TOPUP_RUBLE_COMISSION", "RUB_USDT_EXCHANGE_RATE"
+    )
     await query.message.edit_text(
-        f"Comission: {await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_RUBLE_COMISSION)()}%\n"
-        f"Exchange rate: {await sync_to_async(lambda: PAYMENT_CONFIG.RUB_USDT_EXCHANGE_RATE)()}\n\n"
+        f"Comission: {comission}%\n"
+        f"Exchange rate: {exchange_rate}\n\n"
         "Write amount to topup in RUB")
 
 
 @router.message(TopUpState.ruble_amount)
-async def gen_rub_topup(message: Message, state: FSMContext):
-    tg_user = await TgUser.objects.aget(tg_id=message.from_user.id)
+async def gen_rub_topup(message: Message, state: FSMContext, tg_user: TgUser):
     try:
         amount = await validated_payment_amount(message.text, 'RUB')
     except ValueError as e:
         await message.answer(f"{e}")
         return
     topup = await create_codeepay_payment(tg_user, amount)
-    TOPUP_RUBLE_COMISSION = await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_RUBLE_COMISSION)()
-    RUB_USDT_EXCHANGE_RATE = await sync_to_async(lambda: PAYMENT_CONFIG.RUB_USDT_EXCHANGE_RATE)()
-    TOPUP_LIFETIME = await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_LIFETIME)()
+    TOPUP_RUBLE_COMISSION, RUB_USDT_EXCHANGE_RATE, TOPUP_LIFETIME = await aget_configs(
+        PAYMENT_CONFIG, "TOPUP_RUBLE_COMISSION", "RUB_USDT_EXCHANGE_RATE", "TOPUP_LIFETIME"
+    )
     text = (
         '💰 <b>Сведения по оплате</b>\n'
         f'• <b>Сумма к оплате:</b> {topup.to_pay} ₽\n'
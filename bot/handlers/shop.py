@@ -1,29 +1,20 @@
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
-from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.db import transaction
 
 import bot.keyboards as kb
 from backend.config import TEXT_CONFIG
+from backend.config_cache import aget_config
+from backend.db_executor import db_sync_to_async
 from bot.callbacks import FolderCD, ItemCD, MenuCD
 from bot.states import OrderState
 from bot.utils import asend_text_or_txt, generate_codes_text
-from items.models import (
-    CategoryDescription,
-    DiamondItem,
-    Folder,
-    GiftcardItem,
-    HomeVoteItem,
-    Item,
-    ManualCategory,
-    OffersItem,
-    PopularityItem,
-    PUBGUCItem,
-    StarItem,
-    StockCodesItem,
-)
+from items.catalog import aget_catalog
+from items.models import Item, aresolve_stock
 from orders.models import Order
+from orders.rendering import load_rendering_data
 from orders.utils import get_user_zone_id
 from users.models import TgUser
 
@@ -34,26 +25,23 @@ router = Router(name=__name__)
 
 
 async def get_shop_text(base_text: str, category_key: str) -> str:
+    catalog = await aget_catalog()
     shop_description = ""
     try:
         if category_key.startswith("manual_"):
             category_id = int(category_key.split("_")[1])
-            manual_cat = await ManualCategory.objects.filter(id=category_id).afirst()
+            manual_cat = catalog.get_manual_category(category_id)
             if manual_cat and manual_cat.description:
                 shop_description = manual_cat.description
         else:
-            desc_obj = await CategoryDescription.objects.filter(
-                category=category_key
-            ).afirst()
-            if desc_obj and desc_obj.description:
-                shop_description = desc_obj.description
+            shop_description = catalog.descriptions.get(category_key, "")
     except (ValueError, IndexError):
         pass
 
     if shop_description:
         return f"{shop_description}\n\n{base_text}"
 
-    default_shop_info = await sync_to_async(lambda: TEXT_CONFIG.SHOP_INFO_TEXT)()
+    default_shop_info = await aget_config(TEXT_CONFIG, "SHOP_INFO_TEXT")
     if default_shop_info:
         return f"{default_shop_info}\n\n{base_text}"
 
@@ -62,7 +50,8 @@ async def get_shop_text(base_text: str, category_key: str) -> str:
 
 @router.callback_query(MenuCD.filter(F.category == MenuCD.Category.pubg_uc))
 async def get_uc_items(query: CallbackQuery, callback_data: MenuCD, state: FSMContext):
-    items = await PUBGUCItem.aitems()
+    catalog = await aget_catalog()
+    items = catalog.active_items(Item.Category.PUBG_UC)
     text = await get_shop_text("Choose item", category_key=callback_data.category)
     await query.message.edit_text(
         text=text, reply_markup=await kb.get_items_inline(items)
@@ -73,13 +62,26 @@ async def get_uc_items(query: CallbackQuery, callback_data: MenuCD, state: FSMCo
 async def get_codes_items(
     query: CallbackQuery, callback_data: MenuCD, state: FSMContext
 ):
+    catalog = await aget_catalog()
     items = [
-        *(await StockCodesItem.aitems(folder__isnull=True)),
-        *(await GiftcardItem.aitems(folder__isnull=True)),
+        *sorted(
+            (
+                item
+                for item in catalog.active_items(Item.Category.CODES)
+                if item.folder_id is None
+            ),
+            # Как order_by("amount") в Postgres: товары без номинала в конце.
+            key=lambda item: (item.amount is None, item.amount or 0),
+        ),
+        *(
+            item
+            for item in catalog.active_items(Item.Category.GIFTCARD)
+            if item.folder_id is None
+        ),
     ]
     folders = [
-        *(await Folder.aget(category=Item.Category.CODES)),
-        *(await Folder.aget(category=Item.Category.GIFTCARD)),
+        *catalog.category_folders(Item.Category.CODES),
+        *catalog.category_folders(Item.Category.GIFTCARD),
     ]
     base_text = "Checkout your desired GiftCards from the list. All Cards are 1 Year Stockable🥰"
     text = await get_shop_text(base_text, category_key=callback_data.category)
@@ -95,8 +97,12 @@ async def get_codes_items(
 async def get_folder_items(
     query: CallbackQuery, callback_data: FolderCD, state: FSMContext
 ):
-    folder = await Folder.objects.aget(id=callback_data.id)
-    items = await folder.aitems()
+    catalog = await aget_catalog()
+    folder = catalog.get_folder(callback_data.id)
+    if folder is None:
+        await query.answer("Not available at the moment")
+        return
+    items = catalog.folder_items(folder.id)
 
     back_callback = MenuCD(category="root")
     description_key = callback_data.category
@@ -128,7 +134,12 @@ async def get_pop_home_root(
 async def get_popularity_items(
     query: CallbackQuery, callback_data: MenuCD, state: FSMContext
 ):
-    items = await PopularityItem.aitems(folder__isnull=True)
+    catalog = await aget_catalog()
+    items = [
+        item
+        for item in catalog.active_items(Item.Category.POPULARITY)
+        if item.folder_id is None
+    ]
     text = await get_shop_text("Choose item", category_key=callback_data.category)
     await query.message.edit_text(
         text=text,
@@ -142,7 +153,12 @@ async def get_popularity_items(
 async def get_home_vote_items(
     query: CallbackQuery, callback_data: MenuCD, state: FSMContext
 ):
-    items = await HomeVoteItem.aitems(folder__isnull=True)
+    catalog = await aget_catalog()
+    items = [
+        item
+        for item in catalog.active_items(Item.Category.HOME_VOTE)
+        if item.folder_id is None
+    ]
     text = await get_shop_text("Choose item", category_key=callback_data.category)
     await query.message.edit_text(
         text=text,
@@ -157,7 +173,12 @@ async def get_home_vote_items(
 async def get_offer_items(
     query: CallbackQuery, callback_data: MenuCD, state: FSMContext
 ):
-    items = await OffersItem.aitems()
+    catalog = await aget_catalog()
+    items = [
+        item
+        for item in catalog.active_items(Item.Category.OFFERS)
+        if item.manual_category_id is None
+    ]
     text = await get_shop_text("Choose item", category_key=callback_data.category)
     await query.message.edit_text(
         text=text, reply_markup=await kb.get_items_inline(items)
@@ -169,9 +190,8 @@ async def get_manual_category_items(
     query: CallbackQuery, callback_data: MenuCD, state: FSMContext
 ):
     category_id = int(callback_data.category.split("_")[1])
-    items = await sync_to_async(list)(
-        Item.objects.filter(manual_category_id=category_id, is_active=True)
-    )
+    catalog = await aget_catalog()
+    items = catalog.manual_category_items(category_id)
     text = await get_shop_text("Choose item", category_key=callback_data.category)
     await query.message.edit_text(
         text=text, reply_markup=await kb.get_items_inline(items)
@@ -182,7 +202,8 @@ async def get_manual_category_items(
 async def get_stars_items(
     query: CallbackQuery, callback_data: MenuCD, state: FSMContext
 ):
-    items = await StarItem.aitems()
+    catalog = await aget_catalog()
+    items = catalog.active_items(Item.Category.STARS)
     text = await get_shop_text("Choose item", category_key=callback_data.category)
     await query.message.edit_text(
         text=text, reply_markup=await kb.get_items_inline(items)
@@ -193,7 +214,8 @@ async def get_stars_items(
 async def get_DiamondItem_items(
     query: CallbackQuery, callback_data: MenuCD, state: FSMContext
 ):
-    items = await DiamondItem.aitems()
+    catalog = await aget_catalog()
+    items = catalog.active_items(Item.Category.DIAMOND)
     text = await get_shop_text("Choose item", category_key=callback_data.category)
     await query.message.edit_text(
         text=text, reply_markup=await kb.get_items_inline(items)
@@ -203,18 +225,21 @@ async def get_DiamondItem_items(
 @router.callback_query(ItemCD.filter(F.action == ItemCD.Action.view))
 async def get_item(query: CallbackQuery, callback_data: ItemCD, state: FSMContext):
     await state.clear()
-    item = await Item.objects.select_related("manual_category").aget(
-        id=callback_data.id
-    )
-    quantity = await item.aget_stock_amount()
+    catalog = await aget_catalog()
+    item = catalog.get_item(callback_data.id)
+    if item is None:
+        await query.answer("Not available at the moment")
+        return
+    quantity = (await aresolve_stock([item]))[item.id]
     if quantity is not None and quantity < 1:
         await query.answer("Not available at the moment")
         return
     await state.update_data(callback_data.model_dump())
 
-    if item.manual_category:
+    manual_category = catalog.get_manual_category(item.manual_category_id)
+    if manual_category:
         await state.set_state(OrderState.pubg_id)
-        prompt_text = item.manual_category.prompt_text
+        prompt_text = manual_category.prompt_text
         await query.message.edit_text(
             f'"{prompt_text}" for {item.value}', reply_markup=None
         )
@@ -249,14 +274,14 @@ async def get_item(query: CallbackQuery, callback_data: ItemCD, state: FSMContex
 
 @router.callback_query(ItemCD.filter(F.action == ItemCD.Action.proceed))
 async def pay_item_by_keyboard(
-    query: CallbackQuery, callback_data: ItemCD, state: FSMContext
+    query: CallbackQuery, callback_data: ItemCD, state: FSMContext, tg_user: TgUser
 ):
     item = await Item.objects.aget(id=callback_data.id)
-    await create_order(state, item, query=query)
+    await create_order(state, item, tg_user, query=query)
 
 
 @router.message(OrderState.pubg_id)
-async def get_pubg_id(message: Message, state: FSMContext):
+async def get_pubg_id(message: Message, state: FSMContext, tg_user: TgUser):
     data = await state.get_data()
     item_id = data["id"]
     item = await Item.objects.select_related("manual_category").aget(id=item_id)
@@ -268,20 +293,20 @@ async def get_pubg_id(message: Message, state: FSMContext):
         Item.Category.OFFERS,
     ):
         if len(message.text) < PUBG_ID_LEN or not message.text.isdigit():
-            text = await sync_to_async(lambda: TEXT_CONFIG.WRONG_PUBGID_MSG)()
+            text = await aget_config(TEXT_CONFIG, "WRONG_PUBGID_MSG")
             await message.answer(text)
             return
 
     await state.update_data(pubg_id=message.text)
     await state.set_state(None)
     text = f"{item.value} for total {item.get_total_price(1)} USD"
-    await create_order(state, item, message=message)
+    await create_order(state, item, tg_user, message=message)
     await state.set_state(None)
 
 
 @router.message(OrderState.user_id)
-async def get_user_id(message: Message, state: FSMContext):
-    text = await sync_to_async(lambda: TEXT_CONFIG.WRONG_PUBGID_MSG)()
+async def get_user_id(message: Message, state: FSMContext, tg_user: TgUser):
+    text = await aget_config(TEXT_CONFIG, "WRONG_PUBGID_MSG")
     try:
         user_id, zone_id = get_user_zone_id(message.text)
     except Exception:
@@ -296,12 +321,12 @@ async def get_user_id(message: Message, state: FSMContext):
     id = data["id"]
     item = await Item.objects.aget(id=id)
     text = f"{item.value} for total {item.get_total_price(1)} USD"
-    await create_order(state, item, message=message)
+    await create_order(state, item, tg_user, message=message)
     await state.set_state(None)
 
 
 @router.message(OrderState.quantity)
-async def get_quantity(message: Message, state: FSMContext):
+async def get_quantity(message: Message, state: FSMContext, tg_user: TgUser):
     try:
         quantity = int(message.text)
     except ValueError:
@@ -317,12 +342,12 @@ async def get_quantity(message: Message, state: FSMContext):
     if (in_stock := await item.aget_stock_amount()) < quantity:
         await message.answer(f"Only {in_stock} {item} remains in stock")
         return
-    await create_order(state, item, message=message)
+    await create_order(state, item, tg_user, message=message)
     await state.set_state(None)
 
 
 @router.message(OrderState.username)
-async def get_username(message: Message, state: FSMContext):
+async def get_username(message: Message, state: FSMContext, tg_user: TgUser):
     if message.text.startswith("/"):
         username = message.text.split("/")[1]
     else:
@@ -331,42 +356,56 @@ async def get_username(message: Message, state: FSMContext):
     id = data["id"]
     await state.update_data(username=username)
     item = await Item.objects.aget(id=id)
-    await create_order(state, item, message=message)
+    await create_order(state, item, tg_user, message=message)
     await state.set_state(None)
 
 
+def place_order(tg_user: TgUser, **fields) -> Order | None:
+    """Создаёт заказ, если хватает баланса; None - не хватает.
+
+    Баланс читается из БД под блокировкой пользователя, а не из кэша
+    tg_user: он проверяется и записывается в Order.balance_before.
+    """
+    with transaction.atomic():
+        locked_user = TgUser.objects.select_for_update().get(id=tg_user.id)
+        if fields["price"] > locked_user.balance:
+            return None
+        return Order.objects.create(
+            tg_user=locked_user, balance_before=locked_user.balance, **fields
+        )
+
+
 async def create_order(
     state: FSMContext,
     item: Item,
+    tg_user: TgUser,
     *,
     message: Message | None = None,
     query: CallbackQuery | None = None,
 ):
-    tg_user = await TgUser.objects.aget(tg_id=(message or query).from_user.id)
     data = await state.get_data()
     quantity = data.get("quantity", 1)
     pubg_id = data.get("pubg_id") or data.get("username")
 
-    price = item.price * quantity
-    if price > tg_user.balance:
-        text = "You do not have enough balance"
-        if message:
-            await message.answer(text)
-        elif query:
-            await query.answer(text)
-        return
-    order = await Order.objects.acreate(
-        tg_user=tg_user,
+    order = await db_sync_to_async(place_order)(
+        tg_user,
         item=item,
         quantity=quantity,
         data=item.to_dict(),
-        price=price,
+        price=item.price * quantity,
         category=item.category,
         pubg_id=pubg_id,
-        balance_before=tg_user.balance,
     )
+    if order is None:
+        text = "You do not have enough balance"
+        if message:
+            await message.answer(text)
+        elif query:
+            await query.answer(text)
+        return
     await tg_user.arefresh_from_db()
-    text = f"Processing order…\n{await order.auser_str()}"
+    await db_sync_to_async(load_rendering_data)(order)
+    text = f"Processing order…\n{order.user_str()}"
     if message:
         new_message = await message.answer(text)
     elif query:
@@ -374,7 +413,7 @@ async def create_order(
         new_message = query.message
     order.message_id = new_message.message_id
     await order.asave(update_fields=("message_id",))
-    text = await sync_to_async(lambda: TEXT_CONFIG.MENU_MSG)()
+    text = await aget_config(TEXT_CONFIG, "MENU_MSG")
     if message:
         await message.answer(text, reply_markup=await kb.get_menu_inline())
     elif query:
@@ -2,12 +2,14 @@ from aiogram import F, Router
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message
-from asgiref.sync import sync_to_async
 from django.conf import settings
 
 import bot.keyboards as kb
 from backend.config import TEXT_CONFIG
+from backend.config_cache import aget_config
+from backend.db_executor import db_sync_to_async
 from bot.callbacks import MenuCD
+from users.cache import invalidate_user
 from users.models import TgUser
 
 ENV = settings.ENV
@@ -17,23 +19,30 @@ router = Router(name=__name__)
 
 
 @router.message(CommandStart(), F.chat.type == 'private')
-async def start(message: Message, state: FSMContext):
+async def start(message: Message, state: FSMContext, tg_user: TgUser | None):
     await state.clear()
-    tg_user = await TgUser.objects.filter(tg_id=message.from_user.id).afirst()
-    if not tg_user:
-        await TgUser.objects.acreate(
-            tg_id=message.from_user.id,
-            username=message.from_user.username,
-            first_name=message.from_user.first_name,
-            last_name=message.from_user.last_name
+    profile = {
+        "username": message.from_user.username,
+        "first_name": message.from_user.first_name,
+        "last_name": message.from_user.last_name,
+    }
+    if tg_user is None or any(getattr(tg_user, name) != value for name, value in profile.items()):
+        # Upsert: повторный /start из другого воркера не упадёт на unique tg_id.
+        await TgUser.objects.abulk_create(
+            [TgUser(tg_id=message.from_user.id, **profile)],
+            update_conflicts=True,
+            unique_fields=("tg_id",),
+            update_fields=(*profile, "updated_at"),
         )
-        text = await sync_to_async(lambda: TEXT_CONFIG.HI_MSG)()
+        await db_sync_to_async(invalidate_user)(message.from_user.id)
+    if tg_user is None:
+        text = await aget_config(TEXT_CONFIG, "HI_MSG")
         await message.answer(text)
-    text = await sync_to_async(lambda: TEXT_CONFIG.MENU_MSG)()
+    text = await aget_config(TEXT_CONFIG, "MENU_MSG")
     await message.answer(text, reply_markup=await kb.get_menu_inline())
 
 
 @router.callback_query(MenuCD.filter(F.category == 'root'))
 async def get_menu(query: CallbackQuery, callback_data: MenuCD, state: FSMContext):
-    text = await sync_to_async(lambda: TEXT_CONFIG.MENU_MSG)()
+    text = await aget_config(TEXT_CONFIG, "MENU_MSG")
     await query.message.edit_text(text, reply_markup=await kb.get_menu_inline())
@@ -1,11 +1,12 @@
-import copy
 import typing
 from enum import StrEnum
 
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from asgiref.sync import sync_to_async
 
 from backend.config import BUTT_CONFIG, FEATURES_CONFIG
+from backend.config_cache import aget_config
+from backend.db_executor import db_sync_to_async
+from items.catalog import cached_by_version
 from items.models import (
     DiamondItem,
     Folder,
@@ -17,11 +18,13 @@ from items.models import (
     PopularityItem,
     PUBGUCItem,
     StarItem,
+    aresolve_stock,
 )
 
 from .callbacks import ApiCD, FolderCD, HistoryCD, ItemCD, MenuCD, OrderCD, ProfileCD
 
 
+@cached_by_version
 async def get_menu_inline():
     markup = InlineKeyboardBuilder()
     if await PUBGUCItem.ahave_active_items():
@@ -46,7 +49,7 @@ async def get_menu_inline():
             text="Offers", callback_data=MenuCD(category=MenuCD.Category.offers)
         )
 
-    manual_categories = await sync_to_async(list)(
+    manual_categories = await db_sync_to_async(list)(
         ManualCategory.objects.filter(is_active=True)
     )
     for cat in manual_categories:
@@ -70,13 +73,14 @@ async def get_menu_inline():
 async def get_back_inline(callback_data):
     markup = InlineKeyboardBuilder()
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=callback_data,
     )
     markup.adjust(1, repeat=True)
     return markup.as_markup()
 
 
+@cached_by_version
 async def get_more_pubg_services_inline():
     markup = InlineKeyboardBuilder()
     if await PopularityItem.ahave_active_items():
@@ -94,7 +98,7 @@ async def get_more_pubg_services_inline():
             callback_data=FolderCD(id=folder.id, category=Item.Category.MORE_PUBG),
         )
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=MenuCD(category="root"),
     )
     markup.adjust(1, repeat=True)
@@ -103,8 +107,9 @@ async def get_more_pubg_services_inline():
 
 async def get_items_inline(items: list[Item], callback_data=MenuCD(category="root")):
     markup = InlineKeyboardBuilder()
+    stock = await aresolve_stock(items)
     for item in items:
-        amount = await item.aget_stock_amount()
+        amount = stock[item.id]
         text = f"{item} {'| ' + str(amount) + ' items' if amount is not None else ''}"
         markup.button(
             text=text,
@@ -113,7 +118,7 @@ async def get_items_inline(items: list[Item], callback_data=MenuCD(category="roo
             ),
         )
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=callback_data,
     )
     markup.adjust(1, repeat=True)
@@ -125,7 +130,7 @@ async def get_profile_inline():
     markup.button(
         text="HISTORY", callback_data=ProfileCD(category=ProfileCD.Category.HISOTORY)
     )
-    if await sync_to_async(lambda: FEATURES_CONFIG.POINTS_SYSTEM_ENABLED, thread_sensitive=True)():
+    if await aget_config(FEATURES_CONFIG, "POINTS_SYSTEM_ENABLED"):
         markup.button(
             text="POINTS", callback_data=ProfileCD(category=ProfileCD.Category.POINTS)
         )
@@ -133,7 +138,7 @@ async def get_profile_inline():
         text="BALANCE", callback_data=ProfileCD(category=ProfileCD.Category.BALANCE)
     )
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=MenuCD(category="root"),
     )
     markup.adjust(1, repeat=True)
@@ -143,15 +148,15 @@ async def get_profile_inline():
 async def get_balance_inline():
     markup = InlineKeyboardBuilder()
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.TOPUP)(),
+        text=await aget_config(BUTT_CONFIG, "TOPUP"),
         callback_data=ProfileCD(category=ProfileCD.Category.BALANCE, action="topup"),
     )
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.TOPUP_RUBLE)(),
+        text=await aget_config(BUTT_CONFIG, "TOPUP_RUBLE"),
         callback_data=ProfileCD(category=ProfileCD.Category.BALANCE, action="topup_ruble"),
     )
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=MenuCD(category=MenuCD.Category.profile),
     )
     markup.adjust(1, repeat=True)
@@ -168,7 +173,7 @@ async def get_points_inline(show_redeem: bool = True):
             ),
         )
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=MenuCD(category=MenuCD.Category.profile),
     )
     markup.adjust(1, repeat=True)
@@ -182,7 +187,7 @@ async def get_order_inline(category: str, id: int):
         callback_data=ItemCD(category=category, id=id, action=ItemCD.Action.proceed),
     )
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=MenuCD(category=category),
     )
     markup.adjust(1, repeat=True)
@@ -216,7 +221,7 @@ async def get_history_inline():
     for cat in HistoryCD.Category:
         markup.button(text=f"{cat} days", callback_data=HistoryCD(category=cat))
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=MenuCD(category=MenuCD.Category.profile),
     )
     markup.adjust(1, repeat=True)
@@ -224,24 +229,20 @@ async def get_history_inline():
 
 
 async def get_paginated_inline(
-    has_previous: bool, has_next: bool, callback_data: HistoryCD, back_to
+    previous_cb: HistoryCD | None, next_cb: HistoryCD | None, back_to
 ):
     markup = InlineKeyboardBuilder()
-    if has_previous or has_next:
-        if has_previous:
-            prev_cb = copy.deepcopy(callback_data)
-            prev_cb.page -= 1
-            markup.button(text="<", callback_data=prev_cb)
+    if previous_cb or next_cb:
+        if previous_cb:
+            markup.button(text="<", callback_data=previous_cb)
         else:
             markup.button(text=" ", callback_data="blabla")
-        if has_next:
-            next_cb = copy.deepcopy(callback_data)
-            next_cb.page += 1
+        if next_cb:
             markup.button(text=">", callback_data=next_cb)
         else:
             markup.button(text=" ", callback_data="blabla")
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(), callback_data=back_to
+        text=await aget_config(BUTT_CONFIG, "BACK"), callback_data=back_to
     )
     markup.adjust(2, repeat=True)
     return markup.as_markup()
@@ -253,8 +254,9 @@ async def get_folders_inline(category: str, folders: list[Folder], items: list[I
         markup.button(
             text=folder.title, callback_data=FolderCD(id=folder.id, category=category)
         )
+    stock = await aresolve_stock(items)
     for item in items:
-        amount = await item.aget_stock_amount()
+        amount = stock[item.id]
         text = f"{item} {'| ' + str(amount) + ' items' if amount is not None else ''}"
         markup.button(
             text=text,
@@ -263,7 +265,7 @@ async def get_folders_inline(category: str, folders: list[Folder], items: list[I
             ),
         )
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=MenuCD(category="root"),
     )
     markup.adjust(1, repeat=True)
@@ -274,7 +276,7 @@ async def get_api_management_inline():
     markup = InlineKeyboardBuilder()
     markup.button(text="🔁 Generate New Key", callback_data=ApiCD(action="regenerate"))
     markup.button(
-        text=await sync_to_async(lambda: BUTT_CONFIG.BACK)(),
+        text=await aget_config(BUTT_CONFIG, "BACK"),
         callback_data=MenuCD(category="root"),
     )
     markup.adjust(1)
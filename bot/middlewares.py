@@ -0,0 +1,213 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import Chat, TelegramObject, Update, User
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from backend.redis_client import get_aredis
+from backend.throttling import atake, get_rule
+from bot.callbacks import ApiCD, FolderCD, HistoryCD, ItemCD, MenuCD, OrderCD, ProfileCD
+from users.cache import aget_tg_user
+from users.models import TgUser
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateDeduplicationMiddleware(BaseMiddleware):
+    """Пропускает апдейты, которые уже взял в работу другой воркер.
+
+    Telegram повторяет доставку вебхука, если не дождался ответа, и повтор
+    может попасть в другой процесс. update_id отмечается в Redis через
+    SET NX; ключ живёт сутки - столько Telegram хранит недоставленные апдейты.
+    """
+
+    KEY = "tg:update:{update_id}"
+    TTL = 24 * 60 * 60
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        key = self.KEY.format(update_id=event.update_id)
+        redis = get_aredis()
+        try:
+            is_new = await redis.set(key, 1, nx=True, ex=self.TTL)
+        except RedisError:
+            logger.exception(f"Can't check update {event.update_id} for duplicates")
+            return await handler(event, data)
+        if not is_new:
+            logger.info(f"Update {event.update_id} is already processed, skipping")
+            return None
+        try:
+            return await handler(event, data)
+        except Exception:
+            try:
+                await redis.delete(key)
+            except RedisError:
+                pass
+            raise
+
+
+class TgUserMiddleware(BaseMiddleware):
+    """Один раз на апдейт находит TgUser отправителя через users.cache.
+
+    Хендлеры получают его аргументом tg_user; None, если пользователь ещё не
+    нажимал /start.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        from_user: User | None = data.get("event_from_user")
+        tg_user = await aget_tg_user(from_user.id) if from_user else None
+        if tg_user and not tg_user.is_reachable:
+            # Пользователь снова пишет боту - рассылки и уведомления ему доходят.
+            await TgUser.aset_reachable([tg_user.tg_id], True)
+            tg_user.is_reachable = True
+        data["tg_user"] = tg_user
+        return await handler(event, data)
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    """Ограничивает число одновременно обрабатываемых апдейтов.
+
+    Апдейты одного чата выполняются по одному в порядке поступления в
+    процесс (asyncio.Lock отдаёт управление в порядке ожидания), разных
+    чатов - параллельно, но не больше BOT_MAX_CONCURRENT_UPDATES сразу.
+    Очередь у каждого процесса своя: в режиме вебхука с несколькими
+    воркерами апдейты одного чата в разных процессах друг друга не ждут. Если очередь чата длиннее
+    BOT_MAX_CHAT_QUEUE или всего ждёт больше BOT_MAX_PENDING_UPDATES апдейтов,
+    нажатия кнопок сразу получают ответ и отбрасываются. Сообщения
+    не отбрасываются: в них может быть ввод пользователя.
+    """
+
+    BUSY_TEXT = "Too many requests, please try again in a moment."
+
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(settings.BOT_MAX_CONCURRENT_UPDATES)
+        self.chat_locks: dict[int, asyncio.Lock] = {}
+        self.chat_queues: dict[int, int] = {}
+        self.pending = 0
+
+    def is_overloaded(self, chat_id: int) -> bool:
+        return (
+            self.chat_queues.get(chat_id, 0) >= settings.BOT_MAX_CHAT_QUEUE
+            or self.pending >= settings.BOT_MAX_PENDING_UPDATES
+        )
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        chat: Chat | None = data.get("event_chat")
+        from_user: User | None = data.get("event_from_user")
+        if chat is None and from_user is None:
+            return await handler(event, data)
+        chat_id = chat.id if chat else from_user.id
+
+        if event.callback_query and self.is_overloaded(chat_id):
+            logger.warning(f"Shedding callback from chat {chat_id}, {self.pending} updates pending")
+            try:
+                await data["bot"].answer_callback_query(event.callback_query.id, self.BUSY_TEXT)
+            except TelegramAPIError:
+                pass
+            return None
+
+        lock = self.chat_locks.setdefault(chat_id, asyncio.Lock())
+        self.chat_queues[chat_id] = self.chat_queues.get(chat_id, 0) + 1
+        self.pending += 1
+        is_queued = True
+        try:
+            async with lock:
+                async with self.semaphore:
+                    self._dequeue(chat_id)
+                    is_queued = False
+                    return await handler(event, data)
+        finally:
+            if is_queued:
+                self._dequeue(chat_id)
+            if chat_id not in self.chat_queues and not lock.locked():
+                self.chat_locks.pop(chat_id, None)
+
+    def _dequeue(self, chat_id: int):
+        self.pending -= 1
+        left = self.chat_queues.pop(chat_id) - 1
+        if left:
+            self.chat_queues[chat_id] = left
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Token bucket на пользователя для сообщений и нажатий кнопок.
+
+    Внешняя мидлварь апдейтов: стоит перед TgUserMiddleware, так что сверх
+    лимита апдейт отбрасывается до поиска пользователя и хендлеров. Корзина -
+    по event_from_user.id. Маршрут нажатия - префикс CallbackData и action,
+    категория - поле category, например "bot:itm:view:pubg_uc"; данные
+    разбираются классом из CALLBACKS. Сообщения идут под "bot:message".
+    Сверх лимита пользователь получает короткий ответ.
+    """
+
+    SLOW_DOWN_TEXT = "Slow down, please. Try again in {wait} s."
+    CALLBACKS = {
+        callback.__prefix__: callback
+        for callback in (MenuCD, ProfileCD, ItemCD, OrderCD, HistoryCD, FolderCD, ApiCD)
+    }
+
+    def get_route(self, event: Update) -> tuple[str | None, ...] | None:
+        if event.message:
+            return ("message",)
+        if not event.callback_query:
+            return None
+        prefix, _, _ = (event.callback_query.data or "").partition(":")
+        callback = self.CALLBACKS.get(prefix)
+        if callback is None:
+            return ("callback",)
+        try:
+            callback_data = callback.unpack(event.callback_query.data)
+        except (TypeError, ValueError):
+            return (prefix,)
+        return (
+            prefix,
+            getattr(callback_data, "action", None),
+            getattr(callback_data, "category", None),
+        )
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        from_user: User | None = data.get("event_from_user")
+        route = self.get_route(event)
+        if from_user is None or route is None:
+            return await handler(event, data)
+        rule = get_rule("bot", *route)
+        if rule is None:
+            return await handler(event, data)
+
+        allowed, wait = await atake(*rule, from_user.id)
+        if allowed:
+            return await handler(event, data)
+        logger.info(f"User {from_user.id} is throttled by {rule[0]}")
+        text = self.SLOW_DOWN_TEXT.format(wait=max(1, round(wait)))
+        bot = data["bot"]
+        try:
+            if event.callback_query:
+                await bot.answer_callback_query(event.callback_query.id, text)
+            else:
+                await bot.send_message(event.message.chat.id, text)
+        except TelegramAPIError:
+            pass
+        return None
@@ -1,51 +1,251 @@
-import logging
+"""Рассылки Mailing.
+
+Получатели читаются потоково (aiterator, на Postgres - серверный курсор)
+по возрастанию TgUser.id начиная с Mailing.last_user_id. Сообщения
+отправляют MAILING_CONCURRENCY воркеров; общий для всех процессов token
+bucket (backend.throttling, правило "mailing") держит темп в пределах
+глобального лимита Telegram. Каждый получатель получает один запрос, так что
+лимит на чат не превышается. TelegramRetryAfter ставит на паузу всю
+рассылку, а не один воркер.
+
+Результат по каждому получателю копится в памяти и раз в
+MAILING_PROGRESS_PERIOD секунд одной транзакцией записывается в
+MailingDelivery вместе с курсором - id, до которого все получатели
+обработаны. После падения рассылка продолжится с курсора и пропустит тех,
+кому доставка уже записана; сообщения, бывшие в полёте, могут уйти повторно.
+
+Пользователи, заблокировавшие бота или удалившие аккаунт, помечаются
+TgUser.is_reachable=False и в следующие рассылки не попадают.
+"""
 import asyncio
+import logging
+import time
+from collections import OrderedDict
 
 from aiogram import Bot, exceptions
 from aiogram.types import InputMediaDocument, InputMediaPhoto, InputMediaVideo
-from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
+from redis.exceptions import LockError, RedisError
 
-from admin_panel.models import Attachment, Mailing
+from admin_panel.models import Attachment, Mailing, MailingDelivery
+from backend.db_executor import db_sync_to_async
+from backend.redis_client import get_aredis
+from backend.throttling import atake, get_rule
 from users.models import TgUser
 
 logger = logging.getLogger(__name__)
 
+LOCK_KEY = "mailing:{id}:lock"
+LOCK_TIMEOUT = 60
+SEND_ATTEMPTS = 3
+# BadRequest с такими текстами значит, что чата больше нет.
+UNREACHABLE_ERRORS = ("chat not found", "user is deactivated")
+
+INPUT_MEDIA = {
+    Attachment.FileType.DOCUMENT: InputMediaDocument,
+    Attachment.FileType.PHOTO: InputMediaPhoto,
+    Attachment.FileType.VIDEO: InputMediaVideo,
+}
+
+
+class Broadcast:
+    """Одна рассылка: очередь получателей, воркеры и сохранение прогресса."""
+
+    def __init__(self, bot: Bot, mailing: Mailing, attachments: list[Attachment]):
+        self.bot = bot
+        self.mailing = mailing
+        self.media = [
+            INPUT_MEDIA[attachment.file_type](media=attachment.file_id) for attachment in attachments
+        ]
+        if self.media:
+            self.media[-1].caption = mailing.text
+        self.rule = get_rule("mailing")
+        self.queue = asyncio.Queue(maxsize=settings.MAILING_CONCURRENCY * 2)
+        # id получателей в порядке выдачи -> обработан ли; курсор двигается
+        # только по обработанному префиксу.
+        self.in_flight = OrderedDict()
+        self.cursor = mailing.last_user_id
+        self.deliveries = []
+        self.unreachable = []
+        self.sent = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.resume_at = 0.0
+        self.is_completed = False
+
+    async def run(self):
+        workers = [
+            asyncio.create_task(self.worker()) for _ in range(settings.MAILING_CONCURRENCY)
+        ]
+        progress = asyncio.create_task(self.save_progress_periodically())
+        try:
+            delivered = MailingDelivery.objects.filter(
+                mailing=self.mailing, tg_user=OuterRef("pk")
+            )
+            recipients = (
+                TgUser.objects.filter(id__gt=self.cursor, is_reachable=True)
+                .filter(~Exists(delivered))
+                .order_by("id")
+                .only("id", "tg_id")
+                .aiterator(chunk_size=settings.MAILING_CHUNK_SIZE)
+            )
+            async for user in recipients:
+                self.in_flight[user.id] = False
+                await self.queue.put((user.id, user.tg_id))
+            await self.queue.join()
+            self.is_completed = True
+        finally:
+            progress.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(progress, *workers, return_exceptions=True)
+
+    async def worker(self):
+        while True:
+            user_id, tg_id = await self.queue.get()
+            try:
+                error = await self.send(tg_id)
+            except Exception as e:
+                logger.exception(f"Mailing {self.mailing.id}: can't send to {tg_id}")
+                error = str(e) or type(e).__name__
+            if error is None:
+                self.sent += 1
+                status = MailingDelivery.Status.DELIVERED
+            else:
+                self.failed += 1
+                status = MailingDelivery.Status.FAILED
+            self.deliveries.append(
+                MailingDelivery(
+                    mailing=self.mailing, tg_user_id=user_id, status=status, error=(error or "")[:255]
+                )
+            )
+            self.mark_done(user_id)
+            self.queue.task_done()
+
+    def mark_done(self, user_id: int):
+        self.in_flight[user_id] = True
+        while self.in_flight:
+            first_id, done = next(iter(self.in_flight.items()))
+            if not done:
+                break
+            self.in_flight.popitem(last=False)
+            self.cursor = first_id
+
+    async def send(self, tg_id: int) -> str | None:
+        """Отправляет рассылку; возвращает текст ошибки или None."""
+        attempts = 0
+        while True:
+            if (pause := self.resume_at - time.monotonic()) > 0:
+                await asyncio.sleep(pause)
+                continue
+            if self.rule:
+                allowed, wait = await atake(*self.rule, self.bot.id)
+                if not allowed:
+                    await asyncio.sleep(wait)
+                    continue
+            try:
+                if self.media:
+                    await self.bot.send_media_group(chat_id=tg_id, media=self.media)
+                else:
+                    await self.bot.send_message(chat_id=tg_id, text=self.mailing.text)
+                return None
+            except exceptions.TelegramRetryAfter as e:
+                logger.warning(f"Mailing {self.mailing.id}: flood limit, pausing for {e.retry_after} s")
+                self.resume_at = max(self.resume_at, time.monotonic() + e.retry_after)
+            except exceptions.TelegramForbiddenError as e:
+                logger.info(f"Mailing {self.mailing.id}: {tg_id} is unreachable: {e}")
+                self.unreachable.append(tg_id)
+                return e.message
+            except exceptions.TelegramBadRequest as e:
+                logger.info(f"Mailing {self.mailing.id}: can't send to {tg_id}: {e}")
+                if any(text in e.message.lower() for text in UNREACHABLE_ERRORS):
+                    self.unreachable.append(tg_id)
+                return e.message
+            except exceptions.TelegramAPIError as e:
+                attempts += 1
+                if attempts >= SEND_ATTEMPTS:
+                    logger.error(f"Mailing {self.mailing.id}: giving up on {tg_id}: {e}")
+                    return e.message
+                await asyncio.sleep(attempts)
+
+    async def save_progress(self, finished: bool = False):
+        # Забираем буферы до await: воркеры продолжают их пополнять.
+        deliveries, self.deliveries = self.deliveries, []
+        unreachable, self.unreachable = self.unreachable, []
+        mailing = self.mailing
+        mailing.last_user_id = self.cursor
+        update_fields = ["last_user_id"]
+        if finished:
+            mailing.is_sent = True
+            mailing.finished_at = timezone.now()
+            update_fields += ["is_sent", "finished_at"]
+        await db_sync_to_async(self._save)(deliveries, unreachable, update_fields)
+        elapsed = time.monotonic() - self.started
+        logger.info(
+            f"Mailing {mailing.id}{' finished' if finished else ''}: "
+            f"{self.sent} sent, {self.failed} failed, {len(unreachable)} newly unreachable, "
+            f"cursor {mailing.last_user_id}, {(self.sent + self.failed) / elapsed:.1f} msg/s"
+        )
+
+    def _save(self, deliveries: list[MailingDelivery], unreachable: list[int], update_fields: list[str]):
+        with transaction.atomic():
+            MailingDelivery.objects.bulk_create(
+                deliveries,
+                update_conflicts=True,
+                unique_fields=["mailing", "tg_user"],
+                update_fields=["status", "error"],
+            )
+            if unreachable:
+                TgUser.set_reachable(unreachable, False)
+            self.mailing.save(update_fields=update_fields)
+
+    async def save_progress_periodically(self):
+        while True:
+            await asyncio.sleep(settings.MAILING_PROGRESS_PERIOD)
+            await self.save_progress()
+
+
+async def run_mailing(bot: Bot, mailing: Mailing):
+    lock = get_aredis().lock(LOCK_KEY.format(id=mailing.id), timeout=LOCK_TIMEOUT)
+    if not await lock.acquire(blocking=False):
+        logger.info(f"Mailing {mailing.id} is already running")
+        return
+    try:
+        await mailing.arefresh_from_db()
+        if mailing.is_sent:
+            return
+        if not mailing.started_at:
+            mailing.started_at = timezone.now()
+            await mailing.asave(update_fields=("started_at",))
+        logger.info(f"Mailing {mailing.id} started after user {mailing.last_user_id}")
+        attachments = await db_sync_to_async(lambda: list(mailing.attachments.all()))()
+        broadcast = Broadcast(bot, mailing, attachments)
+        keep_lock = asyncio.create_task(_keep_lock(lock))
+        try:
+            await broadcast.run()
+        finally:
+            keep_lock.cancel()
+            await broadcast.save_progress(finished=broadcast.is_completed)
+    finally:
+        try:
+            await lock.release()
+        except (LockError, RedisError):
+            pass
+
+
+async def _keep_lock(lock):
+    while True:
+        await asyncio.sleep(LOCK_TIMEOUT / 3)
+        await lock.reacquire()
+
 
 async def start_mailing(bot: Bot):
     now = timezone.now()
-    input_media = {
-        Attachment.FileType.DOCUMENT: InputMediaDocument,
-        Attachment.FileType.PHOTO: InputMediaPhoto,
-        Attachment.FileType.VIDEO: InputMediaVideo
-    }
-    users = await sync_to_async(lambda: list(TgUser.objects.all()))()
-    mailings = await sync_to_async(lambda: list(Mailing.objects.filter(date_time__lte=now, is_sent=False)))()
+    mailings = await db_sync_to_async(
+        lambda: list(Mailing.objects.filter(date_time__lte=now, is_sent=False).order_by("date_time"))
+    )()
     for mailing in mailings:
-        await mailing.arefresh_from_db()
-        if mailing.is_sent:
-            continue
-        mailing.is_sent = True
-        await mailing.asave(update_fields=('is_sent',))
-        logger.info(f'Mailing {mailing.id} started')
-        attachments = await sync_to_async(lambda: list(Attachment.objects.filter(mailing=mailing)))()
-        users_ = list(users)
-        while users_:
-            try:
-                user = users_[-1]
-                if len(attachments) == 0:
-                    await bot.send_message(chat_id=user.tg_id, text=mailing.text)
-                elif len(attachments) > 0:
-                    att_list = [
-                        input_media[attachment.file_type](media=attachment.file_id) for attachment in attachments
-                    ]
-                    att_list[-1].caption = mailing.text
-                    await bot.send_media_group(chat_id=user.tg_id, media=att_list)
-                users_.pop()
-            except exceptions.TelegramRetryAfter as e:
-                logger.warning(f'Flood limit is exceeded. Sleep {e.retry_after} seconds.')
-                await asyncio.sleep(e.retry_after)
-            except (exceptions.TelegramForbiddenError, exceptions.TelegramBadRequest) as e:
-                users_.pop()
-                logger.error(f'Seems like user {user.username} {user.tg_id} has blocked the bot')
-                logger.error(f'{e}')
+        await run_mailing(bot, mailing)
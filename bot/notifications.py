@@ -0,0 +1,73 @@
+"""Склейка уведомлений в чаты менеджеров.
+
+Служебные сообщения (активация кодов, выполненные и упавшие заказы) не
+отправляются сразу, а копятся в списке Redis чата. Первое сообщение окна
+ставит задачу flush_notifications_task с задержкой NOTIFY_COALESCE_WINDOW
+секунд; она забирает всё накопленное и отправляет как можно меньше
+сообщений, каждое не длиннее лимита Telegram. Так заказ на пять кодов даёт
+одно сообщение вместо шести и чат не упирается в лимит Telegram на чат.
+
+Сообщения с кнопками (MAKE_ORDER_COMLETED) сюда не попадают и уходят
+отдельно через send_notification_task.
+"""
+import logging
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from backend.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = "notify:{chat_id}"
+WINDOW_KEY = "notify:{chat_id}:window"
+MESSAGE_LIMIT = 4096
+SEPARATOR = "\n\n"
+
+
+def buffer_notification(chat_id: int, text: str) -> bool | None:
+    """Кладёт сообщение в буфер чата.
+
+    True - открыто новое окно и нужно запланировать отправку, False - окно
+    уже открыто, None - буфер недоступен и отправлять нужно сразу.
+    """
+    if settings.NOTIFY_COALESCE_WINDOW <= 0:
+        return None
+    # Окно живёт дольше задержки: если задача потеряется, следующее
+    # сообщение после истечения откроет новое окно и заберёт хвост.
+    window_ttl = settings.NOTIFY_COALESCE_WINDOW * 10 + 60
+    try:
+        with get_redis().pipeline() as pipe:
+            pipe.rpush(BUFFER_KEY.format(chat_id=chat_id), text)
+            pipe.set(WINDOW_KEY.format(chat_id=chat_id), 1, nx=True, ex=window_ttl)
+            _, is_new_window = pipe.execute()
+    except RedisError:
+        logger.exception(f"Can't buffer notification for {chat_id}")
+        return None
+    return bool(is_new_window)
+
+
+def pop_notifications(chat_id: int) -> list[str]:
+    """Забирает накопленные сообщения и закрывает окно одной транзакцией."""
+    with get_redis().pipeline() as pipe:
+        pipe.lrange(BUFFER_KEY.format(chat_id=chat_id), 0, -1)
+        pipe.delete(BUFFER_KEY.format(chat_id=chat_id), WINDOW_KEY.format(chat_id=chat_id))
+        texts, _ = pipe.execute()
+    return texts
+
+
+def merge_notifications(texts: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Склеивает сообщения по порядку в куски не длиннее limit."""
+    messages = []
+    current = ""
+    for text in texts:
+        for part in [text[i:i + limit] for i in range(0, len(text), limit)] or [""]:
+            if current and len(current) + len(SEPARATOR) + len(part) <= limit:
+                current += SEPARATOR + part
+                continue
+            if current:
+                messages.append(current)
+            current = part
+    if current:
+        messages.append(current)
+    return messages
@@ -1,4 +1,6 @@
 import logging
+from django.conf import settings
+from bot.notifications import buffer_notification, merge_notifications, pop_notifications
 from bot.utils import send_notification
 
 from bot.keyboards import KEYBOARDS
@@ -17,3 +19,22 @@ def send_notification_task(chat_id, text, keyboard: str | None = None, kwargs=No
     kwargs = kwargs or {}
     reply_markup = KEYBOARDS.get_func(keyboard)(**kwargs) if keyboard else None
     send_notification(chat_id, text, reply_markup=reply_markup, message_id=message_id)
+
+
+def send_manager_notification(chat_id, text):
+    """Служебное сообщение менеджерам: склеивается с соседними (bot.notifications)."""
+    is_new_window = buffer_notification(chat_id, text)
+    if is_new_window is None:
+        send_notification_task.delay(chat_id, text)
+    elif is_new_window:
+        flush_notifications_task.apply_async((chat_id,), countdown=settings.NOTIFY_COALESCE_WINDOW)
+
+
+@app.task()
+def flush_notifications_task(chat_id):
+    """Отправляем накопленные за окно сообщения чата."""
+    texts = pop_notifications(chat_id)
+    messages = merge_notifications(texts)
+    logger.info(f'Flushing {len(texts)} notifications to {chat_id} as {len(messages)} messages')
+    for text in messages:
+        send_notification(chat_id, text)
@@ -3,14 +3,16 @@ import logging
 from typing import TYPE_CHECKING, Union
 
 from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
 from aiogram.types import BufferedInputFile
-from asgiref.sync import async_to_sync, sync_to_async
 from django.utils import timezone
 
-from backend.settings import ENV
 from codes.models import StockbleCode
 from users.models import TgUser
 from backend.config import PAYMENT_CONFIG
+from backend.config_cache import aget_configs
+from backend.db_executor import db_sync_to_async
+from bot.client import get_telegram_client
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +20,11 @@ if TYPE_CHECKING:
     from orders.models import Order
 
 
-@sync_to_async
+@db_sync_to_async
 def get_all_admins_id() -> list:
     return list(
         TgUser.objects.filter(tg_id__isnull=False)
-        .filter(is_admin=True)
+        .filter(is_admin=True, is_reachable=True)
         .values_list("tg_id", flat=True)
     )
 
@@ -44,49 +46,52 @@ def generate_file(text: str, filename: str):
 
 
 async def send_codes_to_user(bot: Bot, chat_id: int, codes: list[StockbleCode]):
-    async with Bot(ENV.str("TG_TOKEN_BOT")) as bot:
-        text = "\n".join([code.code for code in codes])
-        if text:
-            if len(text) > 3500:
-                document = generate_file(text, "codes.txt")
-                await bot.send_document(
-                    chat_id=chat_id, document=document, caption="There your codes"
-                )
-                return
-            await bot.send_message(chat_id, text=f"There your codes:\n{text}")
+    text = "\n".join([code.code for code in codes])
+    if text:
+        if len(text) > 3500:
+            document = generate_file(text, "codes.txt")
+            await bot.send_document(
+                chat_id=chat_id, document=document, caption="There your codes"
+            )
+            return
+        await bot.send_message(chat_id, text=f"There your codes:\n{text}")
 
 
 async def asend_notification(
-    chat_id: int, text: str, reply_markup=None, message_id=None
+    bot: Bot, chat_id: int, text: str, reply_markup=None, message_id=None
 ):
-    async with Bot(ENV.str("TG_TOKEN_BOT")) as bot:
-        if message_id:
-            try:
-                await bot.edit_message_text(
-                    text=text,
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    reply_markup=reply_markup,
-                )
-            except Exception as e:
-                logger.error(f"{e}")
-                logger.error(
-                    f"Message {message_id} in chat {chat_id} cant be edited. Sending new"
-                )
-                await bot.send_message(chat_id, text=text, reply_markup=reply_markup)
-        else:
-            try:
-                await bot.send_message(chat_id, text=text, reply_markup=reply_markup)
-            except Exception as e:
-                logger.error(f"Message has not been delivered to {chat_id}")
-                logger.error(f"{e}")
-
-
-@async_to_sync
-async def send_notification(
+    if message_id:
+        try:
+            await bot.edit_message_text(
+                text=text,
+                chat_id=chat_id,
+                message_id=message_id,
+                reply_markup=reply_markup,
+            )
+        except Exception as e:
+            logger.error(f"{e}")
+            logger.error(
+                f"Message {message_id} in chat {chat_id} cant be edited. Sending new"
+            )
+            await bot.send_message(chat_id, text=text, reply_markup=reply_markup)
+    else:
+        try:
+            await bot.send_message(chat_id, text=text, reply_markup=reply_markup)
+        except TelegramForbiddenError as e:
+            logger.info(f"{chat_id} blocked the bot, marking unreachable: {e}")
+            await TgUser.aset_reachable([chat_id], False)
+        except Exception as e:
+            logger.error(f"Message has not been delivered to {chat_id}")
+            logger.error(f"{e}")
+
+
+def send_notification(
     chat_id: int, text: str, reply_markup=None, message_id=None
 ):
-    return await asend_notification(chat_id, text, reply_markup, message_id)
+    """Отправка из синхронного кода через общий клиент процесса."""
+    return get_telegram_client().call(
+        asend_notification, chat_id, text, reply_markup, message_id
+    )
 
 
 async def asend_text_or_txt(bot, chat_id, text, order: Union["Order", None] = None):
@@ -111,12 +116,12 @@ async def validated_payment_amount(amount: str, currency: str):
     except ValueError:
         raise ValueError("Can't understand amount. Please try again.")
     if currency == 'RUB':
-        ruble_comission = await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_RUBLE_COMISSION)()
+        ruble_comission, TOPUP_RUBLE_MIN, TOPUP_RUBLE_MAX = await aget_configs(
+            PAYMENT_CONFIG, "TOPUP_RUBLE_COMISSION", "TOPUP_RUBLE_MIN", "TOPUP_RUBLE_MAX"
+        )
         comission = amount * (ruble_comission / 100)
-        TOPUP_RUBLE_MIN = await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_RUBLE_MIN)()
-        TOPUP_RUBLE_MAX = await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_RUBLE_MAX)()
         if not TOPUP_RUBLE_MIN < amount - comission < TOPUP_RUBLE_MAX:
             raise ValueError(
-                f"Amount should be from {PAYMENT_CONFIG.TOPUP_RUBLE_MIN} to {PAYMENT_CONFIG.TOPUP_RUBLE_MAX}"
+                f"Amount should be from {TOPUP_RUBLE_MIN} to {TOPUP_RUBLE_MAX}"
             )
     return amount
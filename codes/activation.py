@@ -0,0 +1,305 @@
+"""Сервис активации UC-кодов (manage.py runactivator).
+
+Заказ отправляется на активацию целиком: dispatch_order_activation кладёт
+его id в очередь Redis. Долгоживущий asyncio-сервис забирает id через
+BLMOVE в список обрабатываемых и удаляет оттуда только после прохода, так
+что после падения незавершённые заказы возвращаются в очередь. Коды заказа
+активируются по очереди активаторов из ActivatorPriority.
+
+Одновременно обрабатывается до ACTIVATION_MAX_ORDERS заказов, запросы к
+каждому активатору ограничены ACTIVATOR_CONCURRENCY. Коды одного PUBG ID
+активируются строго по одному - аккаунт не принимает параллельные
+пополнения. Порядок активаторов для кода задаёт codes.health: открытые
+breaker'ом пропускаются, остальные идут по оценке здоровья. Итог заказа выставляется один раз после прохода
+(codes.tasks.finish_order_activation).
+
+Работает один экземпляр сервиса: остальные ждут блокировку SERVICE_LOCK_KEY.
+Раз в ACTIVATION_SWEEP_PERIOD секунд сервис сам находит заказы, которые не
+попали в очередь (например, Redis был недоступен при отправке).
+"""
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from redis.exceptions import LockError, RedisError
+
+from backend.db_executor import db_sync_to_async
+from backend.redis_client import get_aredis, get_redis
+from payments import activators
+
+from . import health
+from .models import Activator, ActivatorAttempt, UcCode
+from .tasks import finish_order_activation, save_result
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "activation:queue"
+PROCESSING_KEY = "activation:processing"
+SERVICE_LOCK_KEY = "activation:service"
+LOCK_TIMEOUT = 30
+STALE_MAX_AGE = timedelta(hours=1)
+
+# Имена функций в payments.activators; берутся при вызове, чтобы работали моки.
+ACTIVATOR_FUNCTIONS = {
+    Activator.UCODEIUM: "aactivate_code",
+    Activator.KOKOS: "aactivate_code_kokos",
+    Activator.FARS: "aactivate_code_fars",
+}
+
+
+def dispatch_order_activation(order_id: int):
+    """Ставит заказ в очередь сервиса активации."""
+    try:
+        get_redis().rpush(QUEUE_KEY, order_id)
+    except RedisError:
+        logger.exception(f"Can't dispatch activation of order {order_id}, it will be picked up by the sweep")
+        return
+    logger.info(f"Activation of order #{order_id} has been dispatched.")
+
+
+def pending_codes(order_id: int) -> list[UcCode]:
+    """Коды заказа, которые ещё нужно активировать; коды FARS ждут вебхук."""
+    return list(
+        UcCode.objects.filter(order_id=order_id, is_activated=False)
+        .exclude(activator=Activator.FARS)
+        .select_related("order")
+    )
+
+
+def find_stale_orders() -> list[int]:
+    now = timezone.now()
+    return list(
+        UcCode.objects.filter(
+            is_activated=False,
+            order__is_completed__isnull=True,
+            order__pubg_id__gt="",
+            updated_at__gt=now - STALE_MAX_AGE,
+            updated_at__lt=now - timedelta(seconds=settings.ACTIVATION_SWEEP_PERIOD),
+        )
+        .exclude(activator=Activator.FARS)
+        .values_list("order_id", flat=True)
+        .distinct()
+    )
+
+
+class ActivationService:
+    def __init__(self):
+        self.orders = asyncio.Semaphore(settings.ACTIVATION_MAX_ORDERS)
+        self.limits = {
+            name: asyncio.Semaphore(limit) for name, limit in settings.ACTIVATOR_CONCURRENCY.items()
+        }
+        # PUBG ID -> [Lock, число ожидающих]; запись удаляется последним.
+        self.players = {}
+        self.active = set()
+        self.rerun = set()
+        self.tasks = set()
+
+    async def run(self):
+        await self.recover()
+        sweeper = asyncio.create_task(self.sweep_periodically())
+        try:
+            while True:
+                await self.orders.acquire()
+                try:
+                    raw = await get_aredis().blmove(QUEUE_KEY, PROCESSING_KEY, 5, "LEFT", "RIGHT")
+                except RedisError:
+                    logger.exception("Can't read activation queue")
+                    raw = None
+                    await asyncio.sleep(1)
+                if raw is None:
+                    self.orders.release()
+                    continue
+                task = asyncio.create_task(self.handle(raw))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        finally:
+            sweeper.cancel()
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(sweeper, *self.tasks, return_exceptions=True)
+
+    async def recover(self):
+        """Возвращает в очередь заказы, бывшие в работе при остановке."""
+        recovered = 0
+        while await get_aredis().lmove(PROCESSING_KEY, QUEUE_KEY, "RIGHT", "LEFT"):
+            recovered += 1
+        if recovered:
+            logger.warning(f"Recovered {recovered} interrupted activations")
+
+    async def sweep_periodically(self):
+        while True:
+            await asyncio.sleep(settings.ACTIVATION_SWEEP_PERIOD)
+            try:
+                stale = set(await db_sync_to_async(find_stale_orders)()) - self.active
+                if stale:
+                    logger.warning(f"Dispatching stale activations: {sorted(stale)}")
+                    await get_aredis().rpush(QUEUE_KEY, *stale)
+            except Exception:
+                logger.exception("Activation sweep failed")
+
+    async def handle(self, raw: str):
+        order_id = int(raw)
+        try:
+            if order_id in self.active:
+                # Заказ уже активируется: новые коды подхватит повторный проход.
+                self.rerun.add(order_id)
+                return
+            self.active.add(order_id)
+            try:
+                while True:
+                    self.rerun.discard(order_id)
+                    await self.activate_order(order_id)
+                    if order_id not in self.rerun:
+                        break
+            finally:
+                self.active.discard(order_id)
+        except Exception:
+            logger.exception(f"Activation of order #{order_id} failed")
+        finally:
+            try:
+                await get_aredis().lrem(PROCESSING_KEY, 1, raw)
+            except RedisError:
+                logger.exception(f"Can't acknowledge activation of order #{order_id}")
+            self.orders.release()
+
+    async def activate_order(self, order_id: int):
+        codes = await db_sync_to_async(pending_codes)(order_id)
+        if codes and codes[0].order.pubg_id:
+            pubg_id = codes[0].order.pubg_id
+            logger.info(f"Activating {len(codes)} codes of order #{order_id} for {pubg_id}")
+            async with self.player_lock(pubg_id):
+                for code in codes:
+                    await self.activate_code(code, pubg_id)
+        await db_sync_to_async(finish_order_activation)(order_id)
+
+    @contextlib.asynccontextmanager
+    async def player_lock(self, pubg_id: str):
+        entry = self.players.setdefault(pubg_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.players[pubg_id]
+
+    async def activate_code(self, code: UcCode, pubg_id: str):
+        logger.info(f"Activating code {code.code} for user {pubg_id}")
+        # План берётся на каждый код: breaker мог открыться на предыдущем.
+        plan = await health.aplan()
+        if not plan:
+            logger.error("No activators priorities are configured in the admin panel!")
+            await save_result(code, False, "Configuration Error: No activators.")
+            return
+
+        final_success = False
+        final_status = "No activator succeeded."
+
+        for activator_name, state in plan:
+            if state == health.HALF_OPEN and not await health.atry_probe(activator_name):
+                logger.info(f"Activator {activator_name} is half-open and busy with a probe. Skipping.")
+                continue
+            logger.info(f"Trying activator: {activator_name} ({state}) for code {code.code}")
+
+            if activator_name not in ACTIVATOR_FUNCTIONS:
+                logger.warning(
+                    f"No activation function found for '{activator_name}'. Skipping."
+                )
+                continue
+            activation_func = getattr(activators, ACTIVATOR_FUNCTIONS[activator_name])
+
+            kwargs = {"player_id": pubg_id, "uc_code": code.code}
+            if activator_name in [Activator.UCODEIUM, Activator.FARS]:
+                kwargs["uc_value"] = code.amount
+            if activator_name == Activator.FARS:
+                kwargs["order_id"] = code.order_id
+
+            async with self.limits.get(activator_name) or contextlib.nullcontext():
+                started = time.monotonic()
+                try:
+                    # UCodeium третьим элементом отдаёт request_cost.
+                    succ, status, *details = await activation_func(**kwargs)
+                except Exception as e:
+                    logger.error(
+                        f"Exception during activation with {activator_name}: {e}", exc_info=True
+                    )
+                    succ, status, details = None, None, ()
+                    outcome, error_class = ActivatorAttempt.Outcome.EXCEPTION, type(e).__name__
+                else:
+                    outcome, error_class = health.classify(activator_name, succ, status)
+                latency_ms = round((time.monotonic() - started) * 1000)
+            await self.record_attempt(
+                code, activator_name, outcome, error_class, latency_ms, details[0] if details else None
+            )
+
+            if succ:
+                logger.info(
+                    f"SUCCESS: Code {code.code} activated via {activator_name}."
+                )
+                final_success = True
+                final_status = status
+                code.activator = activator_name
+
+                if activator_name == Activator.FARS:
+                    # Результат придёт вебхуком, а код больше не берётся сервисом.
+                    await db_sync_to_async(code.save)(update_fields=("activator",))
+                    logger.info("FARS activation request sent. Waiting for webhook.")
+                    return
+
+                break
+            elif outcome == ActivatorAttempt.Outcome.EXCEPTION:
+                final_status = f"Exception with {activator_name}"
+            else:
+                logger.warning(
+                    f"FAIL: Activator {activator_name} failed with status: {status}"
+                )
+                final_status = f"{activator_name}: {status}"
+
+        await save_result(code, final_success, final_status)
+
+    async def record_attempt(self, code, activator_name, outcome, error_class, latency_ms, request_cost):
+        await health.arecord(activator_name, outcome)
+        try:
+            await db_sync_to_async(ActivatorAttempt.objects.create)(
+                activator=activator_name,
+                code_id=code.id,
+                outcome=outcome,
+                error_class=error_class,
+                latency_ms=latency_ms,
+                request_cost=request_cost,
+            )
+        except Exception:
+            logger.exception(f"Can't record attempt of {activator_name}")
+
+
+async def run_activation_service():
+    lock = get_aredis().lock(SERVICE_LOCK_KEY, timeout=LOCK_TIMEOUT)
+    logger.info("Waiting for the activation service lock")
+    await lock.acquire()
+    logger.info("Activation service started")
+    keep_lock = asyncio.create_task(_keep_lock(lock))
+    service = asyncio.create_task(ActivationService().run())
+    try:
+        # Потеря блокировки останавливает сервис: её мог взять другой экземпляр.
+        done, _ = await asyncio.wait((keep_lock, service), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in (keep_lock, service):
+            task.cancel()
+        await asyncio.gather(keep_lock, service, return_exceptions=True)
+        try:
+            await lock.release()
+        except (LockError, RedisError):
+            pass
+
+
+async def _keep_lock(lock):
+    while True:
+        await asyncio.sleep(LOCK_TIMEOUT / 3)
+        await lock.reacquire()
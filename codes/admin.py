@@ -1,15 +1,82 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.urls import reverse
 
 from .forms import GiftCardImportForm, ImportForm, StockbleCodeImportForm
-from .models import ActivatorPriority, Giftcard, StockbleCode, UcCode
+from .health import get_health, get_states, invalidate_health
+from .models import ActivatorAttempt, ActivatorPriority, CodeStock, Giftcard, StockbleCode, UcCode
+
+
+class ActivatorPriorityChangeList(ChangeList):
+    def get_results(self, request):
+        """Оценки и состояния автоматов - один раз на страницу списка."""
+        super().get_results(request)
+        health = {activator["name"]: activator for activator in get_health()["activators"]}
+        activators = list(self.result_list)
+        states = get_states([activator.name for activator in activators])
+        for activator in activators:
+            activator.health = health.get(activator.name, {})
+            activator.breaker_state = states[activator.name]
 
 
 @admin.register(ActivatorPriority)
 class ActivatorPriorityAdmin(admin.ModelAdmin):
-    list_display = ("name", "order", "is_active")
+    list_display = (
+        "name", "order", "is_active", "health_score", "is_healthy", "breaker", "latency_ms", "attempts"
+    )
     list_editable = ("order", "is_active")
 
+    def get_changelist(self, request, **kwargs):
+        return ActivatorPriorityChangeList
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_health()
+
+    @admin.display(description="Health score")
+    def health_score(self, obj):
+        return obj.health.get("score")
+
+    @admin.display(description="Healthy", boolean=True)
+    def is_healthy(self, obj):
+        return obj.health.get("is_healthy")
+
+    @admin.display(description="Breaker")
+    def breaker(self, obj):
+        return obj.breaker_state
+
+    @admin.display(description="Latency, ms")
+    def latency_ms(self, obj):
+        return obj.health.get("latency_ms")
+
+    @admin.display(description="Attempts")
+    def attempts(self, obj):
+        return obj.health.get("attempts")
+
+
+@admin.register(ActivatorAttempt)
+class ActivatorAttemptAdmin(admin.ModelAdmin):
+    list_display = ("activator", "outcome", "error_class", "latency_ms", "request_cost", "code", "created_at")
+    list_filter = ("activator", "outcome")
+    list_select_related = ("code",)
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CodeStock)
+class CodeStockAdmin(admin.ModelAdmin):
+    list_display = ("code_type", "key", "amount")
+    list_filter = ("code_type",)
+    readonly_fields = ("code_type", "key", "amount")
+
+    def has_add_permission(self, request):
+        return False
+
 
 @admin.register(UcCode)
 class UcCodeAdmin(admin.ModelAdmin):
@@ -0,0 +1,217 @@
+"""Сборка UC-товаров из импортируемых номиналов кодов.
+
+Все варианты разложения суммы на номиналы из UC_AMOUNTS_FOR_IMPORT
+считаются динамикой размена монет. Для заданных остатков кодов выбирается
+комбинация рецептов, дающая максимум товаров; среди таких - бережущая самые
+дефицитные номиналы.
+"""
+import logging
+import math
+from collections import Counter
+from functools import cache, lru_cache
+from typing import NamedTuple
+
+from backend.constants import DEFAULT_UC_AMOUNTS, UC_AMOUNTS_FOR_IMPORT
+
+logger = logging.getLogger(__name__)
+
+MAX_CODES_PER_UNIT = 5
+PLAN_COST_NODES = 200
+EPS = 1e-9
+
+
+class Composition(NamedTuple):
+    units: int
+    recipes: tuple[tuple[tuple[int, ...], int], ...]
+
+    @property
+    def nominals(self) -> Counter:
+        """Сколько кодов каждого номинала нужно на все единицы товара."""
+        total = Counter()
+        for recipe, units in self.recipes:
+            for nominal in recipe:
+                total[nominal] += units
+        return total
+
+
+@cache
+def _decompositions(limit: int) -> dict[int, frozenset[tuple[int, ...]]]:
+    ways: dict[int, set[tuple[int, ...]]] = {0: {()}}
+    for nominal in sorted(UC_AMOUNTS_FOR_IMPORT):
+        for total in range(nominal, limit + 1):
+            for way in ways.get(total - nominal, ()):
+                if len(way) < MAX_CODES_PER_UNIT:
+                    ways.setdefault(total, set()).add(way + (nominal,))
+    return {total: frozenset(variants) for total, variants in ways.items() if total}
+
+
+@cache
+def get_recipes(amount: int) -> tuple[tuple[int, ...], ...]:
+    """Все разложения суммы на номиналы: сначала с меньшим числом кодов."""
+    if not amount:
+        return ()
+    limit = max(amount, max(DEFAULT_UC_AMOUNTS))
+    variants = _decompositions(limit).get(amount, ())
+    recipes = (tuple(sorted(way, reverse=True)) for way in variants)
+    return tuple(
+        sorted(recipes, key=lambda recipe: (len(recipe), [-n for n in recipe]))
+    )
+
+
+@cache
+def get_nominals(amount: int) -> frozenset[int]:
+    return frozenset(nominal for recipe in get_recipes(amount) for nominal in recipe)
+
+
+def _snapshot(amount: int, inventory: dict[int, int]) -> tuple[tuple[int, int], ...]:
+    return tuple(
+        (nominal, max(inventory.get(nominal, 0), 0))
+        for nominal in sorted(get_nominals(amount))
+    )
+
+
+def _lp_max(
+    objective: list[float], rows: list[list[float]], limits: list[float]
+) -> tuple[float, list[float]]:
+    """Симплекс-метод: max objective·x при rows·x <= limits, x >= 0, limits >= 0.
+
+    Начальный базис - дополнительные переменные, правило Бленда не даёт
+    зациклиться. Задача ограничена: каждый рецепт расходует коды.
+    """
+    m, n = len(rows), len(objective)
+    tableau = [
+        [*row, *(1.0 if i == j else 0.0 for j in range(m)), limit]
+        for i, (row, limit) in enumerate(zip(rows, limits))
+    ]
+    reduced = [-value for value in objective] + [0.0] * (m + 1)
+    basis = list(range(n, n + m))
+    while (col := next((j for j in range(n + m) if reduced[j] < -EPS), None)) is not None:
+        _, _, pivot = min(
+            (tableau[i][-1] / tableau[i][col], basis[i], i) for i in range(m) if tableau[i][col] > EPS
+        )
+        pivot_row = tableau[pivot]
+        factor = pivot_row[col]
+        pivot_row[:] = [value / factor for value in pivot_row]
+        for row in (*(tableau[i] for i in range(m) if i != pivot), reduced):
+            if abs(row[col]) > EPS:
+                ratio = row[col]
+                row[:] = [value - ratio * pivot_value for value, pivot_value in zip(row, pivot_row)]
+        basis[pivot] = col
+    solution = [0.0] * n
+    for i, var in enumerate(basis):
+        if var < n:
+            solution[var] = tableau[i][-1]
+    return reduced[-1], solution
+
+
+def _search(
+    objective: list[float],
+    usage: list[list[int]],
+    stock: list[int],
+    quantity: int | None,
+    start: list[int],
+    max_nodes: int | None = None,
+) -> tuple[list[int], bool]:
+    """Ветви и границы: целые x с max objective·x при usage·x <= stock.
+
+    Граница ветки - линейная релаксация. Для цели из единиц (число единиц
+    товара) граница округляется вниз. start - известное решение, max_nodes
+    ограничивает число решаемых релаксаций. Возвращает (x, точно ли): False,
+    если поиск остановлен по max_nodes и лучший x может быть не оптимальным.
+    """
+    integral = all(weight == 1 for weight in objective)
+    best = start
+    best_value = sum(w * x for w, x in zip(objective, best))
+    size = len(objective)
+    stack = [([0] * size, [None] * size)]
+    nodes = 0
+    while stack and (max_nodes is None or nodes < max_nodes):
+        lower, upper = stack.pop()
+        nodes += 1
+        limits = [
+            limit - sum(count * units for count, units in zip(row, lower))
+            for row, limit in zip(usage, stock)
+        ]
+        rows = [list(map(float, row)) for row in usage]
+        for index, bound in enumerate(upper):
+            if bound is not None:
+                rows.append([1.0 if j == index else 0.0 for j in range(size)])
+                limits.append(bound - lower[index])
+        if quantity is not None:
+            rows.append([1.0] * size)
+            limits.append(quantity - sum(lower))
+        if min(limits) < 0:
+            continue
+        value, solution = _lp_max(objective, rows, limits)
+        value += sum(w * low for w, low in zip(objective, lower))
+        if integral:
+            value = math.floor(value + EPS)
+        if value <= best_value + EPS:
+            continue
+        units = [low + extra for low, extra in zip(lower, solution)]
+        rounded = [math.floor(x + EPS) for x in units]
+        rounded_value = sum(w * x for w, x in zip(objective, rounded))
+        if rounded_value > best_value + EPS:
+            best_value, best = rounded_value, rounded
+        fractional = next((i for i, x in enumerate(units) if x - math.floor(x + EPS) > EPS), None)
+        if fractional is None:
+            continue
+        down = math.floor(units[fractional])
+        stack.append(([down + 1 if i == fractional else low for i, low in enumerate(lower)], upper))
+        stack.append((lower, [down if i == fractional else bound for i, bound in enumerate(upper)]))
+    return best, not stack
+
+
+@lru_cache(maxsize=4096)
+def _plan(
+    amount: int, inventory: tuple[tuple[int, int], ...], quantity: int | None
+) -> Composition:
+    """Максимум единиц (не больше quantity), среди таких - наименьшая цена.
+
+    Число единиц ищется точно. Цена рецепта - доля остатков каждого номинала,
+    которую он съедает; при заданном quantity план с найденным числом единиц
+    дешевеет вторым поиском, где цена входит в цель с весом меньше единицы,
+    делённой на число номиналов, так что число единиц не уменьшается.
+    Поиск цены ограничен PLAN_COST_NODES релаксациями; если их не хватило,
+    план пишется в лог как возможно не самый дешёвый.
+    """
+    stock = dict(inventory)
+    requirements = [
+        (recipe, Counter(recipe)) for recipe in get_recipes(amount)
+        if all(stock[nominal] >= count for nominal, count in Counter(recipe).items())
+    ]
+    if not requirements or quantity == 0:
+        return Composition(0, ())
+    nominals = sorted({nominal for _, need in requirements for nominal in need})
+    usage = [[need[nominal] for _, need in requirements] for nominal in nominals]
+    limits = [stock[nominal] for nominal in nominals]
+    best, _ = _search([1] * len(requirements), usage, limits, quantity, [0] * len(requirements))
+    if quantity is not None and len(requirements) > 1:
+        weight = 1 / (len(nominals) + 1)
+        objective = [
+            1 - weight * sum(count / stock[nominal] for nominal, count in need.items())
+            for _, need in requirements
+        ]
+        best, exact = _search(objective, usage, limits, sum(best), best, PLAN_COST_NODES)
+        if not exact:
+            logger.warning(
+                f"Composition of {quantity} x {amount} UC from {stock}: cost search stopped "
+                f"after {PLAN_COST_NODES} relaxations, the plan may not be the cheapest"
+            )
+    return Composition(
+        sum(best),
+        tuple((recipe, units) for (recipe, _), units in zip(requirements, best) if units),
+    )
+
+
+def max_units(amount: int, inventory: dict[int, int]) -> int:
+    """Максимальное число единиц товара, собираемых из остатков кодов."""
+    return _plan(amount, _snapshot(amount, inventory), None).units
+
+
+def compose(amount: int, inventory: dict[int, int], quantity: int) -> Composition | None:
+    """Набор рецептов на quantity единиц или None, если кодов не хватает."""
+    composition = _plan(amount, _snapshot(amount, inventory), quantity)
+    if composition.units < quantity:
+        return None
+    return composition
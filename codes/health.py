@@ -0,0 +1,216 @@
+"""Здоровье активаторов: оценка по журналу попыток и circuit breaker.
+
+Каждая попытка активации пишется в ActivatorAttempt. Оценка активатора -
+доля успехов за последние ACTIVATOR_HEALTH_WINDOW секунд без учёта ошибок
+самого кода (использован, неверный). Активатор здоров, пока у него меньше
+ACTIVATOR_HEALTH_MIN_ATTEMPTS таких попыток или оценка не ниже
+ACTIVATOR_HEALTH_MIN_SCORE. Оценки и порядок из ActivatorPriority
+кэшируются в Redis на ACTIVATOR_HEALTH_CACHE_TTL секунд, так что БД
+читается не на каждый код.
+
+Circuit breaker, тоже в Redis: после ACTIVATOR_BREAKER_FAILURES сбоев
+подряд активатор открыт (пропускается) ACTIVATOR_BREAKER_COOLDOWN секунд,
+затем полуоткрыт - пропускает один пробный запрос. Успех закрывает его,
+сбой снова открывает. Если открыты все активаторы, они всё равно
+пробуются, чтобы код не падал без единой попытки.
+
+Порядок попыток: открытые пропускаются; здоровые идут по порядку из
+админки, за ними нездоровые по убыванию оценки.
+"""
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Avg, Count, Q, Sum
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from backend.db_executor import db_sync_to_async
+from backend.redis_client import get_aredis, get_redis
+from payments.activators import CODE_KOKOS_ERRORS, CODE_UCODEIUM_ERRORS
+
+from .models import Activator, ActivatorAttempt, ActivatorPriority
+
+logger = logging.getLogger(__name__)
+
+HEALTH_KEY = "activators:health"
+FAILURES_KEY = "activator:{name}:failures"
+OPEN_KEY = "activator:{name}:open"
+PROBE_KEY = "activator:{name}:probe"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+CODE_ERRORS = {
+    Activator.UCODEIUM: CODE_UCODEIUM_ERRORS,
+    Activator.KOKOS: CODE_KOKOS_ERRORS,
+    Activator.FARS: ("INVALID_CODE", "UNMATCHED_CODE_AMOUNT"),
+}
+
+
+def classify(activator: str, succ: bool, status) -> tuple[str, str]:
+    """Исход попытки и класс ошибки по ответу активатора."""
+    if succ:
+        return ActivatorAttempt.Outcome.SUCCESS, ""
+    error_class = str(status).split(":")[0].strip()[:50]
+    if error_class in CODE_ERRORS.get(activator, ()):
+        return ActivatorAttempt.Outcome.CODE_ERROR, error_class
+    return ActivatorAttempt.Outcome.FAILURE, error_class
+
+
+def compute_health() -> dict:
+    """Порядок из админки и оценки активаторов по журналу попыток."""
+    since = timezone.now() - timedelta(seconds=settings.ACTIVATOR_HEALTH_WINDOW)
+    outcome = ActivatorAttempt.Outcome
+    stats = {
+        row["activator"]: row
+        for row in ActivatorAttempt.objects.filter(created_at__gte=since)
+        .values("activator")
+        .annotate(
+            successes=Count("id", filter=Q(outcome=outcome.SUCCESS)),
+            failures=Count("id", filter=Q(outcome__in=(outcome.FAILURE, outcome.EXCEPTION))),
+            attempts=Count("id"),
+            latency_ms=Avg("latency_ms"),
+            cost=Sum("request_cost"),
+        )
+    }
+    activators = []
+    for name in (
+        ActivatorPriority.objects.filter(is_active=True).order_by("order").values_list("name", flat=True)
+    ):
+        row = stats.get(name, {})
+        successes, failures = row.get("successes", 0), row.get("failures", 0)
+        score = round(successes / (successes + failures), 3) if successes + failures else None
+        activators.append({
+            "name": name,
+            "score": score,
+            "is_healthy": (
+                successes + failures < settings.ACTIVATOR_HEALTH_MIN_ATTEMPTS
+                or score >= settings.ACTIVATOR_HEALTH_MIN_SCORE
+            ),
+            "attempts": row.get("attempts", 0),
+            "latency_ms": round(row["latency_ms"]) if row.get("latency_ms") is not None else None,
+            "cost": float(row["cost"]) if row.get("cost") is not None else None,
+        })
+    return {"activators": activators}
+
+
+def get_health() -> dict:
+    """Кэшированные оценки для админки."""
+    redis = get_redis()
+    try:
+        if cached := redis.get(HEALTH_KEY):
+            return json.loads(cached)
+        health = compute_health()
+        redis.set(HEALTH_KEY, json.dumps(health), ex=settings.ACTIVATOR_HEALTH_CACHE_TTL)
+        return health
+    except RedisError:
+        logger.exception("Activator health cache is unavailable")
+        return compute_health()
+
+
+async def aget_health() -> dict:
+    redis = get_aredis()
+    try:
+        if cached := await redis.get(HEALTH_KEY):
+            return json.loads(cached)
+    except RedisError:
+        logger.exception("Activator health cache is unavailable")
+        return await db_sync_to_async(compute_health)()
+    health = await db_sync_to_async(compute_health)()
+    try:
+        await redis.set(HEALTH_KEY, json.dumps(health), ex=settings.ACTIVATOR_HEALTH_CACHE_TTL)
+    except RedisError:
+        pass
+    return health
+
+
+def invalidate_health():
+    try:
+        get_redis().delete(HEALTH_KEY)
+    except RedisError:
+        logger.exception("Can't invalidate activator health cache")
+
+
+def _state(is_open, failures) -> str:
+    if is_open:
+        return OPEN
+    if int(failures or 0) >= settings.ACTIVATOR_BREAKER_FAILURES:
+        return HALF_OPEN
+    return CLOSED
+
+
+def get_states(names: list[str]) -> dict[str, str]:
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.exists(OPEN_KEY.format(name=name))
+                pipe.get(FAILURES_KEY.format(name=name))
+            values = pipe.execute()
+    except RedisError:
+        return {name: CLOSED for name in names}
+    return {name: _state(*values[i * 2:i * 2 + 2]) for i, name in enumerate(names)}
+
+
+async def aget_states(names: list[str]) -> dict[str, str]:
+    try:
+        async with get_aredis().pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.exists(OPEN_KEY.format(name=name))
+                pipe.get(FAILURES_KEY.format(name=name))
+            values = await pipe.execute()
+    except RedisError:
+        logger.exception("Activator breakers are unavailable")
+        return {name: CLOSED for name in names}
+    return {name: _state(*values[i * 2:i * 2 + 2]) for i, name in enumerate(names)}
+
+
+async def aplan() -> list[tuple[str, str]]:
+    """Активаторы в порядке попыток: [(имя, состояние breaker)]."""
+    activators = (await aget_health())["activators"]
+    states = await aget_states([activator["name"] for activator in activators])
+    # sorted устойчива: среди здоровых сохраняется порядок из админки.
+    ranked = sorted(
+        activators,
+        key=lambda activator: (0, 0) if activator["is_healthy"] else (1, -activator["score"]),
+    )
+    plan = [(a["name"], states[a["name"]]) for a in ranked if states[a["name"]] != OPEN]
+    if not plan:
+        logger.warning("All activators are open, trying them anyway")
+        plan = [(a["name"], OPEN) for a in ranked]
+    return plan
+
+
+async def atry_probe(name: str) -> bool:
+    """Полуоткрытый активатор пропускает один пробный запрос за раз."""
+    try:
+        return bool(await get_aredis().set(
+            PROBE_KEY.format(name=name), 1, nx=True, ex=settings.ACTIVATOR_BREAKER_COOLDOWN
+        ))
+    except RedisError:
+        return True
+
+
+async def arecord(name: str, outcome: str):
+    """Обновляет breaker по исходу попытки; ошибки кода его не меняют."""
+    cooldown = settings.ACTIVATOR_BREAKER_COOLDOWN
+    keys = FAILURES_KEY.format(name=name), OPEN_KEY.format(name=name), PROBE_KEY.format(name=name)
+    try:
+        redis = get_aredis()
+        if outcome == ActivatorAttempt.Outcome.SUCCESS:
+            await redis.delete(*keys)
+        elif outcome in (ActivatorAttempt.Outcome.FAILURE, ActivatorAttempt.Outcome.EXCEPTION):
+            async with redis.pipeline() as pipe:
+                pipe.incr(keys[0])
+                # Сбои считаются подряд в пределах окна оценки.
+                pipe.expire(keys[0], settings.ACTIVATOR_HEALTH_WINDOW)
+                pipe.delete(keys[2])
+                failures, *_ = await pipe.execute()
+            if failures >= settings.ACTIVATOR_BREAKER_FAILURES:
+                if not await redis.exists(keys[1]):
+                    logger.warning(f"Activator {name} is open after {failures} failures in a row")
+                await redis.set(keys[1], 1, ex=cooldown)
+    except RedisError:
+        logger.exception(f"Can't update breaker of {name}")
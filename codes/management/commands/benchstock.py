@@ -0,0 +1,153 @@
+import random
+import statistics
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from backend.constants import DEFAULT_SC_AMOUNTS, UC_AMOUNTS_FOR_IMPORT
+from codes.models import Giftcard, StockbleCode, UcCode
+from items.models import Item
+from orders.models import Order
+from users.models import TgUser
+
+BATCH_SIZE = 10_000
+BENCH_PREFIX = "BENCH"
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает планы и время выборки свободных кодов с частичными "
+        "индексами и без них. Всё выполняется в одной транзакции и "
+        "откатывается; DROP INDEX держит блокировку таблиц до отката, "
+        "поэтому запускать на стенде, а не на проде."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--codes", type=int, default=1_000_000)
+        parser.add_argument("--free-ratio", type=float, default=0.05)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--plans", action="store_true", help="Print EXPLAIN ANALYZE")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Benchmark needs PostgreSQL (partial indexes, SKIP LOCKED).")
+        with transaction.atomic():
+            item = self.seed(options["codes"], options["free_ratio"])
+            with connection.cursor() as cursor:
+                for model in (UcCode, StockbleCode, Giftcard):
+                    cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+            queries = self.get_queries(item)
+            with_indexes = self.measure(queries, options["repeat"], options["plans"])
+            self.drop_indexes()
+            without_indexes = self.measure(queries, options["repeat"], options["plans"])
+
+            self.stdout.write(f"{'query':<28}{'no index, ms':>14}{'index, ms':>12}{'x':>8}")
+            for name in queries:
+                before, after = without_indexes[name], with_indexes[name]
+                speedup = before / after if after else 0
+                self.stdout.write(f"{name:<28}{before:>14.3f}{after:>12.3f}{speedup:>8.1f}")
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Done, all changes rolled back."))
+
+    def seed(self, total: int, free_ratio: float) -> Item:
+        self.stdout.write(f"Seeding {total} codes per table, {free_ratio:.0%} free...")
+        item = Item.objects.create(
+            category=Item.Category.GIFTCARD, price=1, is_active=True
+        )
+        user = TgUser.objects.create(tg_id=0)
+        order = Order.objects.create(
+            tg_user=user,
+            item=item,
+            quantity=1,
+            data={},
+            price=1,
+            category=item.category,
+            balance_before=0,
+        )
+        uc_amounts = list(UC_AMOUNTS_FOR_IMPORT)
+        sc_amounts = list(DEFAULT_SC_AMOUNTS)
+        now = timezone.now()
+        for start in range(0, total, BATCH_SIZE):
+            uc_codes, sc_codes, giftcards = [], [], []
+            for i in range(start, min(start + BATCH_SIZE, total)):
+                is_free = random.random() < free_ratio
+                uc_codes.append(
+                    UcCode(
+                        code=f"{BENCH_PREFIX}UC{i}",
+                        amount=random.choice(uc_amounts),
+                        is_activated=not is_free,
+                        is_priority_use=random.random() < 0.01,
+                        order=None if is_free else order,
+                    )
+                )
+                sc_codes.append(
+                    StockbleCode(
+                        code=f"{BENCH_PREFIX}SC{i}",
+                        amount=random.choice(sc_amounts),
+                        order=None if is_free else order,
+                    )
+                )
+                giftcards.append(
+                    Giftcard(
+                        code=f"{BENCH_PREFIX}GC{i}",
+                        item=item,
+                        order=None if is_free else order,
+                    )
+                )
+            UcCode.objects.bulk_create(uc_codes)
+            StockbleCode.objects.bulk_create(sc_codes)
+            Giftcard.objects.bulk_create(giftcards)
+        self.stdout.write(f"Seeded in {(timezone.now() - now).total_seconds():.1f}s")
+        return item
+
+    def get_queries(self, item: Item) -> dict:
+        """Горячие запросы: резервирование под заказ и подсчёт остатков."""
+        uc_amount = random.choice(list(UC_AMOUNTS_FOR_IMPORT))
+        sc_amount = random.choice(list(DEFAULT_SC_AMOUNTS))
+        querysets = {
+            "uc reserve": UcCode.objects.select_for_update(skip_locked=True)
+            .filter(order__isnull=True, amount=uc_amount, is_activated=False)
+            .order_by(*UcCode.RESERVE_ORDERING)
+            .values("id")[:5],
+            "uc free by amount": UcCode.objects.filter(order__isnull=True)
+            .values("amount")
+            .annotate(total=Count("id"))
+            .order_by(),
+            "stockble reserve": StockbleCode.objects.select_for_update(skip_locked=True)
+            .filter(order__isnull=True, amount=sc_amount)
+            .order_by(*StockbleCode.RESERVE_ORDERING)
+            .values("id")[:5],
+            "giftcard reserve": Giftcard.objects.select_for_update(skip_locked=True)
+            .filter(order__isnull=True, item_id=item.id)
+            .order_by(*Giftcard.RESERVE_ORDERING)
+            .values("id")[:5],
+        }
+        return {name: qs.query.sql_with_params() for name, qs in querysets.items()}
+
+    def measure(self, queries: dict, repeat: int, plans: bool) -> dict:
+        results = {}
+        with connection.cursor() as cursor:
+            for name, (sql, params) in queries.items():
+                if plans:
+                    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+                    self.stdout.write(f"-- {name}")
+                    for (line,) in cursor.fetchall():
+                        self.stdout.write(line)
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                    timings.append((time.perf_counter() - started) * 1000)
+                results[name] = statistics.median(timings)
+        return results
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for model in (UcCode, StockbleCode, Giftcard):
+                for index in model._meta.indexes:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand
+
+from payments.http import LATENCY_BUCKETS, get_latency_stats, reset_latency_stats
+
+
+class Command(BaseCommand):
+    help = "Время ответа внешних HTTP-сервисов (активаторы, платёжки) по хостам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buckets", action="store_true", help="Print histogram buckets")
+        parser.add_argument("--reset", action="store_true", help="Reset collected histograms")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            reset_latency_stats()
+            self.stdout.write(self.style.SUCCESS("Histograms have been reset."))
+            return
+        stats = get_latency_stats()
+        if not stats:
+            self.stdout.write("No requests recorded yet.")
+            return
+        self.stdout.write(
+            f"{'host':<36}{'count':>9}{'avg, ms':>9}{'p50':>8}{'p95':>8}{'p99':>8}  statuses"
+        )
+        for host, row in stats.items():
+            statuses = " ".join(f"{k}={v}" for k, v in sorted(row["statuses"].items()))
+            self.stdout.write(
+                f"{host:<36}{row['count']:>9}{row['avg_ms']:>9}"
+                f"{row['p50']:>8}{row['p95']:>8}{row['p99']:>8}  {statuses}"
+            )
+            if options["buckets"]:
+                for bound in (*map(str, LATENCY_BUCKETS), "inf"):
+                    self.stdout.write(f"    <= {bound:>6} ms  {row['buckets'][bound]}")
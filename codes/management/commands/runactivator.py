@@ -0,0 +1,29 @@
+import asyncio
+
+from django.core.management import BaseCommand
+
+from backend.config_cache import arefresh_config
+from backend.db_executor import start_db_executor_monitor
+from bot.misc.logging import configure_logger
+from codes.activation import run_activation_service
+from payments.http import close_session
+
+
+async def main():
+    configure_logger(True)
+    start_db_executor_monitor()
+    await arefresh_config()
+    try:
+        await run_activation_service()
+    finally:
+        await close_session()
+
+
+class Command(BaseCommand):
+    help = "Сервис активации UC-кодов"
+
+    def handle(self, *args, **options):
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
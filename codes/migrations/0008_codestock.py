@@ -0,0 +1,52 @@
+# Generated by Django 5.0.7 on 2026-10-18 17:56
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_code_stock(apps, schema_editor):
+    CodeStock = apps.get_model('codes', 'CodeStock')
+    sources = (
+        ('uc', apps.get_model('codes', 'UcCode'), 'amount'),
+        ('stockble', apps.get_model('codes', 'StockbleCode'), 'amount'),
+        ('giftcard', apps.get_model('codes', 'Giftcard'), 'item_id'),
+    )
+    for code_type, model, key_field in sources:
+        rows = (
+            model.objects.filter(order__isnull=True)
+            .values_list(key_field)
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        CodeStock.objects.bulk_create(
+            [CodeStock(code_type=code_type, key=key, amount=count) for key, count in rows]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codes', '0007_activatorpriority_is_active'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code_type', models.CharField(choices=[('uc', 'UC code'), ('stockble', 'Stockble code'), ('giftcard', 'Giftcard')], max_length=20, verbose_name='Code type')),
+                ('key', models.PositiveBigIntegerField(help_text='Nominal for UC/stockble codes, item id for giftcards', verbose_name='Key')),
+                ('amount', models.IntegerField(default=0, verbose_name='Free codes')),
+            ],
+            options={
+                'verbose_name': 'Code stock',
+                'verbose_name_plural': 'Code stock',
+                'ordering': ('code_type', 'key'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='codestock',
+            constraint=models.UniqueConstraint(fields=('code_type', 'key'), name='unique_code_stock_key'),
+        ),
+        migrations.RunPython(fill_code_stock, migrations.RunPython.noop),
+    ]
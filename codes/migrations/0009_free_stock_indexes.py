@@ -0,0 +1,30 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:02
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индексы строятся без блокировки записи в таблицы кодов.
+    atomic = False
+
+    dependencies = [
+        ('codes', '0008_codestock'),
+        ('items', '0014_categorydescription_manualcategory_description'),
+        ('orders', '0005_topup_currency_topup_payment_url_and_more'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='giftcard',
+            index=models.Index(condition=models.Q(('order__isnull', True)), fields=['item', 'created_at'], name='giftcard_free_stock_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='stockblecode',
+            index=models.Index(condition=models.Q(('order__isnull', True)), fields=['amount', 'created_at'], name='stockblecode_free_stock_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='uccode',
+            index=models.Index(condition=models.Q(('order__isnull', True)), fields=['amount', '-is_priority_use', 'created_at'], name='uccode_free_stock_idx'),
+        ),
+    ]
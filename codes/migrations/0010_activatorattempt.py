@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('codes', '0009_free_stock_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivatorAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activator', models.CharField(choices=[('kokos', 'Kokos'), ('fars', 'FARS'), ('smileone', 'SmileOne'), ('ucodeium', 'UCodeium')], max_length=20, verbose_name='Activator')),
+                ('outcome', models.CharField(choices=[('success', 'Success'), ('code_error', 'Code error'), ('failure', 'Activator failure'), ('exception', 'Exception')], help_text='Code errors (used or invalid code) do not affect activator health', max_length=20, verbose_name='Outcome')),
+                ('error_class', models.CharField(blank=True, default='', max_length=50, verbose_name='Error class')),
+                ('latency_ms', models.PositiveIntegerField(verbose_name='Latency, ms')),
+                ('request_cost', models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True, verbose_name='Request cost')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Creation date')),
+                ('code', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activator_attempts', to='codes.uccode', verbose_name='Code')),
+            ],
+            options={
+                'verbose_name': 'Activator attempt',
+                'verbose_name_plural': 'Activator attempts',
+                'indexes': [models.Index(fields=['activator', 'created_at'], name='activator_attempt_recent_idx')],
+            },
+        ),
+    ]
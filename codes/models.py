@@ -1,4 +1,9 @@
-from django.db import models
+import logging
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 
 from backend.constants import DEFAULT_SC_AMOUNTS, DEFAULT_UC_AMOUNTS
 
@@ -34,7 +39,128 @@ class ActivatorPriority(models.Model):
         return f"{self.get_name_display()} - Priority {self.order} ({status})"
 
 
+logger = logging.getLogger(__name__)
+
+
+class CodeStock(models.Model):
+    """Счётчик свободных (не привязанных к заказу) кодов."""
+
+    class CodeType(models.TextChoices):
+        UC = "uc", "UC code"
+        STOCKBLE = "stockble", "Stockble code"
+        GIFTCARD = "giftcard", "Giftcard"
+
+    code_type = models.CharField(
+        max_length=20, choices=CodeType, verbose_name="Code type"
+    )
+    key = models.PositiveBigIntegerField(
+        verbose_name="Key", help_text="Nominal for UC/stockble codes, item id for giftcards"
+    )
+    amount = models.IntegerField(default=0, verbose_name="Free codes")
+
+    class Meta:
+        verbose_name = "Code stock"
+        verbose_name_plural = "Code stock"
+        ordering = ("code_type", "key")
+        constraints = [
+            models.UniqueConstraint(
+                fields=("code_type", "key"), name="unique_code_stock_key"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_code_type_display()} {self.key}: {self.amount}"
+
+    @classmethod
+    def adjust(cls, code_type: str, key: int, delta: int):
+        """Меняет счётчик на delta в текущей транзакции."""
+        if not delta:
+            return
+        updated = cls.objects.filter(code_type=code_type, key=key).update(
+            amount=F("amount") + delta
+        )
+        if not updated:
+            stock, _ = cls.objects.get_or_create(code_type=code_type, key=key)
+            cls.objects.filter(id=stock.id).update(amount=F("amount") + delta)
+
+    @classmethod
+    def adjust_on_commit(cls, code_type: str, deltas: dict[int, int]):
+        """Меняет счётчики после коммита текущей транзакции.
+
+        Строка счётчика общая для всех покупок номинала: обновление внутри
+        транзакции заказа держало бы её блокировку до коммита и выстраивало
+        покупки в очередь. Ключи обновляются по возрастанию, каждый своим
+        коротким UPDATE. Если процесс упадёт до обновления, расхождение
+        исправит recount.
+        """
+        def apply():
+            for key in sorted(deltas):
+                cls.adjust(code_type, key, deltas[key])
+
+        transaction.on_commit(apply, robust=True)
+
+    @classmethod
+    def counts(cls, code_type: str, keys) -> dict[int, int]:
+        return dict(
+            cls.objects.filter(code_type=code_type, key__in=keys).values_list(
+                "key", "amount"
+            )
+        )
+
+    @classmethod
+    def get_amount(cls, code_type: str, key: int) -> int:
+        return cls.counts(code_type, [key]).get(key, 0)
+
+    @classmethod
+    def recount(cls) -> list[tuple[str, int, int, int]]:
+        """Пересчитывает счётчики по таблицам кодов и исправляет расхождения.
+
+        Каждый ключ сверяется в своей транзакции: строка счётчика блокируется,
+        коды считаются под блокировкой, и в счётчик добавляется разница, только
+        если он не изменился с момента чтения.
+        Возвращает список (code_type, key, было, стало) для исправленных строк.
+        """
+        fixed = []
+        for model in (UcCode, StockbleCode, Giftcard):
+            keys = set(
+                model.objects.filter(order__isnull=True, **model.FREE_FILTERS)
+                .values_list(model.STOCK_KEY_FIELD, flat=True)
+                .distinct()
+                .order_by()
+            )
+            keys |= set(
+                cls.objects.filter(code_type=model.STOCK_TYPE).values_list("key", flat=True)
+            )
+            for key in sorted(keys):
+                with transaction.atomic():
+                    stock, _ = cls.objects.select_for_update().get_or_create(
+                        code_type=model.STOCK_TYPE, key=key, defaults={"amount": 0}
+                    )
+                    real = model.objects.filter(
+                        order__isnull=True, **model.FREE_FILTERS, **{model.STOCK_KEY_FIELD: key}
+                    ).count()
+                    counted = stock.amount
+                    if real == counted:
+                        continue
+                    updated = cls.objects.filter(id=stock.id, amount=counted).update(
+                        amount=F("amount") + (real - counted)
+                    )
+                if not updated:
+                    continue
+                logger.warning(
+                    f"Code stock drift {model.STOCK_TYPE}:{key} {counted} -> {real}"
+                )
+                fixed.append((model.STOCK_TYPE, key, counted, real))
+        return fixed
+
+
 class AbstractCode(models.Model):
+    STOCK_TYPE: str
+    STOCK_KEY_FIELD = "amount"
+    RESERVE_ORDERING = ("created_at",)
+    FREE_FILTERS = {}
+    PRIORITY_FILTERS = {}
+
     code = models.CharField(max_length=50, unique=True, verbose_name="Code")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creation date")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Updation date")
@@ -42,8 +168,53 @@ class AbstractCode(models.Model):
     class Meta:
         abstract = True
 
+    @property
+    def stock_key(self) -> int | None:
+        """Ключ счётчика CodeStock, если код свободен."""
+        if self.order_id:
+            return None
+        if any(getattr(self, field) != value for field, value in self.FREE_FILTERS.items()):
+            return None
+        return getattr(self, self.STOCK_KEY_FIELD)
+
+    @classmethod
+    def reserve(cls, order, quantity: int, **filters) -> list:
+        """Привязывает к заказу до quantity свободных кодов.
+
+        Строки, заблокированные параллельными заказами, пропускаются, поэтому
+        одинаковые покупки не ждут друг друга. При включённых пулах коды
+        сначала берутся из Redis. Вызывать внутри транзакции; счётчик
+        CodeStock уменьшается после её коммита.
+        """
+        from codes import pools
+
+        codes = pools.reserve(cls, order, quantity, **filters) if pools.is_enabled() else []
+        if len(codes) < quantity:
+            selected = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(order__isnull=True, **filters)
+                .order_by(*cls.RESERVE_ORDERING)[: quantity - len(codes)]
+            )
+            if selected:
+                cls.objects.filter(id__in=[code.id for code in selected]).update(
+                    order=order, updated_at=timezone.now()
+                )
+            codes += selected
+        if not codes:
+            return codes
+        reserved = Counter(getattr(code, cls.STOCK_KEY_FIELD) for code in codes)
+        CodeStock.adjust_on_commit(cls.STOCK_TYPE, {key: -count for key, count in reserved.items()})
+        for code in codes:
+            code.order = order
+        return codes
+
 
 class UcCode(AbstractCode):
+    STOCK_TYPE = CodeStock.CodeType.UC
+    RESERVE_ORDERING = ("-is_priority_use", "created_at")
+    FREE_FILTERS = {"is_activated": False}
+    PRIORITY_FILTERS = {"is_priority_use": True}
+
     amount = models.PositiveIntegerField(
         choices=DEFAULT_UC_AMOUNTS, verbose_name="Nominal"
     )
@@ -79,9 +250,18 @@ class UcCode(AbstractCode):
     class Meta:
         verbose_name = "UC activating code"
         verbose_name_plural = "UC activating codes"
+        indexes = [
+            models.Index(
+                fields=["amount", "-is_priority_use", "created_at"],
+                condition=models.Q(order__isnull=True),
+                name="uccode_free_stock_idx",
+            ),
+        ]
 
 
 class StockbleCode(AbstractCode):
+    STOCK_TYPE = CodeStock.CodeType.STOCKBLE
+
     amount = models.IntegerField(choices=DEFAULT_SC_AMOUNTS, verbose_name="Nominal")
     order = models.ForeignKey(
         "orders.Order",
@@ -95,9 +275,19 @@ class StockbleCode(AbstractCode):
     class Meta:
         verbose_name = "PUBG STOCKBLE CODE"
         verbose_name_plural = "PUBG STOCKBLE CODES"
+        indexes = [
+            models.Index(
+                fields=["amount", "created_at"],
+                condition=models.Q(order__isnull=True),
+                name="stockblecode_free_stock_idx",
+            ),
+        ]
 
 
 class Giftcard(AbstractCode):
+    STOCK_TYPE = CodeStock.CodeType.GIFTCARD
+    STOCK_KEY_FIELD = "item_id"
+
     order = models.ForeignKey(
         "orders.Order",
         blank=True,
@@ -116,3 +306,56 @@ class Giftcard(AbstractCode):
     class Meta:
         verbose_name = "GIFTCARD"
         verbose_name_plural = "GIFTCARDS"
+        indexes = [
+            models.Index(
+                fields=["item", "created_at"],
+                condition=models.Q(order__isnull=True),
+                name="giftcard_free_stock_idx",
+            ),
+        ]
+
+
+class ActivatorAttempt(models.Model):
+    """Одна попытка активации кода активатором; журнал для codes.health."""
+
+    class Outcome(models.TextChoices):
+        SUCCESS = "success", "Success"
+        CODE_ERROR = "code_error", "Code error"
+        FAILURE = "failure", "Activator failure"
+        EXCEPTION = "exception", "Exception"
+
+    activator = models.CharField(
+        max_length=20, choices=Activator, verbose_name="Activator"
+    )
+    code = models.ForeignKey(
+        UcCode,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="activator_attempts",
+        verbose_name="Code",
+    )
+    outcome = models.CharField(
+        max_length=20,
+        choices=Outcome,
+        verbose_name="Outcome",
+        help_text="Code errors (used or invalid code) do not affect activator health",
+    )
+    error_class = models.CharField(
+        max_length=50, blank=True, default="", verbose_name="Error class"
+    )
+    latency_ms = models.PositiveIntegerField(verbose_name="Latency, ms")
+    request_cost = models.DecimalField(
+        max_digits=10, decimal_places=4, blank=True, null=True, verbose_name="Request cost"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Creation date")
+
+    class Meta:
+        verbose_name = "Activator attempt"
+        verbose_name_plural = "Activator attempts"
+        indexes = [
+            models.Index(fields=["activator", "created_at"], name="activator_attempt_recent_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_activator_display()}: {self.get_outcome_display()}"
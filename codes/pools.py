@@ -0,0 +1,211 @@
+"""Пулы свободных кодов в Redis.
+
+Для каждого номинала UC и стокабл-кодов и для каждого товара подарочных карт
+в Redis лежит список id свободных кодов. Заказ забирает id через LPOP,
+блокирует их строки с SKIP LOCKED и подтверждает одним UPDATE. Пока резерв не
+подтверждён, id лежат в хэше pending: если процесс упал, reconcile вернёт
+их в пул.
+"""
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from backend.config import FEATURES_CONFIG
+from backend.config_cache import get_config
+from backend.redis_client import get_redis
+
+from .models import CodeStock, Giftcard, StockbleCode, UcCode
+
+logger = logging.getLogger(__name__)
+
+CODE_MODELS = {model.STOCK_TYPE: model for model in (UcCode, StockbleCode, Giftcard)}
+
+POOL_KEY = "codes:pool:{code_type}:{key}"
+REFILL_LOCK_KEY = "codes:pool:refill:{code_type}:{key}"
+PENDING_KEY = "codes:pool:pending"
+
+# KEYS: пул, pending. ARGV: сколько взять, префикс поля pending, время.
+POP_SCRIPT = """
+local ids = redis.call('LPOP', KEYS[1], ARGV[1])
+if not ids then
+    ids = {}
+end
+for _, id in ipairs(ids) do
+    redis.call('HSET', KEYS[2], ARGV[2] .. ':' .. id, ARGV[3])
+end
+return {redis.call('LLEN', KEYS[1]), ids}
+"""
+
+
+def is_enabled() -> bool:
+    return get_config(FEATURES_CONFIG, "CODE_POOLS_ENABLED")
+
+
+def get_pool_key(code_type: str, key: int) -> str:
+    return POOL_KEY.format(code_type=code_type, key=key)
+
+
+def get_free_codes(model, key: int):
+    return model.objects.filter(
+        order__isnull=True, **model.FREE_FILTERS, **{model.STOCK_KEY_FIELD: key}
+    )
+
+
+def schedule_refill(code_type: str, key: int):
+    from .tasks import refill_code_pool_task
+
+    transaction.on_commit(lambda: refill_code_pool_task.delay(code_type, key))
+
+
+def reserve(model, order, quantity: int, **filters) -> list:
+    """Привязывает к заказу до quantity кодов из пула.
+
+    Строки id блокируются с SKIP LOCKED и обновляются только полученные.
+    Занятые, заблокированные другой транзакцией или не подходящие под
+    фильтры id выбрасываются из пула, недостающие коды резервируются из БД
+    вызывающим кодом.
+    """
+    key = filters.get(model.STOCK_KEY_FIELD)
+    if key is None:
+        return []
+    code_type = model.STOCK_TYPE
+    prefix = f"{code_type}:{key}"
+    redis = get_redis()
+    try:
+        left, ids = redis.eval(
+            POP_SCRIPT,
+            2,
+            get_pool_key(code_type, key),
+            PENDING_KEY,
+            quantity,
+            prefix,
+            int(time.time()),
+        )
+    except RedisError:
+        logger.exception(f"Code pool {prefix} is unavailable")
+        return []
+    if left < settings.CODE_POOL_SIZE // 2:
+        schedule_refill(code_type, key)
+    if not ids:
+        return []
+
+    ids = [int(code_id) for code_id in ids]
+    codes = list(
+        model.objects.select_for_update(skip_locked=True).filter(
+            id__in=ids, order__isnull=True, **filters
+        )
+    )
+    if codes:
+        model.objects.filter(id__in=[code.id for code in codes]).update(
+            order=order, updated_at=timezone.now()
+        )
+        codes.sort(key=lambda code: ids.index(code.id))
+
+    reserved = {code.id for code in codes}
+    stale = [f"{prefix}:{code_id}" for code_id in ids if code_id not in reserved]
+    pending = [f"{prefix}:{code_id}" for code_id in reserved]
+    try:
+        if stale:
+            redis.hdel(PENDING_KEY, *stale)
+    except RedisError:
+        logger.exception(f"Code pool {prefix}: failed to drop stale ids")
+    if pending:
+        transaction.on_commit(lambda: redis.hdel(PENDING_KEY, *pending), robust=True)
+    return codes
+
+
+def _needs_rebuild(model, key: int, pooled: list[int], queued: list[int]) -> bool:
+    """Есть ли приоритетные коды вне пула, которые должны стоять перед его id."""
+    if not model.PRIORITY_FILTERS:
+        return False
+    return (
+        get_free_codes(model, key).filter(**model.PRIORITY_FILTERS).exclude(id__in=queued).exists()
+        and model.objects.filter(id__in=pooled).exclude(**model.PRIORITY_FILTERS).exists()
+    )
+
+
+def refill(code_type: str, key: int) -> int:
+    """Дополняет пул свободными кодами из БД до CODE_POOL_SIZE.
+
+    Если появились приоритетные коды, а в пуле уже стоят обычные, пул
+    собирается заново в порядке RESERVE_ORDERING.
+    """
+    model = CODE_MODELS[code_type]
+    redis = get_redis()
+    lock = redis.lock(
+        REFILL_LOCK_KEY.format(code_type=code_type, key=key), timeout=60
+    )
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        pool = get_pool_key(code_type, key)
+        pooled = [int(code_id) for code_id in redis.lrange(pool, 0, -1)]
+        pending = [
+            int(field.rsplit(":", 1)[1])
+            for field, _ in redis.hscan_iter(PENDING_KEY, match=f"{code_type}:{key}:*")
+        ]
+        rebuild = _needs_rebuild(model, key, pooled, pooled + pending)
+        queued = pending if rebuild else pooled + pending
+        missing = settings.CODE_POOL_SIZE - (0 if rebuild else len(pooled))
+        if missing <= 0:
+            return 0
+        ids = list(
+            get_free_codes(model, key)
+            .exclude(id__in=queued)
+            .order_by(*model.RESERVE_ORDERING)
+            .values_list("id", flat=True)[:missing]
+        )
+        if rebuild:
+            with redis.pipeline() as pipe:
+                pipe.delete(pool)
+                if ids:
+                    pipe.rpush(pool, *ids)
+                pipe.execute()
+            logger.info(f"Code pool {code_type}:{key}: rebuilt for priority codes")
+        elif ids:
+            redis.rpush(pool, *ids)
+        return len(ids)
+    finally:
+        lock.release()
+
+
+def refill_all() -> int:
+    """Пополняет пулы всех ключей, по которым есть свободные коды."""
+    added = 0
+    stocks = CodeStock.objects.filter(amount__gt=0).values_list("code_type", "key")
+    for code_type, key in stocks:
+        added += refill(code_type, key)
+    return added
+
+
+def reconcile() -> int:
+    """Возвращает в пулы свободные коды из резервов, не дошедших до коммита."""
+    redis = get_redis()
+    deadline = time.time() - settings.CODE_POOL_PENDING_TIMEOUT
+    expired = defaultdict(dict)
+    for field, popped_at in redis.hscan_iter(PENDING_KEY):
+        if float(popped_at) < deadline:
+            code_type, key, code_id = field.split(":")
+            expired[(code_type, int(key))][int(code_id)] = field
+
+    returned = 0
+    for (code_type, key), fields in expired.items():
+        free_ids = list(
+            get_free_codes(CODE_MODELS[code_type], key)
+            .filter(id__in=fields)
+            .values_list("id", flat=True)
+        )
+        if free_ids:
+            redis.lpush(get_pool_key(code_type, key), *free_ids)
+            logger.warning(
+                f"Code pool {code_type}:{key}: returned {len(free_ids)} ids "
+                f"from unfinished reservations"
+            )
+        redis.hdel(PENDING_KEY, *fields.values())
+        returned += len(free_ids)
+    return returned
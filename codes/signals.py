@@ -1,23 +1,68 @@
 import logging
 
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import UcCode
-from .tasks import activate_code_task
+from .models import CodeStock, Giftcard, StockbleCode, UcCode
+from .activation import dispatch_order_activation
 
 logger = logging.getLogger(__name__)
 
+STOCK_FIELDS = {"order", "order_id", "amount", "item", "item_id", "is_activated"}
+ACTIVATION_FIELDS = {"order", "order_id", "is_activated"}
+
+
+@receiver(pre_save, sender=UcCode)
+@receiver(pre_save, sender=StockbleCode)
+@receiver(pre_save, sender=Giftcard)
+def code_pre_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not STOCK_FIELDS.intersection(update_fields):
+        instance._old_stock_key = instance.stock_key
+        return
+    old = (
+        sender.objects.filter(id=instance.id)
+        .values("order_id", sender.STOCK_KEY_FIELD, *sender.FREE_FILTERS)
+        .first()
+        if instance.id
+        else None
+    )
+    instance._old_stock_key = sender(**old).stock_key if old else None
+
+
+@receiver(post_save, sender=UcCode)
+@receiver(post_save, sender=StockbleCode)
+@receiver(post_save, sender=Giftcard)
+def code_stock_post_save(sender, instance, **kwargs):
+    old_key = getattr(instance, "_old_stock_key", None)
+    new_key = instance.stock_key
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        CodeStock.adjust(sender.STOCK_TYPE, old_key, -1)
+    if new_key is not None:
+        CodeStock.adjust(sender.STOCK_TYPE, new_key, 1)
+
+
+@receiver(post_delete, sender=UcCode)
+@receiver(post_delete, sender=StockbleCode)
+@receiver(post_delete, sender=Giftcard)
+def code_stock_post_delete(sender, instance, **kwargs):
+    if instance.stock_key is not None:
+        CodeStock.adjust(sender.STOCK_TYPE, instance.stock_key, -1)
+
 
 @receiver(post_save, sender=UcCode)
-def uccode_post_save(sender, instance: UcCode, created, **kwargs):
+def uccode_post_save(sender, instance: UcCode, created, update_fields=None, **kwargs):
+    # Сохранения сервиса активации (активатор, результат) заказ заново не ставят.
+    if update_fields and not ACTIVATION_FIELDS.intersection(update_fields):
+        return
     if not instance.is_activated and instance.order and instance.order.pubg_id:
-        logger.info(f"Have code to activate: {instance.code}. Sending to Celery.")
+        logger.info(f"Have code to activate: {instance.code}. Dispatching its order.")
         transaction.on_commit(
-            lambda: activate_code_task.delay(instance.code)
+            lambda: dispatch_order_activation(instance.order_id)
         )
         logger.info(
             f'Code {instance.code} was attached to order #{instance.order.id}. '
-            f'Activation task has been scheduled to run on transaction commit.'
+            f'Order activation will be dispatched on transaction commit.'
         )
@@ -1,28 +1,33 @@
 import logging
+from datetime import timedelta
 
-from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Sum
+from django.utils import timezone
 
 from backend.celery import app
 from backend.config import URL_CONFIG
-from bot.tasks import send_notification_task
+from backend.config_cache import aget_config
+from backend.db_executor import db_sync_to_async
+from bot.tasks import send_manager_notification
 from orders.models import Order
-from payments.activators import (
-    aactivate_code,
-    aactivate_code_fars,
-    aactivate_code_kokos,
-)
 
-from .models import Activator, ActivatorPriority, UcCode
+from . import pools
+from .models import ActivatorAttempt, CodeStock, UcCode
 
 logger = logging.getLogger(__name__)
 
 
-def _check_and_complete_order_sync(order_id: int):
+def finish_order_activation(order_id: int):
+    """Выставляет итог заказа по результатам активации его кодов.
+
+    Идемпотентна: заказ с итоговым статусом не меняется, поэтому её можно
+    вызывать после каждого прохода активации и из вебхука FARS.
+    """
     try:
         with transaction.atomic():
-            order_locked = Order.objects.select_for_update().get(id=order_id)
+            order_locked = Order.objects.for_rendering().select_for_update(of=("self",)).get(id=order_id)
 
             if order_locked.is_completed is not None:
                 logger.info(
@@ -30,11 +35,15 @@ def _check_and_complete_order_sync(order_id: int):
                 )
                 return
 
-            codes = UcCode.objects.filter(
-                order=order_locked, is_success=True
-            ).aggregate(Sum("amount"))
+            codes = list(order_locked.uc_codes.all())
+            if any(code.is_success is False for code in codes):
+                logger.info(f"Order {order_id} has failed codes. Setting is_completed=False.")
+                order_locked.is_completed = False
+                order_locked.save(update_fields=("is_completed",))
+                return
+
             order_amount = order_locked.data.get("amount")
-            ready_amount = codes.get("amount__sum", 0) or 0
+            ready_amount = sum(code.amount for code in codes if code.is_success)
 
             logger.info(
                 f"order_id={order_locked.id} order_amount={order_amount} ready_amount={ready_amount}"
@@ -53,105 +62,56 @@ def _check_and_complete_order_sync(order_id: int):
         logger.error(f"Order with id={order_id} not found during sync check.")
 
 
-async def check_order(order: Order):
-    await sync_to_async(_check_and_complete_order_sync, thread_sensitive=True)(order.id)
-
-
-async def activate_code(code: UcCode, pubg_id: str):
-    logger.info(f"Activating code {code.code} for user {pubg_id}")
-
-    activator_functions = {
-        Activator.UCODEIUM: aactivate_code,
-        Activator.KOKOS: aactivate_code_kokos,
-        Activator.FARS: aactivate_code_fars,
-    }
-
-    priorities = await sync_to_async(list)(
-        ActivatorPriority.objects.filter(is_active=True)
-        .order_by("order")
-        .values_list("name", flat=True)
-    )
-
-    if not priorities:
-        logger.error("No activators priorities are configured in the admin panel!")
-        await process_result(code, False, "Configuration Error: No activators.")
-        return
-
-    final_success = False
-    final_status = "No activator succeeded."
-
-    for activator_name in priorities:
-        logger.info(f"Trying activator: {activator_name} for code {code.code}")
-
-        activation_func = activator_functions.get(activator_name)
-        if not activation_func:
-            logger.warning(
-                f"No activation function found for '{activator_name}'. Skipping."
-            )
-            continue
-
-        try:
-            kwargs = {"player_id": pubg_id, "uc_code": code.code}
-            if activator_name in [Activator.UCODEIUM, Activator.FARS]:
-                kwargs["uc_value"] = code.amount
-            if activator_name == Activator.FARS:
-                kwargs["order_id"] = code.order.id
-
-            succ, status = await activation_func(**kwargs)
-
-            if succ:
-                logger.info(
-                    f"SUCCESS: Code {code.code} activated via {activator_name}."
-                )
-                final_success = True
-                final_status = status
-                code.activator = activator_name
-                await code.asave(update_fields=("activator",))
-
-                if activator_name == Activator.FARS:
-                    logger.info("FARS activation request sent. Waiting for webhook.")
-                    return
-
-                break
-            else:
-                logger.warning(
-                    f"FAIL: Activator {activator_name} failed with status: {status}"
-                )
-                final_status = f"{activator_name}: {status}"
-        except Exception as e:
-            logger.error(
-                f"Exception during activation with {activator_name}: {e}", exc_info=True
-            )
-            final_status = f"Exception with {activator_name}"
-
-    await process_result(code, final_success, final_status)
-
-
-async def process_result(code: UcCode, succ: bool, status: str):
+async def save_result(code: UcCode, succ: bool, status: str):
     code.is_activated = True
     code.status = status
     code.is_success = succ
-    await code.asave(update_fields=("is_activated", "status", "is_success"))
+    await db_sync_to_async(code.save)(
+        update_fields=("is_activated", "status", "is_success", "activator")
+    )
     text = (
         f"{'✅' if succ else '❗️'} "
         f"Activating code {code.code} {'' if succ else 'NOT'} "
         f"activated with status {status}"
     )
     logger.info(text)
-    chat_id = await sync_to_async(lambda: URL_CONFIG.ADMIN_ID)()
-    send_notification_task.delay(chat_id, text)
+    chat_id = await aget_config(URL_CONFIG, "ADMIN_ID")
+    # Redis-буфер и публикация задачи Celery блокируют; в пуле БД им не место.
+    await sync_to_async(send_manager_notification, thread_sensitive=False)(chat_id, text)
+
+
+async def process_result(code: UcCode, succ: bool, status: str):
+    """Результат одного кода вне сервиса активации (вебхук FARS)."""
+    await save_result(code, succ, status)
+    await db_sync_to_async(finish_order_activation)(code.order_id)
+
 
-    if not succ:
-        code.order.is_completed = False
-        await code.order.asave(update_fields=("is_completed",))
-    await check_order(code.order)
+@app.task()
+def prune_activator_attempts_task():
+    """Фоново удаляет старые записи журнала попыток активации."""
+    since = timezone.now() - timedelta(days=settings.ACTIVATOR_ATTEMPTS_RETENTION_DAYS)
+    deleted, _ = ActivatorAttempt.objects.filter(created_at__lt=since).delete()
+    return deleted
 
 
 @app.task()
-def activate_code_task(code: str):
-    uccode = UcCode.objects.select_related("order__item", "order__tg_user").get(
-        code=code
-    )
-    if not uccode.is_activated and uccode.order and uccode.order.pubg_id:
-        logger.info(f"Got activation task! code: {code}")
-        async_to_sync(activate_code)(uccode, uccode.order.pubg_id)
+def recount_code_stock_task():
+    """Фоново сверяет счётчики CodeStock с таблицами кодов."""
+    fixed = CodeStock.recount()
+    if fixed:
+        logger.warning(f"Code stock counters repaired: {fixed}")
+    return len(fixed)
+
+
+@app.task()
+def refill_code_pool_task(code_type: str, key: int):
+    """Фоново пополняет пул свободных кодов одного ключа."""
+    return pools.refill(code_type, key)
+
+
+@app.task()
+def maintain_code_pools_task():
+    """Фоново возвращает коды из брошенных резервов и пополняет пулы."""
+    returned = pools.reconcile()
+    added = pools.refill_all() if pools.is_enabled() else 0
+    return returned, added
@@ -0,0 +1,63 @@
+import random
+from collections import Counter
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import composition
+from .composition import compose, get_nominals, get_recipes, max_units
+
+
+def brute_force_units(amount: int, inventory: dict[int, int]) -> int:
+    """Перебор всех количеств по каждому рецепту."""
+    requirements = [Counter(recipe) for recipe in get_recipes(amount)]
+
+    def search(index: int, remaining: dict[int, int]) -> int:
+        if index == len(requirements):
+            return 0
+        need = requirements[index]
+        units = min(remaining.get(nominal, 0) // count for nominal, count in need.items())
+        best = 0
+        for step in range(units + 1):
+            rest = dict(remaining)
+            for nominal, count in need.items():
+                rest[nominal] -= count * step
+            best = max(best, step + search(index + 1, rest))
+        return best
+
+    return search(0, inventory)
+
+
+class CompositionTests(SimpleTestCase):
+    def test_greedy_counterexample(self):
+        inventory = {8100: 4, 16200: 5, 24300: 1, 32400: 3}
+        self.assertEqual(max_units(32400, inventory), 7)
+        composition = compose(32400, inventory, 7)
+        self.assertIsNotNone(composition)
+        self.assertEqual(composition.units, 7)
+
+    @mock.patch.object(composition, "PLAN_COST_NODES", 1)
+    def test_logs_stopped_cost_search(self):
+        composition._plan.cache_clear()
+        inventory = {8100: 4, 16200: 5, 24300: 1, 32400: 3}
+        with self.assertLogs(composition.logger, "WARNING"):
+            result = compose(32400, inventory, 7)
+        composition._plan.cache_clear()
+        self.assertEqual(result.units, 7)
+
+    def test_matches_brute_force(self):
+        rng = random.Random(0)
+        amounts = (1920, 8100, 11950, 16200, 24300, 32400, 40500)
+        for _ in range(400):
+            amount = rng.choice(amounts)
+            inventory = {nominal: rng.randint(0, 6) for nominal in get_nominals(amount)}
+            units = max_units(amount, inventory)
+            with self.subTest(amount=amount, inventory=inventory):
+                self.assertEqual(units, brute_force_units(amount, inventory))
+                self.assertIsNone(compose(amount, inventory, units + 1))
+                for quantity in range(1, units + 1):
+                    composition = compose(amount, inventory, quantity)
+                    self.assertEqual(composition.units, quantity)
+                    used = composition.nominals
+                    self.assertTrue(all(used[nominal] <= inventory[nominal] for nominal in used))
+                    self.assertEqual(sum(nominal * count for nominal, count in used.items()), amount * quantity)
@@ -1,11 +1,13 @@
 import logging
 
 from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
 from django.http import HttpResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
 
-from codes.models import Giftcard, StockbleCode, UcCode
+from codes import pools
+from codes.models import CodeStock, Giftcard, StockbleCode, UcCode
 
 from .forms import GiftCardImportForm, ImportForm, StockbleCodeImportForm
 
@@ -26,10 +28,14 @@ def import_codes_view(request):
                 UcCode(amount=amount, code=code, is_priority_use=is_priority_use)
                 for code in codes
             ]
-            UcCode.objects.bulk_create(
-                db_codes,
-                batch_size=1000,
-            )
+            with transaction.atomic():
+                UcCode.objects.bulk_create(
+                    db_codes,
+                    batch_size=1000,
+                )
+                CodeStock.adjust(UcCode.STOCK_TYPE, int(amount), len(db_codes))
+                if is_priority_use and pools.is_enabled():
+                    pools.schedule_refill(UcCode.STOCK_TYPE, int(amount))
             return redirect(reverse("admin:codes_uccode_changelist"))
         else:
             return HttpResponse(f"There error in form:\n {form.errors}")
@@ -47,10 +53,14 @@ def import_giftcards_view(request):
                 Giftcard(item=form.cleaned_data["item"], code=code)
                 for code in form.cleaned_data["codes"]
             ]
-            Giftcard.objects.bulk_create(
-                db_codes,
-                batch_size=1000,
-            )
+            with transaction.atomic():
+                Giftcard.objects.bulk_create(
+                    db_codes,
+                    batch_size=1000,
+                )
+                CodeStock.adjust(
+                    Giftcard.STOCK_TYPE, form.cleaned_data["item"].id, len(db_codes)
+                )
             return redirect(reverse("admin:codes_giftcard_changelist"))
         else:
             return HttpResponse(f"There error in form:\n {form.errors}")
@@ -67,10 +77,12 @@ def import_stockblecode_view(request):
             codes = form.cleaned_data["codes"]
             amount = form.cleaned_data["amount"]
             db_codes = [StockbleCode(amount=amount, code=code) for code in codes]
-            StockbleCode.objects.bulk_create(
-                db_codes,
-                batch_size=1000,
-            )
+            with transaction.atomic():
+                StockbleCode.objects.bulk_create(
+                    db_codes,
+                    batch_size=1000,
+                )
+                CodeStock.adjust(StockbleCode.STOCK_TYPE, int(amount), len(db_codes))
             return redirect(reverse("admin:codes_stockblecode_changelist"))
         else:
             return HttpResponse(f"There error in form:\n {form.errors}")
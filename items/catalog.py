@@ -0,0 +1,257 @@
+"""Версия и снимок каталога товаров.
+
+Любое изменение товаров, ручных категорий, папок, описаний категорий или
+настроек увеличивает номер версии в Redis и публикует его в канал
+CATALOG_CHANNEL. Бот держит в памяти неизменяемый снимок каталога и
+подменяет его целиком, получив сообщение, так что меню строятся без
+запросов к БД. Собранные клавиатуры кешируются под номером версии.
+"""
+import asyncio
+import functools
+import logging
+from collections import defaultdict
+
+from redis.exceptions import RedisError
+
+from backend.db_executor import db_sync_to_async
+from backend.redis_client import get_aredis, get_redis
+
+from .models import CategoryDescription, Folder, Item, ManualCategory
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_CHANNEL = "catalog:updates"
+CHECK_INTERVAL = 30
+
+_catalog = None
+_listener = None
+
+
+def bump_version():
+    redis = get_redis()
+    redis.publish(CATALOG_CHANNEL, redis.incr(CATALOG_VERSION_KEY))
+
+
+def get_version() -> int | None:
+    try:
+        return int(get_redis().get(CATALOG_VERSION_KEY) or 0)
+    except RedisError:
+        logger.exception("Catalog version is unavailable")
+        return None
+
+
+async def aget_version() -> int | None:
+    try:
+        return int(await get_aredis().get(CATALOG_VERSION_KEY) or 0)
+    except RedisError:
+        logger.exception("Catalog version is unavailable")
+        return None
+
+
+def cached_by_version(builder):
+    """Кеширует результат корутины без аргументов до смены версии каталога."""
+    cached = {}
+
+    @functools.wraps(builder)
+    async def wrapper():
+        version = await aget_version()
+        if version is None:
+            return await builder()
+        if version not in cached:
+            result = await builder()
+            cached.clear()
+            cached[version] = result
+        return cached[version]
+
+    return wrapper
+
+
+class ItemRecord:
+    """Товар в снимке каталога. Поля не меняются после загрузки."""
+
+    __slots__ = (
+        "id",
+        "category",
+        "title",
+        "value",
+        "price",
+        "amount",
+        "is_active",
+        "folder_id",
+        "manual_category_id",
+    )
+
+    def __init__(self, item: Item):
+        self.id = item.id
+        self.category = item.category
+        self.title = item.title
+        self.value = item.value
+        self.price = item.price
+        self.amount = item.amount
+        self.is_active = item.is_active
+        self.folder_id = item.folder_id
+        self.manual_category_id = item.manual_category_id
+
+    def __str__(self) -> str:
+        return f"{self.value} | {self.price}$"
+
+    get_stock_keys = Item.get_stock_keys
+    get_stock_from_counts = Item.get_stock_from_counts
+
+
+class FolderRecord:
+    __slots__ = ("id", "category", "title")
+
+    def __init__(self, folder: Folder):
+        self.id = folder.id
+        self.category = folder.category
+        self.title = folder.title
+
+
+class ManualCategoryRecord:
+    __slots__ = ("id", "name", "prompt_text", "description", "is_active")
+
+    def __init__(self, category: ManualCategory):
+        self.id = category.id
+        self.name = category.name
+        self.prompt_text = category.prompt_text
+        self.description = category.description
+        self.is_active = category.is_active
+
+
+class Catalog:
+    """Неизменяемый снимок каталога с индексами по категории, папке и id."""
+
+    __slots__ = (
+        "version",
+        "items",
+        "folders",
+        "manual_categories",
+        "descriptions",
+        "_active_by_category",
+        "_by_folder",
+        "_active_by_manual_category",
+        "_folders_by_category",
+    )
+
+    def __init__(self, version, items, folders, manual_categories, descriptions):
+        self.version = version
+        self.items = {item.id: item for item in items}
+        self.folders = {folder.id: folder for folder in folders}
+        self.manual_categories = {cat.id: cat for cat in manual_categories}
+        self.descriptions = descriptions
+
+        active_by_category = defaultdict(list)
+        by_folder = defaultdict(list)
+        active_by_manual_category = defaultdict(list)
+        for item in items:
+            if item.folder_id is not None:
+                by_folder[item.folder_id].append(item)
+            if item.is_active:
+                active_by_category[item.category].append(item)
+                if item.manual_category_id is not None:
+                    active_by_manual_category[item.manual_category_id].append(item)
+        folders_by_category = defaultdict(list)
+        for folder in folders:
+            folders_by_category[folder.category].append(folder)
+
+        self._active_by_category = _freeze(active_by_category)
+        self._by_folder = _freeze(by_folder)
+        self._active_by_manual_category = _freeze(active_by_manual_category)
+        self._folders_by_category = _freeze(folders_by_category)
+
+    @classmethod
+    def load(cls, version: int | None) -> "Catalog":
+        items = [ItemRecord(item) for item in Item.objects.all()]
+        folders = [FolderRecord(folder) for folder in Folder.objects.all()]
+        manual_categories = [
+            ManualCategoryRecord(category) for category in ManualCategory.objects.all()
+        ]
+        descriptions = dict(
+            CategoryDescription.objects.exclude(description="").values_list(
+                "category", "description"
+            )
+        )
+        return cls(version, items, folders, manual_categories, descriptions)
+
+    def get_item(self, item_id: int) -> ItemRecord | None:
+        return self.items.get(item_id)
+
+    def get_folder(self, folder_id: int) -> FolderRecord | None:
+        return self.folders.get(folder_id)
+
+    def get_manual_category(self, category_id: int) -> ManualCategoryRecord | None:
+        return self.manual_categories.get(category_id)
+
+    def active_items(self, category: str) -> tuple[ItemRecord, ...]:
+        """Активные товары категории в порядке Item.Meta.ordering."""
+        return self._active_by_category.get(category, ())
+
+    def folder_items(self, folder_id: int) -> tuple[ItemRecord, ...]:
+        return self._by_folder.get(folder_id, ())
+
+    def manual_category_items(self, category_id: int) -> tuple[ItemRecord, ...]:
+        return self._active_by_manual_category.get(category_id, ())
+
+    def category_folders(self, category: str) -> tuple[FolderRecord, ...]:
+        return self._folders_by_category.get(category, ())
+
+
+def _freeze(index: dict[object, list]) -> dict[object, tuple]:
+    return {key: tuple(values) for key, values in index.items()}
+
+
+def load_catalog() -> Catalog:
+    # Версия читается до выборки: правка, попавшая между ними, ещё раз
+    # сменит версию и вызовет перезагрузку.
+    return Catalog.load(get_version())
+
+
+async def areload_catalog() -> Catalog:
+    global _catalog
+    _catalog = await db_sync_to_async(load_catalog)()
+    logger.info(f"Catalog snapshot v{_catalog.version} loaded: {len(_catalog.items)} items")
+    return _catalog
+
+
+async def aget_catalog() -> Catalog:
+    if _catalog is None:
+        return await areload_catalog()
+    return _catalog
+
+
+async def listen_catalog_updates():
+    """Подменяет снимок по сообщениям из Redis.
+
+    Без сообщений раз в CHECK_INTERVAL секунд сверяет номер версии, чтобы
+    не пропустить изменения, опубликованные во время переподключения.
+    """
+    while True:
+        try:
+            async with get_aredis().pubsub() as pubsub:
+                await pubsub.subscribe(CATALOG_CHANNEL)
+                await areload_catalog()
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=CHECK_INTERVAL
+                    )
+                    if message is None:
+                        if await aget_version() == _catalog.version:
+                            continue
+                    else:
+                        while await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=0
+                        ):
+                            pass
+                    await areload_catalog()
+        except RedisError:
+            logger.exception("Catalog updates listener lost Redis connection")
+            await asyncio.sleep(5)
+
+
+def start_catalog_listener():
+    global _listener
+    if _listener is None or _listener.done():
+        _listener = asyncio.create_task(listen_catalog_updates())
+    return _listener
@@ -1,12 +1,50 @@
-from collections import Counter
+from collections import defaultdict
 
-from asgiref.sync import sync_to_async
 from django.db import models
-from django.db.models import Count
+from django.db.models import Q
 
 from admin_panel.models import ManagerChat
-from backend.constants import CODES_MAP, DEFAULT_UC_AMOUNTS, UC_RECIPES
-from codes.models import Activator, StockbleCode, UcCode
+from backend.constants import DEFAULT_UC_AMOUNTS
+from backend.db_executor import db_sync_to_async
+from codes.composition import get_nominals, max_units
+from codes.models import Activator, CodeStock
+
+
+def resolve_stock(items) -> dict[int, int | None]:
+    """Считает остатки списка товаров одним запросом к счётчикам CodeStock.
+
+    Возвращает {item.id: остаток}; для товаров без учёта остатков - None.
+    UC-товары считаются движком codes.composition.
+    """
+    items = list(items)
+    wanted = defaultdict(set)
+    for item in items:
+        if stock_keys := item.get_stock_keys():
+            code_type, keys = stock_keys
+            wanted[code_type].update(key for key in keys if key is not None)
+
+    counts = defaultdict(dict)
+    query = Q()
+    for code_type, keys in wanted.items():
+        if keys:
+            query |= Q(code_type=code_type, key__in=keys)
+    if query:
+        for code_type, key, amount in CodeStock.objects.filter(query).values_list(
+            "code_type", "key", "amount"
+        ):
+            counts[code_type][key] = amount
+
+    result = {}
+    for item in items:
+        stock_keys = item.get_stock_keys()
+        result[item.id] = (
+            item.get_stock_from_counts(counts[stock_keys[0]]) if stock_keys else None
+        )
+    return result
+
+
+async def aresolve_stock(items) -> dict[int, int | None]:
+    return await db_sync_to_async(resolve_stock)(items)
 
 
 class ManualCategory(models.Model):
@@ -112,7 +150,7 @@ class Item(models.Model):
 
     @classmethod
     async def aitems(cls, **kwargs):
-        return await sync_to_async(lambda: list(cls.items(**kwargs)))()
+        return await db_sync_to_async(lambda: list(cls.items(**kwargs)))()
 
     @classmethod
     def have_active_items(cls):
@@ -120,7 +158,7 @@ class Item(models.Model):
 
     @classmethod
     async def ahave_active_items(cls):
-        return await sync_to_async(cls.have_active_items)()
+        return await db_sync_to_async(cls.have_active_items)()
 
     @property
     def value(self):
@@ -146,75 +184,31 @@ class Item(models.Model):
     def get_total_price(self, quantity: int):
         return self.price * quantity
 
-    def get_stock_amount(self):
+    def get_stock_keys(self) -> tuple[str, set[int]] | None:
+        """Тип кодов и ключи CodeStock, от которых зависит остаток товара."""
         if self.category == Item.Category.CODES:
-            return StockbleCode.objects.filter(
-                amount=self.amount, order__isnull=True
-            ).count()
+            return CodeStock.CodeType.STOCKBLE, {self.amount}
         if self.category == Item.Category.GIFTCARD:
-            return self.giftcard_codes.filter(order__isnull=True).count()
+            return CodeStock.CodeType.GIFTCARD, {self.id}
         if self.category == Item.Category.PUBG_UC:
-            if self.amount not in UC_RECIPES:
-                nominals = CODES_MAP.get(self.amount)
-                if not nominals:
-                    return 0
-
-                counter = []
-                for nom in set(nominals):
-                    available_codes = UcCode.objects.filter(
-                        order__isnull=True,
-                        amount=nom,
-                    ).count()
-
-                    possible_items = available_codes // nominals.count(nom)
-                    counter.append(possible_items)
-
-                return min(counter) if counter else 0
-
-            recipes = UC_RECIPES.get(self.amount, [])
-            if not recipes:
-                return 0
-
-            all_possible_components = {
-                component for recipe in recipes for component in recipe
-            }
-            available_codes_counts = {
-                item["amount"]: item["count"]
-                for item in UcCode.objects.filter(
-                    order__isnull=True, amount__in=all_possible_components
-                )
-                .values("amount")
-                .annotate(count=Count("id"))
-            }
-
-            direct_recipe = [self.amount]
-            if direct_recipe in recipes:
-                direct_codes_count = available_codes_counts.get(self.amount, 0)
-                if direct_codes_count > 0:
-                    return direct_codes_count
-
-            for recipe in recipes:
-                if recipe == [self.amount]:
-                    continue
-
-                recipe_requirements = Counter(recipe)
-                possible_builds = []
-                can_build = True
-                for component, required_count in recipe_requirements.items():
-                    available_count = available_codes_counts.get(component, 0)
-                    if available_count < required_count:
-                        can_build = False
-                        break
-                    possible_builds.append(available_count // required_count)
-
-                if can_build and possible_builds:
-                    return min(possible_builds)
-
-            return 0
+            return CodeStock.CodeType.UC, set(get_nominals(self.amount))
         return None
 
+    def get_stock_from_counts(self, available_codes_counts: dict[int, int]):
+        """Считает остаток товара по уже загруженным счётчикам кодов."""
+        if self.category == Item.Category.CODES:
+            return available_codes_counts.get(self.amount, 0)
+        if self.category == Item.Category.GIFTCARD:
+            return available_codes_counts.get(self.id, 0)
+        if self.category == Item.Category.PUBG_UC:
+            return max_units(self.amount, available_codes_counts)
+        return None
+
+    def get_stock_amount(self):
+        return resolve_stock([self])[self.id]
+
     async def aget_stock_amount(self):
-        return await sync_to_async(self.get_stock_amount)()
+        return await db_sync_to_async(self.get_stock_amount)()
 
 
 class CategoryDescription(models.Model):
@@ -392,7 +386,7 @@ class Folder(models.Model):
     )
 
     def aitems(self, **kwargs):
-        return sync_to_async(lambda: list(self.items.filter(**kwargs)))()
+        return db_sync_to_async(lambda: list(self.items.filter(**kwargs)))()
 
     @classmethod
     def get(cls, **kwargs):
@@ -400,7 +394,7 @@ class Folder(models.Model):
 
     @classmethod
     async def aget(cls, **kwargs):
-        return await sync_to_async(lambda: list(cls.get(**kwargs)))()
+        return await db_sync_to_async(lambda: list(cls.get(**kwargs)))()
 
     class Meta:
         verbose_name = "Folder"
@@ -0,0 +1,16 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from liveconfigs.models import ConfigRow
+
+from .catalog import bump_version
+from .models import CategoryDescription, Folder, Item, ManualCategory
+
+CATALOG_MODELS = (Item, ManualCategory, Folder, CategoryDescription, ConfigRow)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def catalog_changed(sender, **kwargs):
+    if issubclass(sender, CATALOG_MODELS):
+        transaction.on_commit(bump_version, robust=True)
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:24
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Индекс строится без блокировки записи в таблицу заказов.
+    atomic = False
+
+    dependencies = [
+        ('items', '0014_categorydescription_manualcategory_description'),
+        ('orders', '0005_topup_currency_topup_payment_url_and_more'),
+        ('users', '0003_alter_tguser_first_name_alter_tguser_last_name'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['tg_user', 'created_at'], name='order_user_created_idx'),
+        ),
+    ]
@@ -3,21 +3,36 @@ from collections import Counter
 from decimal import Decimal
 from enum import StrEnum
 
-from asgiref.sync import sync_to_async
 from django.db import models, transaction
-from django.db.models import Count
 from django.utils import timezone
 
 from backend.config import PAYMENT_CONFIG
-from backend.constants import CODES_MAP, UC_RECIPES
-from bot.tasks import send_notification_task
-from codes.models import StockbleCode, UcCode
+from backend.config_cache import get_config
+from backend.db_executor import db_sync_to_async
+from bot.tasks import send_manager_notification, send_notification_task
+from codes.composition import compose, get_nominals
+from codes.models import CodeStock, Giftcard, StockbleCode, UcCode
 from items.models import Item
 from users.models import TgUser
 
+from .rendering import (
+    PREFETCHED,
+    RELATED,
+    load_rendering_data,
+    render_admin,
+    render_history,
+    render_user,
+)
+
 logger = logging.getLogger(__name__)
 
 
+class OrderQuerySet(models.QuerySet):
+    def for_rendering(self):
+        """Заказы со всеми связями, которые нужны orders.rendering."""
+        return self.select_related(*RELATED).prefetch_related(*PREFETCHED)
+
+
 class Order(models.Model):
     class Status(StrEnum):
         PENDING = "Pending"
@@ -49,10 +64,26 @@ class Order(models.Model):
     )
     _status = None
 
+    objects = OrderQuerySet.as_manager()
+
+    HISTORY_FIELDS = (
+        "id",
+        "created_at",
+        "category",
+        "data",
+        "pubg_id",
+        "quantity",
+        "price",
+        "is_completed",
+    )
+
     class Meta:
         verbose_name = "Order"
         verbose_name_plural = "Orders"
         ordering = ("created_at",)
+        indexes = [
+            models.Index(fields=["tg_user", "created_at"], name="order_user_created_idx"),
+        ]
 
     @property
     def title(self):
@@ -71,77 +102,65 @@ class Order(models.Model):
         )
 
     def to_str(self):
-        quantity_str = f"{self.quantity}\n" if self.quantity > 1 else None
-        pubg_id_str = f"PUBG ID: {self.pubg_id}\n" if self.pubg_id else None
-        return (
-            f"Order #{self.id}\n"
-            f"{Item.Category(self.category).label}\n"
-            f"{self.data.get('value')}\n"
-            f"{pubg_id_str or ''}"
-            f"{quantity_str or ''}"
-            f"Total: {self.price}$\n"
-            f"Complete: {'✅' if self.is_completed else '❌'}\n"
-        )
+        return render_history(self)
 
     async def ato_str(self):
-        return await sync_to_async(self.to_str)()
+        return await db_sync_to_async(self.to_str)()
+
+    @classmethod
+    def get_history_page(
+        cls,
+        tg_user: TgUser,
+        since,
+        size: int,
+        cursor: tuple | None = None,
+        backward: bool = False,
+    ) -> tuple[list["Order"], bool]:
+        """Страница истории по ключу (created_at, id) без OFFSET и COUNT.
+
+        cursor - (created_at, id) заказа на границе соседней страницы; с
+        backward=True берутся заказы перед ним. Возвращает заказы по
+        возрастанию created_at и признак, что дальше в том же направлении
+        есть ещё заказы.
+        """
+        orders = cls.objects.filter(tg_user=tg_user, created_at__gte=since).only(
+            *cls.HISTORY_FIELDS
+        )
+        if cursor is not None:
+            created_at, order_id = cursor
+            if backward:
+                orders = orders.filter(
+                    models.Q(created_at__lt=created_at)
+                    | models.Q(created_at=created_at, id__lt=order_id)
+                )
+            else:
+                orders = orders.filter(
+                    models.Q(created_at__gt=created_at)
+                    | models.Q(created_at=created_at, id__gt=order_id)
+                )
+        ordering = ("-created_at", "-id") if backward else ("created_at", "id")
+        page = list(orders.order_by(*ordering)[: size + 1])
+        has_more = len(page) > size
+        page = page[:size]
+        if backward:
+            page.reverse()
+        return page, has_more
+
+    @classmethod
+    async def aget_history_page(cls, *args, **kwargs):
+        return await db_sync_to_async(cls.get_history_page)(*args, **kwargs)
 
     def user_str(self):
-        status = {
-            self.__class__.Status.PENDING: "",
-            self.__class__.Status.COMPLETED: "completed ✅",
-            self.__class__.Status.CANCELLED: "cancelled ❌",
-            self.__class__.Status.FAILED: "failed ❌",
-        }.get(self.status, "unknown")
-        completed = f"Order {status}\n"
-        if self.item.category == Item.Category.STARS:
-            pubg_id = f"USERNAME: {self.pubg_id}\n" if self.pubg_id else ""
-        elif self.item.category == Item.Category.DIAMOND:
-            pubg_id = f"USERID: {self.pubg_id}\n" if self.pubg_id else ""
-        else:
-            pubg_id = f"PUBG ID: {self.pubg_id}\n" if self.pubg_id else ""
-        codes = (
-            f"Code USED: {' '.join([code.code for code in self.uc_codes.all()])}\n"
-            if self.uc_codes.all()
-            else ""
-        )
-        return (
-            f"{completed}"
-            f"{self.title}\n"
-            f"{pubg_id}"
-            f"Balance before order: {self.balance_before}$\n"
-            f"Order Cost: {self.price}$\n"
-            f"Balance after Order: {self.balance_before - self.price.quantize(Decimal('0.01'))}$\n"
-            f"{codes}"
-        )
+        return render_user(self)
 
     async def auser_str(self):
-        return await sync_to_async(self.user_str)()
+        return await db_sync_to_async(self.user_str)()
 
     def admin_str(self):
-        codes = (
-            f"Code USED: {' '.join([code.code for code in self.uc_codes.all()])}\n"
-            if self.uc_codes.all()
-            else ""
-        )
-        if self.item.category == Item.Category.STARS:
-            pubg_id = f"USERNAME: {self.pubg_id}\n" if self.pubg_id else ""
-        elif self.item.category == Item.Category.DIAMOND:
-            pubg_id = f"USERID: {self.pubg_id}\n" if self.pubg_id else ""
-        else:
-            pubg_id = f"PUBG ID: {self.pubg_id}\n" if self.pubg_id else ""
-        return (
-            f"userid: {self.tg_user.tg_id}\n"
-            f"Order: {self.title}\n"
-            f"{pubg_id}"
-            f"Balance before order: {self.balance_before}$\n"
-            f"Order Cost: {self.price}$\n"
-            f"Balance after Order: {self.balance_before - self.price.quantize(Decimal('0.01'))}$\n"
-            f"{codes}"
-        )
+        return render_admin(self)
 
     async def aadmin_str(self):
-        return await sync_to_async(self.user_str)()
+        return await db_sync_to_async(self.user_str)()
 
     def save(
         self, force_insert=False, force_update=False, using=None, update_fields=None
@@ -151,54 +170,29 @@ class Order(models.Model):
         return super().save(force_insert, force_update, using, update_fields)
 
     def grab_code(self):
-        codes_count = self.stockble_codes.count()
-        if self.stockble_codes and codes_count == self.quantity:
-            return list(self.stockble_codes.all())
-        codes = StockbleCode.objects.filter(amount=self.item.amount)[
-            : (self.quantity - codes_count)
-        ]
-        for code in codes:
-            code.order = self
-            code.save(update_fields=("order",))
-        return list(self.stockble_codes.all())
+        codes = list(self.stockble_codes.all())
+        if len(codes) < self.quantity:
+            with transaction.atomic():
+                codes += StockbleCode.reserve(
+                    self, self.quantity - len(codes), amount=self.item.amount
+                )
+        return codes
 
-    def get_code_nominals(self):
+    def get_code_nominals(self) -> Counter | None:
+        """Сколько кодов каждого номинала зарезервировать под заказ."""
         if self.category != Item.Category.PUBG_UC:
             raise ValueError("Order category must be PUBG_UC")
 
         target_amount = self.item.amount
-
-        if target_amount not in UC_RECIPES:
-            return CODES_MAP.get(target_amount)
-
-        recipes = UC_RECIPES.get(target_amount, [])
-        if not recipes:
-            return None
-
-        all_possible_components = {comp for recipe in recipes for comp in recipe}
-        available_codes_counts = {
-            item["amount"]: item["count"]
-            for item in UcCode.objects.filter(
-                order__isnull=True, amount__in=all_possible_components
+        available_codes_counts = CodeStock.counts(
+            CodeStock.CodeType.UC, get_nominals(target_amount)
+        )
+        composition = compose(target_amount, available_codes_counts, self.quantity)
+        if composition:
+            logger.info(
+                f"Для заказа #{self.id} выбраны рецепты: {composition.recipes}"
             )
-            .values("amount")
-            .annotate(count=Count("id"))
-        }
-
-        for recipe in recipes:
-            recipe_requirements = Counter(recipe)
-            is_viable = True
-            for component, required_count in recipe_requirements.items():
-                if (
-                    available_codes_counts.get(component, 0)
-                    < required_count * self.quantity
-                ):
-                    is_viable = False
-                    break
-
-            if is_viable:
-                logger.info(f"Для заказа #{self.id} выбран рецепт: {recipe}")
-                return recipe
+            return composition.nominals
 
         logger.warning(
             f"Для заказа #{self.id} не найдено ни одного выполнимого рецепта."
@@ -219,26 +213,23 @@ class Order(models.Model):
             self.save(update_fields=["is_completed"])
             return
 
-        logger.info(f"Резервируем коды для заказа #{self.id} по рецепту {nominals}")
+        logger.info(f"Резервируем коды для заказа #{self.id}: {dict(nominals)}")
 
         try:
             with transaction.atomic():
-                for _ in range(self.quantity):
-                    for nom in nominals:
-                        code = (
-                            UcCode.objects.select_for_update()
-                            .filter(amount=nom, is_activated=False, order__isnull=True)
-                            .order_by("-is_priority_use", "created_at")
-                            .first()
+                codes = []
+                # По возрастанию номинала: одинаковый порядок блокировок у всех заказов.
+                for nom, count in sorted(nominals.items()):
+                    reserved = UcCode.reserve(
+                        self, count, amount=nom, is_activated=False
+                    )
+                    if len(reserved) < count:
+                        raise Exception(
+                            f"Race condition: Not enough codes of amount {nom} for order #{self.id}"
                         )
-
-                        if code:
-                            code.order = self
-                            code.save(update_fields=("order",))
-                        else:
-                            raise Exception(
-                                f"Race condition: Not enough codes of amount {nom} for order #{self.id}"
-                            )
+                    codes.extend(reserved)
+                if self.pubg_id:
+                    transaction.on_commit(lambda: self.schedule_activation(codes))
         except Exception as e:
             logger.error(f"Ошибка при резервировании кодов для заказа #{self.id}: {e}")
             self.send_manager_notification(
@@ -247,11 +238,21 @@ class Order(models.Model):
             self.is_completed = False
             self.save(update_fields=["is_completed"])
 
+    def schedule_activation(self, codes: list[UcCode]):
+        from codes.activation import dispatch_order_activation
+
+        dispatch_order_activation(self.id)
+        logger.info(
+            f"Activation of {len(codes)} codes for order #{self.id} has been scheduled."
+        )
+
     def grab_giftcard(self):
-        codes = self.item.giftcard_codes.filter(order__isnull=True)[: self.quantity]
-        for code in codes:
-            code.order = self
-            code.save()
+        codes = list(self.giftcard_codes.all())
+        if len(codes) < self.quantity:
+            with transaction.atomic():
+                codes += Giftcard.reserve(
+                    self, self.quantity - len(codes), item_id=self.item_id
+                )
         return codes
 
     def grab_codes(self):
@@ -263,17 +264,19 @@ class Order(models.Model):
             return self.grab_giftcard()
 
     async def agrab_codes(self):
-        return await sync_to_async(self.grab_codes)()
+        return await db_sync_to_async(self.grab_codes)()
 
     def send_manager_notification(
         self, text, keyboard: str | None = None, kwargs: dict | None = None
     ):
-        if chat := self.item.chat:
+        if not (chat := self.item.chat):
+            logger.warning(f"There no chat for Item {self.item.value}")
+        elif keyboard:
             send_notification_task.delay(
                 chat.tg_id, text, keyboard, kwargs={"id": self.id}
             )
         else:
-            logger.warning(f"There no chat for Item {self.item.value}")
+            send_manager_notification(chat.tg_id, text)
 
     def cancel(self):
         if self.is_completed is not None:
@@ -286,10 +289,11 @@ class Order(models.Model):
             self.tg_user.process_payment(amount=self.price)
             self.__class__.objects.filter(id=self.id).update(is_completed=False)
         self.refresh_from_db()
+        load_rendering_data(self)
         send_notification_task(self.tg_user.tg_id, text=self.user_str())
 
     async def acancel(self):
-        return await sync_to_async(self.cancel)()
+        return await db_sync_to_async(self.cancel)()
 
     @property
     def status(self):
@@ -346,7 +350,7 @@ class TopUp(models.Model):
         return super().save(force_insert, force_update, using, update_fields)
 
     def generate_comission(self, start: float = 0.001):
-        comission = start + PAYMENT_CONFIG.TOPUP_COMISSION
+        comission = start + get_config(PAYMENT_CONFIG, "TOPUP_COMISSION")
         to_pay = Decimal(str(comission)) + self.amount
         if TopUp.objects.filter(to_pay=to_pay, is_paid=False).exists():
             start = start + 0.001
@@ -357,7 +361,7 @@ class TopUp(models.Model):
     def convert_to_ustd(self) -> Decimal | None:
         if self.currency == self.Currency.RUB:
             return (
-                Decimal(str(self.amount)) / Decimal(str(PAYMENT_CONFIG.RUB_USDT_EXCHANGE_RATE))
+                Decimal(str(self.amount)) / Decimal(str(get_config(PAYMENT_CONFIG, "RUB_USDT_EXCHANGE_RATE")))
             ).quantize(Decimal('0.01'))
         if self.currency == self.Currency.USDT:
             return self.amount
@@ -375,4 +379,4 @@ class TopUp(models.Model):
         self.save(update_fields=("is_topped",))
 
     async def atop(self):
-        return await sync_to_async(self.top)()
+        return await db_sync_to_async(self.top)()
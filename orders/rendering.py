@@ -0,0 +1,115 @@
+"""Тексты заказа для пользователя, менеджеров и истории.
+
+Рендеринг не ходит в БД: заказ загружается через
+Order.objects.for_rendering() или дополняется load_rendering_data(). При
+DEBUG попытка отрендерить заказ без загруженных связей падает с
+LazyRenderingError, чтобы лишние запросы не прятались в сигналах и задачах.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+
+from items.models import Item
+
+RELATED = ("item", "tg_user")
+PREFETCHED = ("uc_codes",)
+
+
+class LazyRenderingError(RuntimeError):
+    pass
+
+
+def check_loaded(order, related: tuple = RELATED, prefetched: tuple = PREFETCHED):
+    if not settings.DEBUG:
+        return
+    prefetched_cache = getattr(order, "_prefetched_objects_cache", {})
+    missing = [
+        name for name in related if not order._meta.get_field(name).is_cached(order)
+    ]
+    if order.pk is not None:
+        missing += [name for name in prefetched if name not in prefetched_cache]
+    if missing:
+        raise LazyRenderingError(
+            f"Order {order.id} would lazily load {', '.join(missing)}; "
+            "use Order.objects.for_rendering() or load_rendering_data()"
+        )
+
+
+def load_rendering_data(*orders):
+    """Догружает связи уже полученных заказов; коды перечитываются всегда,
+    т.к. между загрузкой и рендерингом их могли зарезервировать."""
+    for order in orders:
+        for name in PREFETCHED:
+            getattr(order, "_prefetched_objects_cache", {}).pop(name, None)
+    prefetch_related_objects(orders, *RELATED)
+    # У несохранённого заказа кодов нет, а обратная связь недоступна.
+    prefetch_related_objects([order for order in orders if order.pk], *PREFETCHED)
+
+
+def _pubg_id_line(order) -> str:
+    if not order.pubg_id:
+        return ""
+    if order.item.category == Item.Category.STARS:
+        return f"USERNAME: {order.pubg_id}\n"
+    if order.item.category == Item.Category.DIAMOND:
+        return f"USERID: {order.pubg_id}\n"
+    return f"PUBG ID: {order.pubg_id}\n"
+
+
+def _codes_line(order) -> str:
+    if order.pk is None:
+        return ""
+    codes = [code.code for code in order.uc_codes.all()]
+    return f"Code USED: {' '.join(codes)}\n" if codes else ""
+
+
+def _balance_lines(order) -> str:
+    return (
+        f"Balance before order: {order.balance_before}$\n"
+        f"Order Cost: {order.price}$\n"
+        f"Balance after Order: {order.balance_before - order.price.quantize(Decimal('0.01'))}$\n"
+    )
+
+
+def render_user(order) -> str:
+    check_loaded(order, related=("item",))
+    status = {
+        order.Status.PENDING: "",
+        order.Status.COMPLETED: "completed ✅",
+        order.Status.CANCELLED: "cancelled ❌",
+        order.Status.FAILED: "failed ❌",
+    }.get(order.status, "unknown")
+    return (
+        f"Order {status}\n"
+        f"{order.title}\n"
+        f"{_pubg_id_line(order)}"
+        f"{_balance_lines(order)}"
+        f"{_codes_line(order)}"
+    )
+
+
+def render_admin(order) -> str:
+    check_loaded(order)
+    return (
+        f"userid: {order.tg_user.tg_id}\n"
+        f"Order: {order.title}\n"
+        f"{_pubg_id_line(order)}"
+        f"{_balance_lines(order)}"
+        f"{_codes_line(order)}"
+    )
+
+
+def render_history(order) -> str:
+    """Строка истории; нужны только поля Order.HISTORY_FIELDS."""
+    quantity_str = f"{order.quantity}\n" if order.quantity > 1 else ""
+    pubg_id_str = f"PUBG ID: {order.pubg_id}\n" if order.pubg_id else ""
+    return (
+        f"Order #{order.id}\n"
+        f"{Item.Category(order.category).label}\n"
+        f"{order.data.get('value')}\n"
+        f"{pubg_id_str}"
+        f"{quantity_str}"
+        f"Total: {order.price}$\n"
+        f"Complete: {'✅' if order.is_completed else '❌'}\n"
+    )
@@ -4,11 +4,13 @@ from django.db.models.signals import pre_save, post_save
 from django.dispatch import receiver
 
 from backend.config import URL_CONFIG
+from backend.config_cache import get_config
 from bot.tasks import send_notification_task
 from bot.keyboards import KEYBOARDS
 from items.models import Item
 
 from .models import Order, TopUp
+from .rendering import load_rendering_data
 from .tasks import process_order_task
 
 logger = logging.getLogger(__name__)
@@ -16,8 +18,10 @@ logger = logging.getLogger(__name__)
 
 @receiver(pre_save, sender=Order)
 def order_pre_save(sender, instance: Order, **kwargs):
-    old = Order.objects.filter(id=instance.id).select_related('item__chat').first() if instance.id else None
+    old = Order.objects.filter(id=instance.id).only('is_completed').first() if instance.id else None
     if not old or old.is_completed is None:
+        if instance.is_completed is not None:
+            load_rendering_data(instance)
         if instance.is_completed:
             text = f'{instance.user_str()}'
             logger.info(text)
@@ -28,7 +32,7 @@ def order_pre_save(sender, instance: Order, **kwargs):
             text = f'{instance.admin_str()}\nis failed'
             logger.info(text)
             instance.send_manager_notification(text)
-            admin_username = URL_CONFIG.ADMIN_USERNAME
+            admin_username = get_config(URL_CONFIG, "ADMIN_USERNAME")
             text = (
                 f'{"Error"}. Contact {admin_username} for verification\n'
                 f'{instance.user_str()}\n'
@@ -45,6 +49,7 @@ def order_post_save(sender, instance: Order, created, **kwargs):
             Item.Category.HOME_VOTE,
             Item.Category.STARS,
         ):
+            load_rendering_data(instance)
             text = f'Complete order\n{instance.admin_str()}\n by yourself'
             logger.info(text)
             if chat := instance.item.chat:
@@ -11,6 +11,6 @@ logger = logging.getLogger(__name__)
 @app.task()
 def process_order_task(order_id):
     """Фоново обрабатывает заказ."""
-    order = Order.objects.select_related('item',).get(id=order_id)
+    order = Order.objects.for_rendering().get(id=order_id)
     if order.item.category == Item.Category.DIAMOND:
         process_diamond(order)
@@ -2,19 +2,19 @@ import logging
 from datetime import timedelta
 
 from django.utils import timezone
-from asgiref.sync import sync_to_async
 
 from backend.config import PAYMENT_CONFIG, URL_CONFIG
+from backend.config_cache import aget_config, get_config
 from items.models import Item
 from payments.smileone import so_api
-from bot.tasks import send_notification_task
+from bot.tasks import send_manager_notification
 from .models import TopUp, Order
 
 logger = logging.getLogger()
 
 
 async def delete_old_topups():
-    lifetime = await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_LIFETIME)()
+    lifetime = await aget_config(PAYMENT_CONFIG, "TOPUP_LIFETIME")
     target_date = timezone.now() - timedelta(minutes=lifetime)
     logger.info(f'Deleting unpayed topups before {target_date}')
     await TopUp.objects.filter(created_at__lt=target_date, is_paid=False, is_topped=False).adelete()
@@ -37,4 +37,4 @@ def process_diamond(order: Order):
         if not succ:
             text = f'Activation of order {order.id} failed\nServer response: {msg}'
             logger.error(f'{text}')
-            send_notification_task.delay(URL_CONFIG.ADMIN_ID, text)
+            send_manager_notification(get_config(URL_CONFIG, "ADMIN_ID"), text)
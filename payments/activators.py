@@ -1,8 +1,9 @@
 import logging
 
-import aiohttp
 from django.conf import settings
 
+from .http import request
+
 UCODEIUM_URL = settings.ENV.str('UCODEIUM_URL', '')
 UCODEIUM_TOKEN = settings.ENV.str('UCODEIUM_TOKEN', '')
 
@@ -55,12 +56,11 @@ async def aactivate_code(player_id: int, uc_code: str, uc_value: str | int):
         'Content-Type': 'application/json',
         'X-Api-Key': UCODEIUM_TOKEN
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url=url, headers=headers, json=data) as response:
-            logger.info(f'Поступил ответ {await response.text()} со статусом {response.status}')
-            if response.status not in (200, 201):
-                logging.error(f'Ошибка активации кода {response.status}: {await response.text()}')
-            res = await response.json()
+    response = await request('POST', url, headers=headers, json=data)
+    logger.info(f'Поступил ответ {response.text} со статусом {response.status}')
+    if response.status not in (200, 201):
+        logging.error(f'Ошибка активации кода {response.status}: {response.text}')
+    res = response.json()
     # res = {
     #     "result_code": 0,
     #     "activation_data": {
@@ -72,10 +72,12 @@ async def aactivate_code(player_id: int, uc_code: str, uc_value: str | int):
     #         "request_cost": 0.3,
     #     },
     # }
+    # Третий элемент - стоимость запроса, пишется в журнал попыток (codes.health).
+    request_cost = (res.get("activation_data") or {}).get("request_cost")
     if res["result_code"] == 0 and res["activation_data"]['activation_success']:
-        return True, res["result_code"]
+        return True, res["result_code"], request_cost
     logger.error(f'Код не активирован. Ошибка {res["result_code"]} см. документацию')
-    return False, f'{res.get("result_code")}:{res.get("message")}'[:50]
+    return False, f'{res.get("result_code")}:{res.get("message")}'[:50], request_cost
 
 
 async def aactivate_code_kokos(player_id: int, uc_code: str, uc_value: str | None = None):
@@ -89,29 +91,28 @@ async def aactivate_code_kokos(player_id: int, uc_code: str, uc_value: str | Non
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {KOKOS_TOKEN}'
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url=url, headers=headers, json=data) as response:
-            logger.info(f'Поступил ответ {await response.text()} со статусом {response.status}')
-            if response.status in (503,):
-                logging.warning(f'Ошибка активации кода {response.status}: {await response.json()}')
-                res = await response.json()
-                # res = {
-                #     "type": "ActivationError",
-                #     "id": 18,
-                #     "code": "r3h4x2Jh2W2853g9g4",
-                #     "playerId": "51364069154",
-                #     "errorCode": "CODE_USED",
-                #     "errorMessage": ("REDEEM_CODE_ALREADY_USED: Redeem code is "
-                #                      "already used, please check the redeem code, "
-                #                      "cause: -, solution:-, debugid: 98fa4c6ab945320d0fe4304f38cc5653"),
-                #     "codeReset": False,
-                #     "createdAt": "2024-09-25T17:32:28Z"
-                #     }
-                return False, res['errorCode']
-            elif response.status in (200, 201):
-                return True, '0'
-            logger.error(f'Поступил неожиданный ответ от сервера {response.status}: {await response.text()}')
-            return False, 'Unexpectable error'
+    response = await request('POST', url, headers=headers, json=data)
+    logger.info(f'Поступил ответ {response.text} со статусом {response.status}')
+    if response.status in (503,):
+        logging.warning(f'Ошибка активации кода {response.status}: {response.text}')
+        res = response.json()
+        # res = {
+        #     "type": "ActivationError",
+        #     "id": 18,
+        #     "code": "r3h4x2Jh2W2853g9g4",
+        #     "playerId": "51364069154",
+        #     "errorCode": "CODE_USED",
+        #     "errorMessage": ("REDEEM_CODE_ALREADY_USED: Redeem code is "
+        #                      "already used, please check the redeem code, "
+        #                      "cause: -, solution:-, debugid: 98fa4c6ab945320d0fe4304f38cc5653"),
+        #     "codeReset": False,
+        #     "createdAt": "2024-09-25T17:32:28Z"
+        #     }
+        return False, res['errorCode']
+    elif response.status in (200, 201):
+        return True, '0'
+    logger.error(f'Поступил неожиданный ответ от сервера {response.status}: {response.text}')
+    return False, 'Unexpectable error'
 
 
 async def aactivate_code_fars(player_id: int, uc_code: str, uc_value: str | None = None, order_id: str | None = None):
@@ -134,11 +135,10 @@ async def aactivate_code_fars(player_id: int, uc_code: str, uc_value: str | None
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {FARS_TOKEN}'
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url=url, headers=headers, json=data) as response:
-            logger.info(f'Поступил ответ {await response.text()} со статусом {response.status}')
-            if response.status in (200, 201,):
-                return True, '0'
-            logging.error(f'Ошибка активации кода {response.status}: {await response.text()}')
-            res = await response.json()
-            return False, res.get('error_code')
+    response = await request('POST', url, headers=headers, json=data)
+    logger.info(f'Поступил ответ {response.text} со статусом {response.status}')
+    if response.status in (200, 201,):
+        return True, '0'
+    logging.error(f'Ошибка активации кода {response.status}: {response.text}')
+    res = response.json()
+    return False, res.get('error_code')
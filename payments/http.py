@@ -0,0 +1,272 @@
+"""HTTP-клиент активаторов и платёжных сервисов.
+
+Асинхронные запросы идут через одну aiohttp-сессию на event loop процесса:
+соединения держатся keep-alive HTTP_KEEPALIVE_TIMEOUT секунд, к одному
+хосту открыто не больше HTTP_CONNECTIONS_PER_HOST. Синхронный код
+(SmileOne) использует requests.Session процесса с тем же лимитом.
+
+Тайм-ауты явные: HTTP_CONNECT_TIMEOUT на ожидание соединения из пула и
+подключение, HTTP_READ_TIMEOUT на чтение ответа. Тело читается один раз,
+request возвращает HttpResponse с готовым текстом.
+
+Повтор (до HTTP_RETRIES раз с растущей паузой) делается только когда он
+безопасен. Если соединение не установлено, запрос не ушёл и повторяется
+любой. Обрыв, тайм-аут чтения и ответы 502/503/504 повторяются только
+для идемпотентных запросов: GET/HEAD/OPTIONS или idempotent=True. POST
+активации кода после отправки не повторяется - код мог активироваться.
+
+Время ответов пишется по хостам в гистограммы Redis:
+manage.py httpstats.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from django.conf import settings
+from redis.exceptions import RedisError
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from backend.redis_client import get_aredis, get_redis
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+RETRY_STATUSES = (502, 503, 504)
+
+LATENCY_KEY = "http:latency:{host}"
+HOSTS_KEY = "http:latency:hosts"
+# Верхние границы корзин гистограммы, мс.
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# event loop -> сессия; после fork в дочернем процессе свои loop и сессии.
+_sessions = weakref.WeakKeyDictionary()
+_sync_session = None
+_sync_pid = None
+_sync_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class HttpResponse:
+    """Ответ с уже прочитанным телом."""
+
+    status: int
+    text: str
+
+    def json(self):
+        return json.loads(self.text)
+
+
+async def _on_headers_sent(session, trace_config_ctx, params):
+    trace_config_ctx.trace_request_ctx.sent = True
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Сессия текущего event loop."""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        # Ушёл ли запрос, видно по трассировке, а не по классу ошибки:
+        # тайм-аут подключения и тайм-аут чтения до aiohttp 3.10 - один
+        # ServerTimeoutError.
+        trace = aiohttp.TraceConfig()
+        trace.on_request_headers_sent.append(_on_headers_sent)
+        session = aiohttp.ClientSession(
+            trace_configs=[trace],
+            connector=aiohttp.TCPConnector(
+                limit_per_host=settings.HTTP_CONNECTIONS_PER_HOST,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                connect=settings.HTTP_CONNECT_TIMEOUT,
+                sock_read=settings.HTTP_READ_TIMEOUT,
+            ),
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """Закрывает сессию текущего event loop; вызывать перед его остановкой."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def get_sync_session() -> requests.Session:
+    """requests.Session процесса; после fork создаётся заново."""
+    global _sync_session, _sync_pid
+    with _sync_lock:
+        if _sync_session is None or _sync_pid != os.getpid():
+            adapter = HTTPAdapter(pool_maxsize=settings.HTTP_CONNECTIONS_PER_HOST)
+            _sync_session = requests.Session()
+            _sync_session.mount("http://", adapter)
+            _sync_session.mount("https://", adapter)
+            _sync_pid = os.getpid()
+        return _sync_session
+
+
+def _is_idempotent(method: str, idempotent: bool | None) -> bool:
+    return method.upper() in IDEMPOTENT_METHODS if idempotent is None else idempotent
+
+
+def _is_retryable(error: Exception, idempotent: bool, sent: bool) -> bool:
+    if isinstance(error, (aiohttp.InvalidURL, aiohttp.ClientSSLError)):
+        return False
+    return not sent or idempotent
+
+
+def _is_retryable_sync(error: Exception, idempotent: bool) -> bool:
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # Отказ в соединении и ошибка DNS приходят как ConnectionError с причиной
+    # NewConnectionError (наследник ConnectTimeoutError).
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    if isinstance(error, requests.ConnectionError) and isinstance(reason, ConnectTimeoutError):
+        return True
+    return idempotent and isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def _backoff(attempt: int) -> float:
+    return settings.HTTP_RETRY_BACKOFF * 2 ** (attempt - 1)
+
+
+async def request(
+    method: str,
+    url: str,
+    *,
+    idempotent: bool | None = None,
+    read_timeout: float | None = None,
+    **kwargs,
+) -> HttpResponse:
+    """Запрос через общую сессию; kwargs передаются в ClientSession.request."""
+    idempotent = _is_idempotent(method, idempotent)
+    host = urlsplit(url).hostname or "unknown"
+    if read_timeout is not None:
+        kwargs["timeout"] = aiohttp.ClientTimeout(
+            total=None, connect=settings.HTTP_CONNECT_TIMEOUT, sock_read=read_timeout
+        )
+    attempt = 0
+    while True:
+        attempt += 1
+        started = time.monotonic()
+        state = SimpleNamespace(sent=False)
+        try:
+            async with get_session().request(method, url, trace_request_ctx=state, **kwargs) as response:
+                text = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            await arecord_latency(host, time.monotonic() - started, None)
+            if attempt > settings.HTTP_RETRIES or not _is_retryable(e, idempotent, state.sent):
+                raise
+            logger.warning(f"{method} {host} failed: {type(e).__name__}: {e}, retry {attempt}/{settings.HTTP_RETRIES}")
+        else:
+            await arecord_latency(host, time.monotonic() - started, response.status)
+            if attempt > settings.HTTP_RETRIES or not idempotent or response.status not in RETRY_STATUSES:
+                return HttpResponse(response.status, text)
+            logger.warning(f"{method} {host} returned {response.status}, retry {attempt}/{settings.HTTP_RETRIES}")
+        await asyncio.sleep(_backoff(attempt))
+
+
+def request_sync(method: str, url: str, *, idempotent: bool | None = None, **kwargs) -> requests.Response:
+    """Синхронный вариант request, возвращает requests.Response."""
+    idempotent = _is_idempotent(method, idempotent)
+    host = urlsplit(url).hostname or "unknown"
+    kwargs.setdefault("timeout", (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+    attempt = 0
+    while True:
+        attempt += 1
+        started = time.monotonic()
+        try:
+            response = get_sync_session().request(method, url, **kwargs)
+        except requests.RequestException as e:
+            record_latency(host, time.monotonic() - started, None)
+            if attempt > settings.HTTP_RETRIES or not _is_retryable_sync(e, idempotent):
+                raise
+            logger.warning(f"{method} {host} failed: {type(e).__name__}: {e}, retry {attempt}/{settings.HTTP_RETRIES}")
+        else:
+            record_latency(host, time.monotonic() - started, response.status_code)
+            if attempt > settings.HTTP_RETRIES or not idempotent or response.status_code not in RETRY_STATUSES:
+                return response
+            logger.warning(
+                f"{method} {host} returned {response.status_code}, retry {attempt}/{settings.HTTP_RETRIES}"
+            )
+        time.sleep(_backoff(attempt))
+
+
+def _observe(pipe, host: str, seconds: float, status: int | None):
+    latency_ms = round(seconds * 1000)
+    bucket = next((f"le_{bound}" for bound in LATENCY_BUCKETS if latency_ms <= bound), "le_inf")
+    key = LATENCY_KEY.format(host=host)
+    pipe.sadd(HOSTS_KEY, host)
+    pipe.hincrby(key, bucket, 1)
+    pipe.hincrby(key, "count", 1)
+    pipe.hincrby(key, "sum_ms", latency_ms)
+    pipe.hincrby(key, f"{status // 100}xx" if status else "error", 1)
+
+
+async def arecord_latency(host: str, seconds: float, status: int | None):
+    """Добавляет ответ (status=None - ошибка соединения) в гистограмму хоста."""
+    try:
+        async with get_aredis().pipeline(transaction=False) as pipe:
+            _observe(pipe, host, seconds, status)
+            await pipe.execute()
+    except RedisError:
+        logger.debug(f"Can't record latency of {host}", exc_info=True)
+
+
+def record_latency(host: str, seconds: float, status: int | None):
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            _observe(pipe, host, seconds, status)
+            pipe.execute()
+    except RedisError:
+        logger.debug(f"Can't record latency of {host}", exc_info=True)
+
+
+def _percentile(buckets: list[tuple[str, int]], count: int, q: float) -> str:
+    """Верхняя граница корзины, в которую попадает перцентиль q."""
+    seen = 0
+    for bound, value in buckets:
+        seen += value
+        if seen >= q * count:
+            return bound
+    return "inf"
+
+
+def get_latency_stats() -> dict[str, dict]:
+    """Гистограммы по хостам со средним и оценками p50/p95/p99."""
+    redis = get_redis()
+    stats = {}
+    for host in sorted(redis.smembers(HOSTS_KEY)):
+        row = redis.hgetall(LATENCY_KEY.format(host=host))
+        count = int(row.get("count", 0))
+        if not count:
+            continue
+        buckets = [(str(bound), int(row.get(f"le_{bound}", 0))) for bound in LATENCY_BUCKETS]
+        buckets.append(("inf", int(row.get("le_inf", 0))))
+        stats[host] = {
+            "count": count,
+            "avg_ms": round(int(row.get("sum_ms", 0)) / count),
+            "p50": _percentile(buckets, count, 0.5),
+            "p95": _percentile(buckets, count, 0.95),
+            "p99": _percentile(buckets, count, 0.99),
+            "buckets": dict(buckets),
+            "statuses": {k: int(v) for k, v in row.items() if k.endswith("xx") or k == "error"},
+        }
+    return stats
+
+
+def reset_latency_stats():
+    redis = get_redis()
+    hosts = redis.smembers(HOSTS_KEY)
+    redis.delete(HOSTS_KEY, *(LATENCY_KEY.format(host=host) for host in hosts))
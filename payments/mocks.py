@@ -57,9 +57,9 @@ async def mock_ucodeium_activate(player_id: int, uc_code: str, uc_value: str | i
     await asyncio.sleep(1)
     if "FAIL" in uc_code.upper():
         logger.error(f"[MOCK] UCODEIUM: Симуляция ошибки для кода {uc_code}")
-        return False, "201: Mocked Invalid Code"
+        return False, "201: Mocked Invalid Code", 0.3
     logger.info(f"[MOCK] UCODEIUM: Код {uc_code} успешно 'активирован'")
-    return True, "0"
+    return True, "0", 0.3
 
 
 async def mock_kokos_activate(
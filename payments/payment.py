@@ -1,15 +1,17 @@
 import logging
 from time import time
 
-import aiohttp
 from binance.spot import Spot
+from django.conf import settings
 from pybit.unified_trading import HTTP
 
 from backend.config import PAYMENT_CONFIG
+from backend.config_cache import aget_config
 from backend.settings import ENV
 from orders.models import TopUp
 from users.models import TgUser
-from asgiref.sync import sync_to_async
+
+from .http import request
 
 CODEEPAY_API_KEY = ENV.str('CODEEPAY_API_KEY')
 BASE_IP = ENV.str('BASE_IP')
@@ -20,7 +22,11 @@ MIN_PRICE = 100
 
 logger = logging.getLogger(__name__)
 
-client = Spot(api_key=ENV.str('BINANCE_API_KEY'), api_secret=ENV.str('BINANCE_API_SECRET'))
+client = Spot(
+    api_key=ENV.str('BINANCE_API_KEY'),
+    api_secret=ENV.str('BINANCE_API_SECRET'),
+    timeout=(settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT),
+)
 session = HTTP(testnet=False, api_key=ENV.str('BYBIT_API_KEY'), api_secret=ENV.str('BYBIT_API_SECRET'),)
 
 
@@ -83,7 +89,7 @@ async def check_wallets():
 
 async def create_codeepay_payment(tg_user: TgUser, to_pay: int):
     url = 'https://codeepay.ru/initiate_payment'
-    ruble_comission = await sync_to_async(lambda: PAYMENT_CONFIG.TOPUP_RUBLE_COMISSION)()
+    ruble_comission = await aget_config(PAYMENT_CONFIG, "TOPUP_RUBLE_COMISSION")
     comission = to_pay * (ruble_comission / 100)
     amount = to_pay - comission
     topup = await TopUp.objects.acreate(
@@ -110,11 +116,10 @@ async def create_codeepay_payment(tg_user: TgUser, to_pay: int):
         }
     }
     logging.info(f'Запрос платежа {data}')
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url=url, headers=headers, json=data) as response:
-            if response.status not in (200, 201):
-                logging.error(f'Ошибка codeepay {response.status}: {await response.text()}')
-            res = await response.json()
+    response = await request('POST', url, headers=headers, json=data)
+    if response.status not in (200, 201):
+        logging.error(f'Ошибка codeepay {response.status}: {response.text}')
+    res = response.json()
     topup.payment_url = res.get('url')
     await topup.asave(update_fields=['payment_url'])
     return topup
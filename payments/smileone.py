@@ -3,10 +3,11 @@ from dataclasses import dataclass, asdict
 import json
 import hashlib
 import time
-import requests
 
 from django.conf import settings
 
+from .http import request_sync
+
 UID = settings.ENV.str('SO_CUSTOMER_ID')
 EMAIL = settings.ENV.str('SO_MAIL')
 KEY = settings.ENV.str('SO_SECRET_KEY')
@@ -68,7 +69,7 @@ class SmileOneAPI:
 
         return final_md5
 
-    def _make_request(self, endpoint: str, extra_params: dict) -> dict:
+    def _make_request(self, endpoint: str, extra_params: dict, idempotent: bool = True) -> dict:
         url = f"{self.BASE_URL}/{endpoint}"
         base_params = {
             'uid': self.uid,
@@ -78,7 +79,7 @@ class SmileOneAPI:
         params = {**base_params, **extra_params}
         params['sign'] = self._generate_sign(params)
         logger.debug(f'Request data for smileone: {params}')
-        response = requests.post(url, data=params)
+        response = request_sync('POST', url, idempotent=idempotent, data=params)
         response.raise_for_status()
         return response.json()
 
@@ -102,7 +103,8 @@ class SmileOneAPI:
                 'productid': product_id,
                 'userid': user_id,
                 "zoneid": zone_id,
-            }
+            },
+            idempotent=False,
         )
         message = f"status: {result.get('status')}, result:{result.get('message')}, order_id:{result.get('order_id')}"
         if result.get('status') == 200:
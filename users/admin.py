@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db import transaction
 
 from .models import TgUser
 
@@ -14,3 +15,17 @@ class TgUserAdmin(admin.ModelAdmin):
         'created_at',
         'updated_at',
     )
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        transaction.on_commit(obj.invalidate_cache, robust=True)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        transaction.on_commit(obj.invalidate_cache, robust=True)
+
+    def delete_queryset(self, request, queryset):
+        users = list(queryset)
+        super().delete_queryset(request, queryset)
+        for user in users:
+            transaction.on_commit(user.invalidate_cache, robust=True)
@@ -0,0 +1,157 @@
+"""Кеш профилей TgUser для бота.
+
+Каждый апдейт начинается с поиска пользователя по tg_id, поэтому профиль
+хранится в двух слоях: небольшой LRU в памяти процесса (TG_USER_LOCAL_TTL
+секунд) и Redis (TG_USER_CACHE_TTL секунд). Запись в Redis помечена
+номером версии пользователя; invalidate_user увеличивает версию, так что
+запись, собранная из БД до коммита, не переживает инвалидацию. Процессы
+бота узнают о ней из канала USERS_CHANNEL и выкидывают запись из LRU.
+
+Кодовые пути, меняющие баланс, очки или права, обязаны вызвать
+invalidate_user после коммита.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from backend.db_executor import db_sync_to_async
+from backend.redis_client import get_aredis, get_redis
+
+from .models import TgUser
+
+logger = logging.getLogger(__name__)
+
+USERS_CHANNEL = "users:invalidate"
+DATA_KEY = "tg_user:{tg_id}"
+VERSION_KEY = "tg_user:{tg_id}:v"
+FIELDS = (
+    "id",
+    "tg_id",
+    "username",
+    "first_name",
+    "last_name",
+    "is_admin",
+    "balance",
+    "points",
+    "is_reachable",
+)
+
+_local = OrderedDict()
+_listener = None
+
+
+def _dump(tg_user: TgUser) -> dict:
+    return {name: getattr(tg_user, name) for name in FIELDS}
+
+
+def _build(values: dict) -> TgUser:
+    """Свежий экземпляр на каждый вызов: хендлеры могут его менять.
+
+    Поля вне FIELDS отложены (deferred), save() сохранит только загруженные.
+    """
+    return TgUser.from_db(
+        "default",
+        FIELDS,
+        [TgUser._meta.get_field(name).to_python(values[name]) for name in FIELDS],
+    )
+
+
+def _local_get(tg_id: int) -> dict | None:
+    entry = _local.get(tg_id)
+    if entry is None:
+        return None
+    expires_at, values = entry
+    if time.monotonic() >= expires_at:
+        del _local[tg_id]
+        return None
+    _local.move_to_end(tg_id)
+    return values
+
+
+def _local_set(tg_id: int, values: dict):
+    _local[tg_id] = (time.monotonic() + settings.TG_USER_LOCAL_TTL, values)
+    _local.move_to_end(tg_id)
+    while len(_local) > settings.TG_USER_LOCAL_SIZE:
+        _local.popitem(last=False)
+
+
+async def aget_tg_user(tg_id: int) -> TgUser | None:
+    """Профиль пользователя из кеша; None, если пользователя нет в БД."""
+    values = _local_get(tg_id)
+    if values is not None:
+        return _build(values)
+
+    redis = get_aredis()
+    version = None
+    try:
+        raw, version = await redis.mget(
+            DATA_KEY.format(tg_id=tg_id), VERSION_KEY.format(tg_id=tg_id)
+        )
+        if raw:
+            cached = json.loads(raw)
+            if cached["v"] == version:
+                _local_set(tg_id, cached["values"])
+                return _build(cached["values"])
+    except RedisError:
+        logger.exception(f"Can't read cached user {tg_id}")
+
+    tg_user = await db_sync_to_async(
+        lambda: TgUser.objects.only(*FIELDS).filter(tg_id=tg_id).first()
+    )()
+    if tg_user is None:
+        return None
+    values = json.loads(json.dumps(_dump(tg_user), default=str))
+    _local_set(tg_id, values)
+    try:
+        await redis.set(
+            DATA_KEY.format(tg_id=tg_id),
+            json.dumps({"v": version, "values": values}),
+            ex=settings.TG_USER_CACHE_TTL,
+        )
+    except RedisError:
+        logger.exception(f"Can't cache user {tg_id}")
+    return _build(values)
+
+
+def invalidate_user(tg_id: int):
+    """Сбрасывает профиль во всех процессах. Вызывать после коммита."""
+    _local.pop(tg_id, None)
+    try:
+        redis = get_redis()
+        with redis.pipeline() as pipe:
+            pipe.incr(VERSION_KEY.format(tg_id=tg_id))
+            pipe.expire(VERSION_KEY.format(tg_id=tg_id), settings.TG_USER_CACHE_TTL)
+            pipe.delete(DATA_KEY.format(tg_id=tg_id))
+            pipe.publish(USERS_CHANNEL, tg_id)
+            pipe.execute()
+    except RedisError:
+        logger.exception(f"Can't invalidate cached user {tg_id}")
+
+
+async def listen_user_invalidations():
+    """Выкидывает из LRU профили, сброшенные в других процессах."""
+    while True:
+        try:
+            async with get_aredis().pubsub() as pubsub:
+                await pubsub.subscribe(USERS_CHANNEL)
+                # Сообщения, пропущенные без подписки, не придут.
+                _local.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        _local.pop(int(message["data"]), None)
+        except RedisError:
+            logger.exception("User invalidations listener lost Redis connection")
+            _local.clear()
+            await asyncio.sleep(5)
+
+
+def start_user_listener():
+    global _listener
+    if _listener is None or _listener.done():
+        _listener = asyncio.create_task(listen_user_invalidations())
+    return _listener
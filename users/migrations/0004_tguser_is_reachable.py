@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_alter_tguser_first_name_alter_tguser_last_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tguser',
+            name='is_reachable',
+            field=models.BooleanField(default=True, help_text='False after Telegram refused delivery: the user blocked the bot or deleted the account', verbose_name='Reachable'),
+        ),
+    ]
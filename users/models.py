@@ -1,9 +1,10 @@
 from decimal import Decimal
 
-from asgiref.sync import sync_to_async
 from django.db import models, transaction
 
 from backend.config import FEATURES_CONFIG
+from backend.config_cache import get_config
+from backend.db_executor import db_sync_to_async
 
 
 class TgUser(models.Model):
@@ -30,6 +31,11 @@ class TgUser(models.Model):
         max_digits=10, decimal_places=2, default=0.00, verbose_name="Balance"
     )
     points = models.IntegerField(default=0, verbose_name="Points")
+    is_reachable = models.BooleanField(
+        default=True,
+        help_text="False after Telegram refused delivery: the user blocked the bot or deleted the account",
+        verbose_name="Reachable",
+    )
     POINTS_RATIO = 1000
 
     @property
@@ -45,7 +51,7 @@ class TgUser(models.Model):
         return f"{self.first_name} {self.last_name}/{self.id}"
 
     def redeem_points(self):
-        if not FEATURES_CONFIG.POINTS_SYSTEM_ENABLED:
+        if not get_config(FEATURES_CONFIG, "POINTS_SYSTEM_ENABLED"):
             return False
         if self.points < self.POINTS_RATIO:
             return False
@@ -56,10 +62,11 @@ class TgUser(models.Model):
             tg_user.balance += balance_redeem
             tg_user.points = points_to_return
             tg_user.save()
+            transaction.on_commit(self.invalidate_cache, robust=True)
             return True
 
     async def aredeem_points(self):
-        return await sync_to_async(self.redeem_points)()
+        return await db_sync_to_async(self.redeem_points)()
 
     def process_payment(self, amount: Decimal | int | float):
         with transaction.atomic():
@@ -68,14 +75,40 @@ class TgUser(models.Model):
             if tg_user.balance < 0:
                 raise ValueError("Balance cant be less than zero")
             tg_user.save()
+            transaction.on_commit(self.invalidate_cache, robust=True)
             if amount < 0:
-                if FEATURES_CONFIG.POINTS_SYSTEM_ENABLED:
+                if get_config(FEATURES_CONFIG, "POINTS_SYSTEM_ENABLED"):
                     new_points = -amount
                     tg_user.points += new_points
                     tg_user.save(update_fields=("points",))
 
+    def invalidate_cache(self):
+        from users.cache import invalidate_user
+
+        invalidate_user(self.tg_id)
+
+    @classmethod
+    def set_reachable(cls, tg_ids: list[int], is_reachable: bool):
+        """Помечает пользователей (не)доступными для рассылок и уведомлений."""
+        from users.cache import invalidate_user
+
+        with transaction.atomic():
+            changed = list(
+                cls.objects.filter(tg_id__in=tg_ids)
+                .exclude(is_reachable=is_reachable)
+                .values_list("tg_id", flat=True)
+            )
+            cls.objects.filter(tg_id__in=changed).update(is_reachable=is_reachable)
+            for tg_id in changed:
+                transaction.on_commit(lambda tg_id=tg_id: invalidate_user(tg_id), robust=True)
+        return changed
+
+    @classmethod
+    async def aset_reachable(cls, tg_ids: list[int], is_reachable: bool):
+        return await db_sync_to_async(cls.set_reachable)(tg_ids, is_reachable)
+
     async def aprocess_payment(self, amount: Decimal | int | float):
-        return await sync_to_async(self.process_payment)(amount)
+        return await db_sync_to_async(self.process_payment)(amount)
 
     def get_or_generate_api_key(self):
         from api.models import APIKey
@@ -84,7 +117,7 @@ class TgUser(models.Model):
         return api_key.key
 
     async def aget_or_generate_api_key(self):
-        return await sync_to_async(self.get_or_generate_api_key)()
+        return await db_sync_to_async(self.get_or_generate_api_key)()
 
     def regenerate_api_key(self):
         from api.models import APIKey
@@ -94,4 +127,4 @@ class TgUser(models.Model):
         return new_key.key
 
     async def aregenerate_api_key(self):
-        return await sync_to_async(self.regenerate_api_key)()
+        return await db_sync_to_async(self.regenerate_api_key)()